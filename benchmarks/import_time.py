@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Check the cost of importing ysflight against a budget.
+
+Every measurement runs in a fresh interpreter so nothing is already imported. The time of
+"import ysflight" and of loading only the unit conversion tables are compared to the budget, and
+the unit tables, DAT parsing and scalar calculations are checked to not import NumPy.
+
+usage:
+    python benchmarks/import_time.py                    exit 1 when over budget
+    python benchmarks/import_time.py --budget 0.05      budget in seconds for the median import
+
+"""
+
+# Import standard modules
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+# Define constants
+IMPORT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_TEMPLATE_DAT = os.path.join(IMPORT_ROOT, "a4.dat")
+IMPORT_BUDGET = 0.05  # seconds
+IMPORT_REPEAT = 7
+
+# name: (statement timed in a fresh interpreter, modules it must not import)
+IMPORT_CASES = {"import ysflight": ("import ysflight", ["numpy"]),
+                "units": ("import ysflight; ysflight.units.convert_unit(1, 'KM')", ["numpy"]),
+                "parse DAT": ("import ysflight; ysflight.fileparse.AircraftDat.AircraftDat({!r})".format(IMPORT_TEMPLATE_DAT), ["numpy"]),
+                "scalar simulation": ("import ysflight; ysflight.simulation.calculate_ias(1000.0, 100.0)", ["numpy"])}
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+print(json.dumps({{"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(statement):
+    """Run a statement in a fresh interpreter.
+
+    inputs:
+    statement (str): python code to time
+
+    outputs:
+    seconds (float): time the statement took
+    modules (list): every module imported once it finished
+    """
+    environment = dict(os.environ, PYTHONPATH=IMPORT_ROOT, YSFLIGHT_PROFILE="0")
+    result = subprocess.run([sys.executable, "-c", _PROBE.format(statement=statement)], capture_output=True,
+                            text=True, env=environment, check=True)
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return probe["seconds"], probe["modules"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the import time of ysflight against a budget.")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET, help="seconds allowed for the median of each case")
+    parser.add_argument("--repeat", type=int, default=IMPORT_REPEAT, help="fresh interpreters per case")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name, (statement, forbidden) in IMPORT_CASES.items():
+        timings = list()
+        for _ in range(args.repeat):
+            seconds, modules = measure(statement)
+            timings.append(seconds)
+        median = statistics.median(timings)
+        loaded = [i for i in forbidden if i in modules]
+
+        status = "ok"
+        if name in ["import ysflight", "units"] and median > args.budget:
+            status = "OVER BUDGET"
+        if len(loaded) > 0:
+            status = "imported {}".format(", ".join(loaded))
+        failed = failed or status != "ok"
+        print("{:<20} median {:8.2f} ms   {}".format(name, 1000 * median, status))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
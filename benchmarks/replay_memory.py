@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Memory held by a parsed replay. Writes a synthetic replay with many events, bullet records and kill
+credits, parses it and reports the bytes still allocated by the replay object (tracemalloc) along
+with the size of a single event instance.
+
+usage: python benchmarks/replay_memory.py [--events N] [--bullets N] [--keep-raw]
+
+"""
+
+# Import standard modules
+import os
+import sys
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+# Import ysflight modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ysflight.fileparse.ReplayYFS import ReplayYFS
+from ysflight.synthetic import write_synthetic_yfs
+
+
+def instance_bytes(obj):
+    """Size of an instance including its __dict__ when it has one."""
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the memory held by a parsed replay.")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--bullets", type=int, default=200000)
+    parser.add_argument("--kills", type=int, default=20000)
+    parser.add_argument("--keep-raw", action="store_true", help="keep the raw text of every record")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="ysflight_memory_")
+    try:
+        filepath = os.path.join(workdir, "memory.yfs")
+        write_synthetic_yfs(filepath, airplanes=8, duration=600, sample_rate=10, events=args.events,
+                            bullets=args.bullets, kills=args.kills, seed=0)
+        file_size = os.path.getsize(filepath)
+
+        tracemalloc.start()
+        yfs = ReplayYFS(filepath, use_index=False, keep_raw=args.keep_raw)
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("file size         {:>12,} bytes".format(file_size))
+    print("events            {:>12,}".format(len(yfs.events)))
+    print("bullet records    {:>12,}".format(len(yfs.bulletrecords)))
+    print("kill credits      {:>12,}".format(len(yfs.killcredits)))
+    print("replay memory     {:>12,} bytes".format(current))
+    print("event instance    {:>12,} bytes".format(instance_bytes(yfs.events[0]) if len(yfs.events) > 0 else 0))
+
+
+if __name__ == "__main__":
+    main()
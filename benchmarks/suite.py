@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Benchmark suite for the file parsing and aerodynamic hot paths.
+
+Every case is timed over several calls and reports the latency percentiles, the throughput in
+items per second (lines, tokens, records, conditions, ...) and the peak memory allocated during a
+single call as measured by tracemalloc. Results are written as JSON. Save a run as the baseline
+and later runs are compared against it, flagging cases whose median latency regressed.
+
+usage:
+    python benchmarks/suite.py                          run everything and print the results
+    python benchmarks/suite.py --quick                  skip the largest inputs
+    python benchmarks/suite.py --filter replay          only cases whose name contains "replay"
+    python benchmarks/suite.py --output run.json        also write the results to run.json
+    python benchmarks/suite.py --save-baseline          store the results as the baseline
+    python benchmarks/suite.py --compare                compare against the baseline, exit 1 on a regression
+
+"""
+
+# Import standard modules
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+# Import 3rd Party Modules
+import numpy as np
+
+# Import ysflight modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ysflight.file import import_file
+from ysflight.units import determine_value_units, _cached_value_units
+from ysflight.fileparse.AircraftDat import AircraftDat
+from ysflight.fileparse.ReplayYFS import ReplayYFS
+from ysflight.fileparse.ReplayBinary import ReplayBinary, export_replay_binary
+from ysflight.synthetic import write_synthetic_yfs, write_synthetic_dats
+
+# Define constants
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_TEMPLATE_DAT = os.path.join(os.path.dirname(BENCHMARK_DIRECTORY), "a4.dat")
+BENCHMARK_BASELINE = os.path.join(BENCHMARK_DIRECTORY, "baseline.json")
+BENCHMARK_REPEAT = 7
+BENCHMARK_REGRESSION_THRESHOLD = 1.25  # median latency ratio flagged as a regression
+BENCHMARK_LARGE_DAT_COPIES = 25
+BENCHMARK_REPLAY_SIZES = [(2, 500), (8, 2500), (16, 12500)]  # (airplanes, records per airplane)
+BENCHMARK_DAT_VARIANTS = 50
+BENCHMARK_SEED = 0
+
+
+class BenchmarkCase:
+    """A single benchmark.
+
+    function is called with no arguments and does the measured work. setup, if given, is called
+    before every call and is not timed. items is the number of items one call processes.
+    """
+    def __init__(self, name, function, items, setup=None, large=False):
+        self.name = name
+        self.function = function
+        self.items = items
+        self.setup = setup
+        self.large = large
+
+
+def write_large_dat(template, filepath, copies):
+    """Write a DAT that repeats every property line of a template several times. Later lines
+    override earlier ones, so it parses to the same airplane with many more lines to process."""
+    lines = import_file(template)
+    body = [i for i in lines if i.startswith("IDENTIFY") is False]
+    with open(filepath, mode='w') as dat_file:
+        dat_file.write("\n".join(lines) + "\n")
+        for _ in range(copies - 1):
+            dat_file.write("\n".join(body) + "\n")
+
+
+def build_cases(workdir):
+    """Create the benchmark inputs in workdir and return the list of BenchmarkCase."""
+    cases = list()
+
+    # File reading and value tokenizing
+    lines = import_file(BENCHMARK_TEMPLATE_DAT)
+    cases.append(BenchmarkCase("import_file.a4", lambda: import_file(BENCHMARK_TEMPLATE_DAT), len(lines)))
+
+    tokens = list()
+    for line in lines:
+        if len(line) > 8 and line.startswith("REM") is False and " " not in line[:8]:
+            tokens.extend(line.split('#')[0].split()[1:])
+
+    def tokenize():
+        for token in tokens:
+            try:
+                determine_value_units(token)
+            except ValueError:
+                pass
+    cases.append(BenchmarkCase("determine_value_units.cold", tokenize, len(tokens), setup=_cached_value_units.cache_clear))
+    cases.append(BenchmarkCase("determine_value_units.warm", tokenize, len(tokens)))
+
+    # DAT parsing
+    large_dat = os.path.join(workdir, "large.dat")
+    write_large_dat(BENCHMARK_TEMPLATE_DAT, large_dat, BENCHMARK_LARGE_DAT_COPIES)
+    cases.append(BenchmarkCase("AircraftDat.small", lambda: AircraftDat(BENCHMARK_TEMPLATE_DAT), len(lines)))
+    cases.append(BenchmarkCase("AircraftDat.small.coefficients", lambda: AircraftDat(BENCHMARK_TEMPLATE_DAT).coefficients(), len(lines)))
+    cases.append(BenchmarkCase("AircraftDat.large", lambda: AircraftDat(large_dat), len(import_file(large_dat))))
+
+    variants = write_synthetic_dats(BENCHMARK_TEMPLATE_DAT, os.path.join(workdir, "variants"), BENCHMARK_DAT_VARIANTS, BENCHMARK_SEED)
+    cases.append(BenchmarkCase("AircraftDat.variants", lambda: [AircraftDat(i) for i in variants], len(variants)))
+
+    # Aerodynamics
+    airplane = AircraftDat(BENCHMARK_TEMPLATE_DAT)
+    cases.append(BenchmarkCase("AirplaneDat.autocalc", airplane.autocalc, 1))
+
+    aoa_list = np.linspace(-0.3, 0.4, 1000).tolist()
+    aoa_batch = np.linspace(-0.3, 0.4, 1000000)
+    cases.append(BenchmarkCase("calc_cl.scalar", lambda: [airplane.calc_cl(i) for i in aoa_list], len(aoa_list)))
+    cases.append(BenchmarkCase("calc_cd.scalar", lambda: [airplane.calc_cd(i, airspeed=200.0) for i in aoa_list], len(aoa_list)))
+    cases.append(BenchmarkCase("calc_cl.batch", lambda: airplane.calc_cl_array(aoa_batch), aoa_batch.size))
+    cases.append(BenchmarkCase("calc_cd.batch", lambda: airplane.calc_cd_array(aoa_batch, airspeed=200.0), aoa_batch.size))
+
+    # Replays of increasing size. use_index=False so every call parses the whole file.
+    for airplanes, records in BENCHMARK_REPLAY_SIZES:
+        yfs = os.path.join(workdir, "replay_{}x{}.yfs".format(airplanes, records))
+        write_synthetic_yfs(yfs, airplanes, duration=(records - 1) / 10, sample_rate=10, events=records // 50,
+                            bullets=records, kills=airplanes, seed=BENCHMARK_SEED)
+        cases.append(BenchmarkCase("ReplayYFS.{}x{}".format(airplanes, records),
+                                   lambda yfs=yfs: ReplayYFS(yfs, use_index=False),
+                                   airplanes * records,
+                                   large=airplanes * records > 50000))
+
+        yfsb = os.path.join(workdir, "replay_{}x{}.yfsb".format(airplanes, records))
+        export_replay_binary(ReplayYFS(yfs, use_index=False), yfsb)
+        cases.append(BenchmarkCase("ReplayBinary.{}x{}".format(airplanes, records),
+                                   lambda yfsb=yfsb: ReplayBinary(yfsb),
+                                   airplanes * records,
+                                   large=airplanes * records > 50000))
+
+    return cases
+
+
+def run_case(case, repeat):
+    """Time a benchmark case.
+
+    outputs:
+    result (dict): latency statistics in seconds, throughput in items per second and peak bytes.
+    """
+    # Warm up once so imports, lazy tables and file system caches are not measured.
+    if case.setup is not None:
+        case.setup()
+    case.function()
+
+    latencies = list()
+    for _ in range(repeat):
+        if case.setup is not None:
+            case.setup()
+        start = time.perf_counter()
+        case.function()
+        latencies.append(time.perf_counter() - start)
+
+    # Measure memory in a separate call since tracing slows everything down.
+    if case.setup is not None:
+        case.setup()
+    tracemalloc.start()
+    case.function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    median = float(np.percentile(latencies, 50))
+    return {"items": case.items,
+            "calls": repeat,
+            "min_s": float(latencies.min()),
+            "mean_s": float(latencies.mean()),
+            "p50_s": median,
+            "p90_s": float(np.percentile(latencies, 90)),
+            "p99_s": float(np.percentile(latencies, 99)),
+            "throughput": case.items / median if median > 0 else None,
+            "peak_bytes": int(peak)}
+
+
+def run_suite(repeat=BENCHMARK_REPEAT, quick=False, name_filter=None):
+    """Run every benchmark and return the results as a JSON serializable dict."""
+    workdir = tempfile.mkdtemp(prefix="ysflight_bench_")
+    try:
+        results = dict()
+        for case in build_cases(workdir):
+            if quick and case.large:
+                continue
+            if name_filter is not None and name_filter not in case.name:
+                continue
+            results[case.name] = run_case(case, repeat)
+            print_result(case.name, results[case.name])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {"meta": {"python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "platform": platform.platform(),
+                     "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "repeat": repeat,
+                     "quick": quick},
+            "results": results}
+
+
+def print_result(name, result):
+    print("{:<32} p50 {:>10.3f} ms  p99 {:>10.3f} ms  {:>14,.0f} items/s  peak {:>8.2f} MB".format(
+          name, result["p50_s"] * 1e3, result["p99_s"] * 1e3, result["throughput"] or 0, result["peak_bytes"] / 2**20))
+
+
+def compare(current, baseline, threshold=BENCHMARK_REGRESSION_THRESHOLD):
+    """Print the change of every case against a baseline run.
+
+    outputs:
+    regressions (list): names of the cases whose median latency grew by more than threshold.
+    """
+    regressions = list()
+    print("\n{:<32} {:>12} {:>12} {:>8} {:>8}".format("case", "base p50 ms", "p50 ms", "ratio", "peak"))
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print("{:<32} {:>12} {:>12.3f}".format(name, "new", result["p50_s"] * 1e3))
+            continue
+        ratio = result["p50_s"] / base["p50_s"] if base["p50_s"] > 0 else float("inf")
+        memory = result["peak_bytes"] / base["peak_bytes"] if base["peak_bytes"] > 0 else float("inf")
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print("{:<32} {:>12.3f} {:>12.3f} {:>7.2f}x {:>7.2f}x{}".format(name, base["p50_s"] * 1e3, result["p50_s"] * 1e3, ratio, memory, flag))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ysflight parsers and aerodynamics.")
+    parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT, help="timed calls per case")
+    parser.add_argument("--quick", action="store_true", help="skip the largest inputs")
+    parser.add_argument("--filter", default=None, help="only run cases whose name contains this text")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BENCHMARK_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare the results against the baseline")
+    parser.add_argument("--threshold", type=float, default=BENCHMARK_REGRESSION_THRESHOLD,
+                        help="median latency ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.repeat, args.quick, args.filter)
+
+    if args.output is not None:
+        with open(args.output, mode='w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    regressions = list()
+    if args.compare:
+        if os.path.isfile(args.baseline) is False:
+            print("Caution: no baseline found at {}. Run with --save-baseline first.".format(args.baseline))
+        else:
+            with open(args.baseline) as json_file:
+                regressions = compare(results, json.load(json_file), args.threshold)
+
+    if args.save_baseline:
+        with open(args.baseline, mode='w') as json_file:
+            json.dump(results, json_file, indent=2)
+        print("Saved baseline to {}".format(args.baseline))
+
+    return 1 if len(regressions) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
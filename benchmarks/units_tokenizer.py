@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Microbenchmark of ysflight.units.determine_value_units against the original scanning
+implementation over every value token of a corpus of DAT files.
+
+usage: python benchmarks/units_tokenizer.py [DAT files or directories ...]
+
+"""
+
+# Import standard modules
+import os
+import sys
+import time
+
+# Import ysflight modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ysflight.file import import_file
+from ysflight.fleet import find_dat_files
+from ysflight.units import determine_value_units, _scan_value_units, _cached_value_units
+
+
+def collect_tokens(filepaths):
+    """Every value token of every DAT line, in file order."""
+    tokens = list()
+    for filepath in filepaths:
+        for line in import_file(filepath):
+            if len(line) > 8 and line.startswith("REM") is False and " " not in line[:8]:
+                tokens.extend(line.split('#')[0].split()[1:])
+    return tokens
+
+
+def time_function(function, tokens, repeat):
+    """Best time in seconds of calling function on every token."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for token in tokens:
+            try:
+                function(token)
+            except ValueError:
+                pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(paths):
+    if len(paths) == 0:
+        paths = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "a4.dat")]
+    tokens = collect_tokens(find_dat_files(paths))
+
+    # Repeat small corpora so the timings are not dominated by timer resolution.
+    repeat_tokens = tokens * max(1, 200000 // max(len(tokens), 1))
+
+    _cached_value_units.cache_clear()
+    original = time_function(_scan_value_units, repeat_tokens, 5)
+    current = time_function(determine_value_units, repeat_tokens, 5)
+
+    print("tokens: {} ({} unique), timed over {}".format(len(tokens), len(set(tokens)), len(repeat_tokens)))
+    print("original: {:.1f} ns/token".format(1e9 * original / len(repeat_tokens)))
+    print("current:  {:.1f} ns/token".format(1e9 * current / len(repeat_tokens)))
+    print("speedup:  {:.1f}x".format(original / current))
+    print(_cached_value_units.cache_info())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Check that "import ysflight" stays within the import time budget and does not load NumPy.
+
+Every import runs in a fresh interpreter so nothing is already imported.
+
+usage:
+    python -m pytest tests
+
+"""
+
+# Import standard modules
+import os
+import sys
+import json
+import pkgutil
+import statistics
+import subprocess
+
+# Define constants
+IMPORT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET = 0.05  # seconds, the same budget as benchmarks/import_time.py
+IMPORT_REPEAT = 3
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+print(json.dumps({{"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}}))
+"""
+
+
+def _measure(statement):
+    """Run a statement in a fresh interpreter and return the seconds it took and the modules it imported."""
+    environment = dict(os.environ, PYTHONPATH=IMPORT_ROOT, YSFLIGHT_PROFILE="0")
+    result = subprocess.run([sys.executable, "-c", _PROBE.format(statement=statement)], capture_output=True,
+                            text=True, env=environment, check=True)
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    return probe["seconds"], probe["modules"]
+
+
+def test_import_within_budget():
+    timings = [_measure("import ysflight")[0] for _ in range(IMPORT_REPEAT)]
+    assert statistics.median(timings) < IMPORT_BUDGET
+
+
+def test_import_does_not_load_numpy():
+    _, modules = _measure("import ysflight")
+    assert "ysflight" in modules
+    assert "numpy" not in modules
+
+
+def test_every_submodule_is_lazy():
+    # Every module of the package is reachable as an attribute without importing it first.
+    names = [module.name for module in pkgutil.iter_modules([os.path.join(IMPORT_ROOT, "ysflight")])]
+    statement = "import ysflight; [getattr(ysflight, name) for name in {!r}]".format([i for i in names if i != "__main__"])
+    _measure(statement)
@@ -1,5 +1,30 @@
 #
-from . import fileparse
-from . import file
-from . import simulation
-from . import units
\ No newline at end of file
+"""
+Submodules are imported the first time they are used as attributes of the package, so
+"import ysflight" stays cheap and ysflight.units does not load NumPy:
+
+    import ysflight
+    ysflight.units.convert_unit(1, "KM")        imports ysflight.units only
+
+"from ysflight import fleet" and "import ysflight.fleet" work as before.
+"""
+
+# Import standard modules
+import importlib
+
+# Define constants
+YSFLIGHT_SUBMODULES = ["fileparse", "file", "simulation", "units", "atmosphere", "fleet", "cache",
+                       "resample", "spatial", "combat", "store", "instrument", "constants", "cli",
+                       "synthetic", "lazy"]
+
+__all__ = list(YSFLIGHT_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in YSFLIGHT_SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(YSFLIGHT_SUBMODULES))
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+python -m ysflight runs the command line tool, see ysflight.cli.
+
+"""
+
+# Import standard modules
+import sys
+
+# Import YSFlight Modules
+from .cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
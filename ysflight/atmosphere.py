@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Precomputed atmosphere tables for the YSFlight standard atmosphere.
+
+The reference atmosphere in YSFlight is a handful of breakpoints that are linearly interpolated.
+Rather than searching those breakpoints on every call, this module samples them once onto uniform
+altitude grids (built lazily on first use) and every lookup is a direct index plus a linear
+interpolation between the two neighbouring samples.
+
+Tolerance: every reference breakpoint sits on a multiple of 4000m, so with a resolution that divides
+4000m (the default 1m does) the density, density ratio and speed of sound tables reproduce the
+reference interpolation to floating point rounding (better than 1e-12 relative). The jet cutback
+has a step at 20000m. Within one resolution step above 20000m the table ramps across the step
+instead of jumping, everywhere else it matches to rounding as well. Coarser resolutions that do
+not divide 4000m smooth the breakpoints over one step.
+
+"""
+
+# Import standard modules
+import sys
+import math
+
+# Import 3rd Party Modules
+from .lazy import LazyModule
+np = LazyModule("numpy")  # imported when an array function first uses it
+
+# Import ysflight modules
+
+
+# Define constants
+YSFLIGHT_DENSITY_ALTITUDES = [0, 4000, 8000, 12000, 16000, 20000]
+YSFLIGHT_DENSITY_VALUES = [1.224991, 0.819122, 0.529999, 0.299988, 0.153000, 0.084991]
+YSFLIGHT_DENSITY_CEILING = 32000
+
+YSFLIGHT_JET_EFFICIENCY_ALTITUDES = [0, 4000, 12000, 16000, 20000, 20000.00001, 36000, 36000.00001]
+YSFLIGHT_JET_EFFICIENCY_VALUES = [1, 1, 0.6, 0.3, 0.0, 0.084991, 0.084991, 0]
+YSFLIGHT_JET_EFFICIENCY_CEILING = 36000
+
+YSFLIGHT_SOUND_ALTITUDES = [0, 4000, 8000, 12000, 16000, 20000, 36000]
+YSFLIGHT_SOUND_SPEEDS = [340.294, 324.579, 308.063, 295.069, 295.069, 295.069, 295.069]
+YSFLIGHT_SOUND_CEILING = 36000
+
+# Default spacing of the lookup tables in meters.
+ATMOSPHERE_DEFAULT_RESOLUTION = 1.0
+
+_resolution = ATMOSPHERE_DEFAULT_RESOLUTION
+_tables = None
+
+
+class AtmosphereTable:
+    """A single uniformly sampled atmosphere property between 0m and a ceiling altitude."""
+    def __init__(self, ref_altitudes, ref_values, ceiling, resolution):
+        self.ceiling = ceiling
+        self.resolution = resolution
+        self.inverse_step = 1 / resolution
+
+        # Sample one step past the ceiling so that idx + 1 is always a valid index.
+        # Python lists are much faster than arrays for single scalar lookups.
+        count = int(math.ceil(ceiling / resolution)) + 2
+        if "numpy" in sys.modules:
+            self.values_list = np.interp(np.arange(count) * resolution, ref_altitudes, ref_values).tolist()
+        else:
+            # Scalar lookups should not import NumPy. _interp gives the same floats, only slower.
+            self.values_list = _interp([i * resolution for i in range(count)], ref_altitudes, ref_values)
+        self.deltas_list = [b - a for a, b in zip(self.values_list, self.values_list[1:])] + [0.0]
+
+        # The arrays are only built for the first array lookup.
+        self._values = None
+        self._deltas = None
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = np.array(self.values_list)
+        return self._values
+
+    @property
+    def deltas(self):
+        if self._deltas is None:
+            self._deltas = np.array(self.deltas_list)
+        return self._deltas
+
+    def lookup(self, altitude):
+        """Interpolate the table at a single altitude that is already within 0 and the ceiling.
+        NaN altitudes give NaN like np.interp."""
+        if math.isnan(altitude):
+            return math.nan
+        position = altitude * self.inverse_step
+        idx = int(position)
+        return self.values_list[idx] + (position - idx) * self.deltas_list[idx]
+
+    def lookup_array(self, altitude):
+        """Interpolate the table over an array of altitudes, clipping them to 0 and the ceiling.
+        NaN altitudes give NaN like np.interp."""
+        missing = np.isnan(altitude)
+        position = np.clip(np.where(missing, 0, altitude), 0, self.ceiling) * self.inverse_step
+        idx = position.astype(np.intp)
+        return np.where(missing, np.nan, self.values[idx] + (position - idx) * self.deltas[idx])
+
+
+def _interp(altitudes, ref_altitudes, ref_values):
+    """np.interp for increasing altitudes in plain Python, with the same floating point operations
+    so the results are identical."""
+    values = list()
+    last = len(ref_altitudes) - 1
+    j = 0
+    for altitude in altitudes:
+        if altitude <= ref_altitudes[0]:
+            values.append(float(ref_values[0]))
+        elif altitude >= ref_altitudes[last]:
+            values.append(float(ref_values[last]))
+        else:
+            while ref_altitudes[j + 1] <= altitude:
+                j += 1
+            if ref_altitudes[j] == altitude:
+                values.append(float(ref_values[j]))
+            else:
+                slope = (ref_values[j + 1] - ref_values[j]) / (ref_altitudes[j + 1] - ref_altitudes[j])
+                values.append(slope * (altitude - ref_altitudes[j]) + ref_values[j])
+    return values
+
+
+def set_resolution(resolution):
+    """Change the altitude spacing of the lookup tables. Tables are rebuilt on their next use.
+
+    inputs:
+    resolution (float, int): table spacing in meters.
+    """
+    global _resolution, _tables
+
+    if isinstance(resolution, (float, int)) is False or resolution <= 0:
+        print("Error: [set_resolution] expected a positive resolution in meters. Got {}".format(resolution))
+        raise ValueError
+
+    _resolution = float(resolution)
+    _tables = None
+
+
+def get_resolution():
+    """Return the current altitude spacing of the lookup tables in meters."""
+    return _resolution
+
+
+class _AtmosphereTables(dict):
+    """The atmosphere tables by name, each built the first time it is looked up."""
+    def __missing__(self, name):
+        if name == "DENSITY":
+            table = AtmosphereTable(YSFLIGHT_DENSITY_ALTITUDES, YSFLIGHT_DENSITY_VALUES, YSFLIGHT_DENSITY_CEILING, _resolution)
+        elif name == "DENSITY_RATIO":
+            ratio = [x / YSFLIGHT_DENSITY_VALUES[0] for x in YSFLIGHT_DENSITY_VALUES]
+            table = AtmosphereTable(YSFLIGHT_DENSITY_ALTITUDES, ratio, YSFLIGHT_DENSITY_CEILING, _resolution)
+        elif name == "SOUND":
+            table = AtmosphereTable(YSFLIGHT_SOUND_ALTITUDES, YSFLIGHT_SOUND_SPEEDS, YSFLIGHT_SOUND_CEILING, _resolution)
+        elif name == "JET":
+            table = AtmosphereTable(YSFLIGHT_JET_EFFICIENCY_ALTITUDES, YSFLIGHT_JET_EFFICIENCY_VALUES, YSFLIGHT_JET_EFFICIENCY_CEILING, _resolution)
+        else:
+            raise KeyError(name)
+        self[name] = table
+        return table
+
+
+def _get_tables():
+    """Return the atmosphere tables. Each is built on first use."""
+    global _tables
+
+    if _tables is None:
+        _tables = _AtmosphereTables()
+
+    return _tables
+
+
+def air_density(altitude):
+    """Air density in kg/m^3 at an altitude in meters. Zero below 0m and above 32000m."""
+    if altitude < 0 or altitude > YSFLIGHT_DENSITY_CEILING:
+        return 0
+    return _get_tables()["DENSITY"].lookup(altitude)
+
+
+def density_ratio(altitude):
+    """Ratio of the air density at an altitude in meters to sea level density. Zero below 0m and
+    above 32000m."""
+    if altitude < 0 or altitude > YSFLIGHT_DENSITY_CEILING:
+        return 0
+    return _get_tables()["DENSITY_RATIO"].lookup(altitude)
+
+
+def speed_of_sound(altitude):
+    """Speed of sound in m/s at an altitude in meters. Held constant outside of 0m to 36000m."""
+    altitude = min(max(altitude, 0), YSFLIGHT_SOUND_CEILING)
+    return _get_tables()["SOUND"].lookup(altitude)
+
+
+def jet_cutback(altitude):
+    """Jet engine thrust efficiency at an altitude in meters. Zero above 36000m."""
+    if altitude > YSFLIGHT_JET_EFFICIENCY_CEILING:
+        return 0
+    return _get_tables()["JET"].lookup(max(altitude, 0))
+
+
+def air_density_array(altitude):
+    """Array version of air_density."""
+    altitude = np.asarray(altitude, dtype=float)
+    density = _get_tables()["DENSITY"].lookup_array(altitude)
+    return np.where((altitude < 0) | (altitude > YSFLIGHT_DENSITY_CEILING), 0.0, density)
+
+
+def density_ratio_array(altitude):
+    """Array version of density_ratio."""
+    altitude = np.asarray(altitude, dtype=float)
+    ratio = _get_tables()["DENSITY_RATIO"].lookup_array(altitude)
+    return np.where((altitude < 0) | (altitude > YSFLIGHT_DENSITY_CEILING), 0.0, ratio)
+
+
+def speed_of_sound_array(altitude):
+    """Array version of speed_of_sound."""
+    return _get_tables()["SOUND"].lookup_array(np.asarray(altitude, dtype=float))
+
+
+def jet_cutback_array(altitude):
+    """Array version of jet_cutback."""
+    altitude = np.asarray(altitude, dtype=float)
+    cutback = _get_tables()["JET"].lookup_array(altitude)
+    return np.where(altitude > YSFLIGHT_JET_EFFICIENCY_CEILING, 0.0, cutback)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+A persistent on-disk cache of parsed aircraft DAT files.
+
+Parsed AirplaneDat instances (the dat values, hardpoints, turrets, realprops and the computed
+coefficients) are pickled into a single SQLite database. An entry is only used when the DAT file
+still has the same path, size, modification time and content hash as when it was stored, and was
+written with the current CACHE_SCHEMA_VERSION. Least recently used entries are evicted once the
+cache grows past its size cap.
+
+The cache can be turned off by setting the YSFLIGHT_CACHE environment variable to 0 or by creating
+a DatCache with enabled=False. YSFLIGHT_CACHE_DIR overrides the default cache location.
+
+"""
+
+# Import standard modules
+import gc
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+
+# Import 3rd Party Modules
+
+# Import YSFlight Modules
+from .file import read_source, source_stat
+from .fileparse.AircraftDat import AircraftDat
+
+# Define constants
+# Bump CACHE_SCHEMA_VERSION whenever AirplaneDat or the DAT parsing changes what gets stored so
+# that existing entries are discarded instead of loaded.
+CACHE_SCHEMA_VERSION = 6
+CACHE_DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CACHE_DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".cache", "ysflight")
+CACHE_FILENAME = "dat_cache.sqlite"
+
+_default_cache = None
+
+
+def cache_enabled_by_environment():
+    """Check the YSFLIGHT_CACHE environment variable. The cache is on unless it is 0/false/off/no."""
+    return os.environ.get("YSFLIGHT_CACHE", "1").strip().lower() not in ["0", "false", "off", "no"]
+
+
+def file_digest(data):
+    """Content hash used to validate cache entries.
+
+    inputs:
+    data (bytes): the contents of a file
+
+    outputs:
+    digest (str): hex digest of the contents
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class DatCache:
+    """SQLite backed cache of parsed AirplaneDat instances."""
+    def __init__(self, directory=None, max_bytes=CACHE_DEFAULT_MAX_BYTES, enabled=None):
+        """
+        inputs:
+        directory (str, None): folder holding the cache database. Defaults to YSFLIGHT_CACHE_DIR or
+                               ~/.cache/ysflight
+        max_bytes (int): size cap of the stored entries before least recently used entries are evicted.
+        enabled (bool, None): turn the cache on or off. None follows the YSFLIGHT_CACHE environment variable.
+        """
+        if enabled is None:
+            enabled = cache_enabled_by_environment()
+        if directory is None:
+            directory = os.environ.get("YSFLIGHT_CACHE_DIR", CACHE_DEFAULT_DIRECTORY)
+
+        self.enabled = enabled
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._connection = None
+
+    @property
+    def connection(self):
+        """Open the cache database on first use."""
+        if self._connection is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._connection = sqlite3.connect(os.path.join(self.directory, CACHE_FILENAME))
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS entries (path TEXT PRIMARY KEY, size INTEGER, "
+                                     "mtime_ns INTEGER, digest TEXT, schema INTEGER, last_access REAL, "
+                                     "nbytes INTEGER, payload BLOB)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+            # Discard everything written by a different schema version.
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row is None or int(row[0]) != CACHE_SCHEMA_VERSION:
+                self._connection.execute("DELETE FROM entries")
+                self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(CACHE_SCHEMA_VERSION),))
+            self._connection.commit()
+
+        return self._connection
+
+    def _read_source(self, filepath):
+        """Return the (size, mtime_ns, digest) key of a DAT file or archive member as it is on disk now."""
+        size, mtime_ns = source_stat(filepath)
+        return size, mtime_ns, file_digest(read_source(filepath))
+
+    def get_many(self, filepaths):
+        """Look up several DAT files at once.
+
+        inputs:
+        filepaths (list): DAT filepaths
+
+        outputs:
+        hits (dict): filepath: AirplaneDat for every file with a valid cache entry.
+        """
+        hits = dict()
+        if self.enabled is False:
+            return hits
+
+        # Unpickling thousands of airplanes creates a lot of container objects. The garbage collector
+        # would repeatedly scan them all for cycles, so pause it for the bulk load.
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            hits = self._get_many(filepaths)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        return hits
+
+    def _get_many(self, filepaths):
+        """Look up several DAT files at once with the garbage collector paused."""
+        hits = dict()
+        now = time.time()
+        touched = list()
+        for filepath in filepaths:
+            key = os.path.abspath(filepath)
+            row = self.connection.execute("SELECT size, mtime_ns, digest, schema, payload FROM entries WHERE path = ?", (key,)).fetchone()
+            if row is None or row[3] != CACHE_SCHEMA_VERSION:
+                self.misses += 1
+                continue
+
+            try:
+                source = self._read_source(filepath)
+            except OSError:
+                self.misses += 1
+                continue
+
+            if tuple(row[:3]) != source:
+                self.misses += 1
+                continue
+
+            hits[filepath] = pickle.loads(row[4])
+            touched.append((now, key))
+            self.hits += 1
+
+        # Update the access times for LRU eviction in one transaction.
+        if len(touched) > 0:
+            self.connection.executemany("UPDATE entries SET last_access = ? WHERE path = ?", touched)
+            self.connection.commit()
+
+        return hits
+
+    def get(self, filepath):
+        """Look up a single DAT file. Returns the cached AirplaneDat or None."""
+        return self.get_many([filepath]).get(filepath)
+
+    def put_many(self, items):
+        """Store parsed airplanes.
+
+        inputs:
+        items (list): (filepath, AirplaneDat) pairs
+        """
+        if self.enabled is False:
+            return
+
+        now = time.time()
+        rows = list()
+        for filepath, airplane in items:
+            try:
+                size, mtime_ns, digest = self._read_source(filepath)
+            except OSError:
+                continue
+            # Store the aerodynamic coefficients with the airplane so cache hits never run autocalc.
+            # A DAT missing reference values is still cached, its coefficients just stay lazy.
+            try:
+                airplane.coefficients()
+            except (KeyError, TypeError, ValueError, ZeroDivisionError):
+                pass
+            payload = pickle.dumps(airplane, protocol=pickle.HIGHEST_PROTOCOL)
+            rows.append((os.path.abspath(filepath), size, mtime_ns, digest, CACHE_SCHEMA_VERSION, now, len(payload), payload))
+
+        if len(rows) > 0:
+            self.connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.evict()
+            self.connection.commit()
+
+    def put(self, filepath, airplane):
+        """Store a single parsed airplane."""
+        self.put_many([(filepath, airplane)])
+
+    def evict(self):
+        """Delete the least recently used entries until the cache is within max_bytes."""
+        total = self.connection.execute("SELECT COALESCE(SUM(nbytes), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        doomed = list()
+        for path, nbytes in self.connection.execute("SELECT path, nbytes FROM entries ORDER BY last_access"):
+            doomed.append((path,))
+            excess -= nbytes
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM entries WHERE path = ?", doomed)
+
+    def size(self):
+        """Return the number of entries and the total bytes stored."""
+        return tuple(self.connection.execute("SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM entries").fetchone())
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        self.connection.execute("DELETE FROM entries")
+        self.connection.commit()
+        self.connection.execute("VACUUM")
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def load(self, filepath):
+        """Return the AirplaneDat for a DAT file from the cache, parsing and storing it on a miss."""
+        airplane = self.get(filepath)
+        if airplane is None:
+            airplane = AircraftDat(filepath)
+            self.put(filepath, airplane)
+        return airplane
+
+
+def get_default_cache():
+    """Return the shared DatCache using the default location and environment settings."""
+    global _default_cache
+
+    if _default_cache is None:
+        _default_cache = DatCache()
+    return _default_cache
+
+
+def CachedAircraftDat(filepath, cache=None):
+    """Parse an aircraft dat from a filepath, going through the on-disk cache.
+
+    inputs:
+    filepath (str): an os.path-like string to a dat file.
+    cache (DatCache, None): the cache to use. Defaults to the shared cache.
+
+    output:
+    airplane (AirplaneDat): an AirplaneDat class instance
+    """
+    if cache is None:
+        cache = get_default_cache()
+    return cache.load(filepath)
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Command line tool for batch analysis of aircraft DAT files and replays.
+
+usage:
+    python -m ysflight parse-dat PATHS          every DAT value of each aircraft
+    python -m ysflight fleet-summary PATHS      weights, thrust, engine and coefficients of each aircraft
+    python -m ysflight envelope PATHS           stall speed, top speed and climb per altitude of each aircraft
+    python -m ysflight replay-summary PATHS     field, times and counts of each replay
+    python -m ysflight convert PATHS --to yfsb  convert replays between .yfs and .yfsb
+
+PATHS are files, directories (searched recursively) or glob patterns. Files are processed in a
+pool of worker processes and one row per result is written to stdout as soon as it is ready, as
+JSON Lines (default) or CSV with --format csv. Rows are in completion order. Files that fail get a
+row with an "error" column and the exit status is 1.
+
+    --workers N     worker processes, 1 runs everything in this process. Defaults to every CPU.
+    --cache         reuse earlier results: the DAT cache (ysflight.cache) for the aircraft
+                    commands, the replay store (ysflight.store) for replay-summary, and convert
+                    skips destinations newer than their source.
+
+"""
+
+# Import standard modules
+import os
+import sys
+import csv
+import json
+import math
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Import 3rd Party Modules
+
+# Import YSFlight Modules
+from .file import read_source, source_stat, split_archive_path
+from .fleet import find_files, dat_identify
+
+# Define constants
+CLI_FORMATS = ["jsonl", "csv"]
+CLI_CHUNK_SIZE = 4  # files each worker processes per task
+CLI_DEFAULT_ALTITUDES = "0:15000:500"  # meters
+CLI_DEFAULT_SPEEDS = "50:600:10"  # m/s
+CLI_CONVERT_TARGETS = [".yfs", ".yfsb"]
+
+# Output columns of every command. JSON Lines rows carry the same keys.
+CLI_COLUMNS = {"parse-dat": ["path", "identify", "dat", "hardpoints", "turrets", "unknown_keywords", "error"],
+               "fleet-summary": ["path", "identify", "engine", "afterburner", "weight_clean", "weight_fuel",
+                                 "weight_load", "wing_area", "max_speed", "thrust_military", "thrust_afterburner",
+                                 "hardpoints", "turrets", "cl_zero", "cl_slope", "cd_zero", "cd_const", "error"],
+               "envelope": ["path", "identify", "altitude", "stall_speed", "max_level_speed",
+                            "max_specific_excess_power", "best_climb_speed", "error"],
+               "replay-summary": ["path", "field", "start_time", "end_time", "duration", "airplanes", "groundob",
+                                  "events", "bullets", "kills", "error"],
+               "convert": ["path", "destination", "bytes", "seconds", "skipped", "error"]}
+
+
+# Tasks. Each is called in a worker process with a filepath and the options dict and returns a list
+# of rows. They are module level functions so the process pool can pickle them.
+
+def _load_dat(filepath, options):
+    """Parse a DAT, through the on-disk cache with --cache."""
+    if options["cache"]:
+        from .cache import CachedAircraftDat
+        return CachedAircraftDat(filepath)
+    from .fileparse.AircraftDat import AircraftDat
+    return AircraftDat(filepath)
+
+
+def _coefficients(airplane):
+    """The aerodynamic coefficients, or an empty dict for a DAT missing reference values."""
+    try:
+        return airplane.coefficients()
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return dict()
+
+
+def _parse_dat_task(filepath, options):
+    airplane = _load_dat(filepath, options)
+    return [{"path": filepath,
+             "identify": dat_identify(airplane),
+             "dat": dict(airplane.dat),
+             "hardpoints": len(airplane.hardpoints),
+             "turrets": len(airplane.turrets),
+             "unknown_keywords": sorted(airplane.unknown_keywords)}]
+
+
+def _fleet_summary_task(filepath, options):
+    airplane = _load_dat(filepath, options)
+    dat = airplane.dat
+    if len(airplane.realprops) > 0:
+        engine = "realprop"
+    elif "PROPELLR" in dat:
+        engine = "prop"
+    else:
+        engine = "jet"
+    coefficients = _coefficients(airplane)
+    return [{"path": filepath,
+             "identify": dat_identify(airplane),
+             "engine": engine,
+             "afterburner": dat.get("AFTBURNR"),
+             "weight_clean": dat.get("WEIGHCLN"),
+             "weight_fuel": dat.get("WEIGFUEL"),
+             "weight_load": dat.get("WEIGLOAD"),
+             "wing_area": dat.get("WINGAREA"),
+             "max_speed": dat.get("MAXSPEED"),
+             "thrust_military": dat.get("THRMILIT"),
+             "thrust_afterburner": dat.get("THRAFTBN"),
+             "hardpoints": len(airplane.hardpoints),
+             "turrets": len(airplane.turrets),
+             "cl_zero": coefficients.get("cl_zero"),
+             "cl_slope": coefficients.get("cl_slope"),
+             "cd_zero": coefficients.get("cd_zero"),
+             "cd_const": coefficients.get("cd_const")}]
+
+
+def _envelope_task(filepath, options):
+    import numpy as np
+
+    airplane = _load_dat(filepath, options)
+    identify = dat_identify(airplane)
+    envelope = airplane.calc_envelope(_grid(options["altitudes"]), _grid(options["speeds"]))
+
+    # Best climb is the speed with the most specific excess power at each altitude.
+    power = envelope["specific_excess_power"]
+    finite = np.isfinite(power)
+    best = np.argmax(np.where(finite, power, -np.inf), axis=1)
+    rows = list()
+    for i, altitude in enumerate(envelope["altitude"]):
+        found = bool(finite[i].any())
+        rows.append({"path": filepath,
+                     "identify": identify,
+                     "altitude": altitude,
+                     "stall_speed": envelope["stall_speed"][i],
+                     "max_level_speed": envelope["max_level_speed"][i],
+                     "max_specific_excess_power": power[i, best[i]] if found else None,
+                     "best_climb_speed": envelope["speed"][best[i]] if found else None})
+    return rows
+
+
+def _replay_row(filepath, summary):
+    start = summary["start_time"]
+    end = summary["end_time"]
+    row = {"path": filepath, "duration": None if start is None or end is None else end - start}
+    for key in CLI_COLUMNS["replay-summary"][1:]:
+        if key in summary:
+            row[key] = summary[key]
+    return row
+
+
+def _replay_summary_task(filepath, options):
+    from .store import summarize_replay
+    return [_replay_row(filepath, summarize_replay(filepath)["replay"])]
+
+
+def _convert_task(filepath, options):
+    from .fileparse.ReplayBinary import convert_replay
+
+    target = options["to"]
+    # Replays read out of a zip archive are written next to the archive.
+    archive = split_archive_path(filepath)[0]
+    directory = options["output"] if options["output"] is not None else os.path.dirname(archive or filepath)
+    destination = os.path.join(directory, os.path.splitext(os.path.basename(filepath))[0] + target)
+    if os.path.abspath(destination) == os.path.abspath(filepath):
+        message = "{} is already a {} file".format(filepath, target)
+        print("Error: [convert] {}.".format(message))
+        raise ValueError(message)
+
+    row = {"path": filepath, "destination": destination, "skipped": False}
+    if options["cache"] and os.path.isfile(destination) and os.stat(destination).st_mtime_ns >= source_stat(filepath)[1]:
+        row.update({"bytes": os.path.getsize(destination), "seconds": 0.0, "skipped": True})
+        return [row]
+
+    start = time.perf_counter()
+    convert_replay(filepath, destination, compress=options["compress"])
+    row.update({"bytes": os.path.getsize(destination), "seconds": time.perf_counter() - start})
+    return [row]
+
+
+def _grid(text):
+    """Values from a "start:stop:step" string, stop included."""
+    import numpy as np
+
+    values = text.split(":")
+    if len(values) != 3:
+        print("Error: [envelope] expected start:stop:step. Got {}".format(text))
+        raise ValueError
+    start, stop, step = [float(i) for i in values]
+    if step <= 0 or stop < start:
+        print("Error: [envelope] expected a positive step and stop >= start. Got {}".format(text))
+        raise ValueError
+    return start + np.arange(int(math.floor((stop - start) / step + 1e-9)) + 1) * step
+
+
+# Worker pool
+
+def _run_task(task, filepath, options):
+    """Run a task, turning any exception into an error row so one bad file does not stop the run.
+    The parsers print their errors and cautions, those go to stderr to keep stdout for the rows."""
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            return task(filepath, options)
+    except Exception as error:
+        return [{"path": filepath, "error": "{}: {}".format(type(error).__name__, error)}]
+
+
+def _run_chunk(task, filepaths, options):
+    """Worker task: a group of files."""
+    return [row for filepath in filepaths for row in _run_task(task, filepath, options)]
+
+
+def iter_rows(task, filepaths, options, workers=None, chunksize=CLI_CHUNK_SIZE):
+    """Run a task over files serially or in a process pool, yielding rows as they complete.
+
+    inputs:
+    task (function): called with (filepath, options), returns a list of row dicts
+    filepaths (list): the files
+    options (dict): passed to every task, must be picklable
+    workers (int, None): number of worker processes. None uses every CPU and 1 runs in this process.
+    chunksize (int): number of files sent to a worker at a time
+
+    outputs:
+    rows (generator): row dicts in completion order. Failed files give one row with an "error".
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(filepaths) <= 1:
+        for filepath in filepaths:
+            for row in _run_task(task, filepath, options):
+                yield row
+        return
+
+    chunks = [filepaths[i:i + chunksize] for i in range(0, len(filepaths), chunksize)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_run_chunk, task, chunk, options): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                rows = future.result()
+            except Exception as error:
+                # A worker that crashed, or a result that could not be sent back, loses its whole chunk.
+                rows = [{"path": filepath, "error": "{}: {}".format(type(error).__name__, error)} for filepath in futures[future]]
+            for row in rows:
+                yield row
+
+
+def _iter_stored_replays(filepaths, options, workers):
+    """replay-summary --cache: ingest new and changed replays into the replay store, then read
+    every summary back from it."""
+    from .store import ReplayStore
+    from .cache import file_digest
+
+    with ReplayStore() as store:
+        with contextlib.redirect_stdout(sys.stderr):
+            result = store.ingest(filepaths, workers)
+        # Ingest reports the absolute path the worker saw.
+        errors = {os.path.abspath(i[0]): "{}: {}".format(i[1], i[2]) for i in result["errors"]}
+        for filepath in filepaths:
+            if os.path.abspath(filepath) in errors:
+                yield {"path": filepath, "error": errors[os.path.abspath(filepath)]}
+                continue
+            rows = store.query("SELECT * FROM replays WHERE path = ?", (os.path.abspath(filepath),))
+            if len(rows) == 0:
+                # A copy of a replay that is stored under another path.
+                digest = file_digest(read_source(filepath))
+                rows = store.query("SELECT * FROM replays WHERE digest = ?", (digest,))
+            if len(rows) == 0:
+                yield {"path": filepath, "error": "not in the replay store"}
+            else:
+                yield _replay_row(filepath, rows[0])
+
+
+# Output
+
+def _plain(value):
+    """Convert NumPy values to Python ones and NaN to None for JSON and CSV."""
+    if hasattr(value, "tolist") and not isinstance(value, (str, bytes)):
+        value = value.tolist()
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(i) for i in value]
+    return value
+
+
+class RowWriter:
+    """Writes rows to a stream as JSON Lines or CSV, flushing after every row."""
+    def __init__(self, stream, fmt, columns):
+        if fmt not in CLI_FORMATS:
+            print("Error: [RowWriter] expected fmt to be one of {}. Got {}".format(CLI_FORMATS, fmt))
+            raise ValueError
+        self.stream = stream
+        self.fmt = fmt
+        self.columns = columns
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+            self._csv.writeheader()
+
+    def write(self, row):
+        row = {key: _plain(row.get(key)) for key in self.columns if key in row}
+        if self._csv is not None:
+            # Nested values (lists, dicts) go into a single CSV cell as JSON.
+            self._csv.writerow({key: json.dumps(value) if isinstance(value, (list, dict)) else value
+                                for key, value in row.items()})
+        else:
+            self.stream.write(json.dumps(row) + "\n")
+        self.stream.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ysflight", description="Batch analysis of YSFlight aircraft and replays.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name, help_text, file_help):
+        command = commands.add_parser(name, help=help_text, description=help_text)
+        command.add_argument("paths", nargs="+", help=file_help)
+        command.add_argument("--workers", type=int, default=None, help="worker processes, defaults to every CPU")
+        command.add_argument("--cache", action="store_true", help="reuse results from earlier runs")
+        command.add_argument("--format", choices=CLI_FORMATS, default="jsonl", help="output format")
+        return command
+
+    dat_help = "DAT files, directories or glob patterns"
+    replay_help = "replay files, directories or glob patterns"
+    add_command("parse-dat", "Every DAT value of each aircraft.", dat_help)
+    add_command("fleet-summary", "Weights, thrust, engine and coefficients of each aircraft.", dat_help)
+    envelope = add_command("envelope", "Stall speed, top speed and climb per altitude of each aircraft.", dat_help)
+    envelope.add_argument("--altitudes", default=CLI_DEFAULT_ALTITUDES, help="start:stop:step in meters")
+    envelope.add_argument("--speeds", default=CLI_DEFAULT_SPEEDS, help="start:stop:step in m/s")
+    add_command("replay-summary", "Field, times and counts of each replay.", replay_help)
+    convert = add_command("convert", "Convert replays between .yfs text and .yfsb binary containers.", replay_help)
+    convert.add_argument("--to", choices=["yfs", "yfsb"], required=True, help="format to convert to")
+    convert.add_argument("--output", default=None, help="directory for the converted files, defaults to next to each source")
+    convert.add_argument("--compress", action="store_true", help="zlib compress .yfsb containers")
+    return parser
+
+
+def main(argv=None, stream=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    stream = sys.stdout if stream is None else stream
+    options = {"cache": args.cache}
+
+    if args.command in ["parse-dat", "fleet-summary", "envelope"]:
+        filepaths = find_files(args.paths, [".dat"])
+        task = {"parse-dat": _parse_dat_task, "fleet-summary": _fleet_summary_task, "envelope": _envelope_task}[args.command]
+        if args.command == "envelope":
+            for grid in [args.altitudes, args.speeds]:
+                try:
+                    _grid(grid)
+                except ValueError:
+                    parser.error("expected start:stop:step with a positive step. Got {}".format(grid))
+            options.update({"altitudes": args.altitudes, "speeds": args.speeds})
+        if args.cache:
+            # Create the cache database here so the workers do not race to set it up.
+            from .cache import DatCache
+            cache = DatCache()
+            if cache.enabled:
+                cache.connection
+            cache.close()
+    elif args.command == "replay-summary":
+        filepaths = find_files(args.paths, [".yfs"])
+        task = _replay_summary_task
+    else:
+        # Only the other format is converted, so earlier outputs are not picked up as inputs.
+        filepaths = find_files(args.paths, [i for i in CLI_CONVERT_TARGETS if i != "." + args.to])
+        task = _convert_task
+        options.update({"to": "." + args.to, "output": args.output, "compress": args.compress})
+        if args.output is not None:
+            os.makedirs(args.output, exist_ok=True)
+
+    if args.command == "replay-summary" and args.cache:
+        rows = _iter_stored_replays(filepaths, options, args.workers)
+    else:
+        rows = iter_rows(task, filepaths, options, args.workers)
+
+    writer = RowWriter(stream, args.format, CLI_COLUMNS[args.command])
+    failed = False
+    try:
+        for row in rows:
+            failed = failed or row.get("error") is not None
+            writer.write(row)
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head). Stop quietly.
+        sys.stdout = open(os.devnull, "w")
+        return 1
+
+    return 1 if failed else 0
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Combat statistics computed in bulk over the bullet records and kill credits of a replay.
+
+    hits_per_shooter(yfs)       shots fired, kills and kills per shot of every shooter
+    time_to_kill(yfs)           time and shots from a killer's first launch to each kill
+    weapon_effectiveness(yfs)   shots, kills, time to kill and range of every weapon
+    engagement_ranges(yfs)      distance from the killer to the kill position of each kill
+
+A replay only records the kills a weapon scored, not every hit, so the kill credits stand in for
+hits. Per kill results are arrays in the order of yfs.killcredits, per shooter and per weapon
+results are structured arrays.
+
+Shots are matched to kills by grouping the bullet records on (shooter type, shooter id, weapon)
+and sorting them by group then time. Each group is shifted by its index times a span longer than
+the replay, the same trick ysflight.resample uses, so one searchsorted call finds the shots of
+every kill.
+
+"""
+
+# Import 3rd Party Modules
+import numpy as np
+
+# Import YSFlight Modules
+from .resample import sample_airplanes
+
+# Define constants
+COMBAT_AIRPLANE_TYPE = "AIR"
+COMBAT_GROUND_TYPE = "GND"
+COMBAT_DEFAULT_WINDOW = 60.0  # seconds before a kill that shots still count towards it
+COMBAT_SHOOTER_DTYPE = np.dtype([("shooter_type", "U8"), ("shooter_id", "i4"), ("shots", "i8"),
+                                 ("kills", "i8"), ("kills_per_shot", "f8")])
+COMBAT_WEAPON_DTYPE = np.dtype([("weapon", "U32"), ("shots", "i8"), ("kills", "i8"), ("kills_per_shot", "f8"),
+                                ("mean_time_to_kill", "f8"), ("mean_range", "f8"), ("max_range", "f8")])
+
+
+def _group_keys(types, ids, weapons=None):
+    """Combine the type, id and optionally weapon codes into one int64 key per row."""
+    keys = types.astype(np.int64) * 2**32 + ids.astype(np.int64) % 2**32
+    if weapons is not None:
+        keys = keys * 2**15 + weapons.astype(np.int64)
+    return keys
+
+
+def hits_per_shooter(yfs):
+    """Count the shots and kills of every shooter.
+
+    inputs:
+    yfs (replay): a parsed replay
+
+    outputs:
+    shooters (np.ndarray): COMBAT_SHOOTER_DTYPE records sorted by shooter type then id. Shooters
+                           with kills but no bullet records are included with 0 shots.
+    """
+    bullets = yfs.bulletrecords
+    kills = yfs.killcredits
+    shot_keys = _group_keys(bullets["shooter_type"], bullets["shooter_id"])
+    kill_keys = _group_keys(kills["killer_type"], kills["killer_id"])
+
+    keys, inverse = np.unique(np.concatenate([shot_keys, kill_keys]), return_inverse=True)
+    inverse = inverse.ravel()
+    shots = np.bincount(inverse[:len(shot_keys)], minlength=len(keys))
+    kill_count = np.bincount(inverse[len(shot_keys):], minlength=len(keys))
+
+    result = np.empty(len(keys), dtype=COMBAT_SHOOTER_DTYPE)
+    result["shooter_type"] = yfs.names(keys // 2**32) if len(keys) > 0 else []
+    result["shooter_id"] = (keys % 2**32).astype(np.uint32).astype(np.int32)
+    result["shots"] = shots
+    result["kills"] = kill_count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result["kills_per_shot"] = np.where(shots > 0, kill_count / np.maximum(shots, 1), np.nan)
+    return result
+
+
+def time_to_kill(yfs, window=COMBAT_DEFAULT_WINDOW):
+    """Time from the first shot of an attack to the kill it scored.
+
+    An attack is every launch of the kill's weapon by the killer within window seconds before the
+    kill and after the killer's previous kill.
+
+    inputs:
+    yfs (replay): a parsed replay
+    window (float, int): seconds before a kill that shots still count towards it
+
+    outputs:
+    seconds (np.ndarray): time from the first shot to each kill, NaN when no shot was found.
+    shots (np.ndarray): number of shots of the attack, 0 when none was found.
+    """
+    if window <= 0:
+        print("Error: [time_to_kill] expected a positive window. Got {}".format(window))
+        raise ValueError
+
+    bullets = yfs.bulletrecords
+    kills = yfs.killcredits
+    seconds = np.full(len(kills), np.nan)
+    shots = np.zeros(len(kills), dtype=np.int64)
+    if len(bullets) == 0 or len(kills) == 0:
+        return seconds, shots
+
+    # Earliest time a shot may count: the window or the killer's previous kill, whichever is later.
+    killer_keys = _group_keys(kills["killer_type"], kills["killer_id"])
+    order = np.lexsort((kills["time"], killer_keys))
+    previous = np.full(len(kills), -np.inf)
+    same = killer_keys[order][1:] == killer_keys[order][:-1]
+    previous[order[1:][same]] = kills["time"][order][:-1][same]
+    start = np.maximum(kills["time"] - window, previous)
+
+    # Shots and kills share one group index per (shooter, weapon), shots are sorted within groups.
+    shot_keys = _group_keys(bullets["shooter_type"], bullets["shooter_id"], bullets["weapon"])
+    kill_keys = _group_keys(kills["killer_type"], kills["killer_id"], kills["weapon"])
+    _, inverse = np.unique(np.concatenate([shot_keys, kill_keys]), return_inverse=True)
+    inverse = inverse.ravel()
+    shot_group = inverse[:len(bullets)]
+    kill_group = inverse[len(bullets):]
+
+    origin = min(bullets["time"].min(), start.min())
+    span = max(bullets["time"].max(), kills["time"].max()) - origin + 1.0
+    shifted = np.sort(shot_group * span + (bullets["time"] - origin))
+
+    lower = kill_group * span + (start - origin)
+    upper = kill_group * span + (kills["time"] - origin)
+
+    # Shots at the time of the killer's previous kill belong to that kill.
+    first = np.where(start == previous,
+                     np.searchsorted(shifted, lower, side="right"),
+                     np.searchsorted(shifted, lower, side="left"))
+    count = np.searchsorted(shifted, upper, side="right") - first
+
+    found = count > 0
+    seconds[found] = upper[found] - shifted[first[found]]
+    shots[found] = count[found]
+    return seconds, shots
+
+
+def _object_positions(objects, ids, times, hold):
+    """Positions of the objects with ids at times, NaN where they cannot be looked up."""
+    if len(objects) == 0:
+        return np.full((len(ids), 3), np.nan)
+    if hold:
+        # Ground objects stay where they were last recorded.
+        first = np.array([a.records["time"].min() if len(a.records) > 0 else 0.0 for a in objects])
+        last = np.array([a.records["time"].max() if len(a.records) > 0 else 0.0 for a in objects])
+        known = (ids >= 0) & (ids < len(objects))
+        safe = np.where(known, ids, 0)
+        times = np.where(known, np.clip(times, first[safe], last[safe]), times)
+    return sample_airplanes(objects, ids, times, ["x", "y", "z"], "hold" if hold else "linear")
+
+
+def engagement_ranges(yfs):
+    """Distance from the killer to the kill position of every kill, with the killer's position
+    interpolated from the airplane (or ground object) records at the kill time.
+
+    inputs:
+    yfs (replay): a parsed replay
+
+    outputs:
+    ranges (np.ndarray): distance in meters of each kill, NaN when the killer has no position at
+                         the kill time.
+    """
+    kills = yfs.killcredits
+    killer = np.full((len(kills), 3), np.nan)
+    types = yfs.names(kills["killer_type"]) if len(kills) > 0 else np.zeros(0, dtype=object)
+
+    for kind, objects, hold in [(COMBAT_AIRPLANE_TYPE, yfs.airplanes, False), (COMBAT_GROUND_TYPE, yfs.groundob, True)]:
+        rows = np.flatnonzero(types == kind)
+        if len(rows) > 0:
+            killer[rows] = _object_positions(objects, kills["killer_id"][rows], kills["time"][rows], hold)
+
+    return np.sqrt(np.sum((killer - kills["position"].astype(np.float64))**2, axis=1))
+
+
+def weapon_effectiveness(yfs, window=COMBAT_DEFAULT_WINDOW):
+    """Shots, kills, time to kill and engagement range of every weapon.
+
+    inputs:
+    yfs (replay): a parsed replay
+    window (float, int): seconds before a kill that shots still count towards it, see time_to_kill
+
+    outputs:
+    weapons (np.ndarray): COMBAT_WEAPON_DTYPE records sorted by weapon name. Means skip the kills
+                          without a value and are NaN when there are none.
+    """
+    bullets = yfs.bulletrecords
+    kills = yfs.killcredits
+    codes, inverse = np.unique(np.concatenate([bullets["weapon"], kills["weapon"]]), return_inverse=True)
+    inverse = inverse.ravel()
+    shot_weapon = inverse[:len(bullets)]
+    kill_weapon = inverse[len(bullets):]
+
+    shots = np.bincount(shot_weapon, minlength=len(codes))
+    kill_count = np.bincount(kill_weapon, minlength=len(codes))
+    seconds = time_to_kill(yfs, window)[0]
+    ranges = engagement_ranges(yfs)
+
+    result = np.empty(len(codes), dtype=COMBAT_WEAPON_DTYPE)
+    result["weapon"] = yfs.names(codes) if len(codes) > 0 else []
+    result["shots"] = shots
+    result["kills"] = kill_count
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result["kills_per_shot"] = np.where(shots > 0, kill_count / np.maximum(shots, 1), np.nan)
+        result["mean_time_to_kill"] = _group_mean(kill_weapon, seconds, len(codes))
+        result["mean_range"] = _group_mean(kill_weapon, ranges, len(codes))
+
+    max_range = np.full(len(codes), -np.inf)
+    valid = np.isfinite(ranges)
+    np.maximum.at(max_range, kill_weapon[valid], ranges[valid])
+    result["max_range"] = np.where(np.isfinite(max_range), max_range, np.nan)
+    return result[np.argsort(result["weapon"], kind="stable")]
+
+
+def _group_mean(groups, values, count):
+    """Mean of the finite values of each group, NaN for groups without any."""
+    valid = np.isfinite(values)
+    totals = np.bincount(groups[valid], weights=values[valid], minlength=count)
+    counts = np.bincount(groups[valid], minlength=count)
+    return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Physical constants shared by the ysflight modules. This module imports nothing, so the modules that
+only need a constant (units) can be loaded without NumPy.
+
+"""
+
+# Define constants
+YSFLIGHT_G = 9.807
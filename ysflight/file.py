@@ -4,32 +4,264 @@
 
 A module for importing and exporting ysflight files
 
+Every reader decodes text with file_encoding(), which is YSFLIGHT_FILE_ENCODING when set and the
+locale's preferred encoding (what a text mode open() uses) otherwise.
+
+MappedFile memory-maps a file and finds every line boundary once with NumPy. Lines are then decoded
+only when they are asked for and raw byte slices are handed out as memoryviews without copying.
+import_file(filepath, mapped=True) returns one in place of the list of lines.
+
+Members of zip archives are read straight out of the archive without extracting them. They are
+named by the path to the archive followed by the member, like "packs/f16.zip/aircraft/f16.dat",
+so they can be handed to worker processes like any other filepath. import_file, iter_file and
+iter_file_offsets also accept an open file-like object. Archive members and file-like objects are
+streamed a chunk at a time instead of memory-mapped.
+
 """
 
 # Define constants
 YSFLIGHT_FILE_TYPES = [".dat", ".yfs", ".fld", ".dnm", ".srf", ".lst", ".stp", ".ist", ".acp"]
+YSFLIGHT_FILE_ENCODING = None  # None uses the locale's preferred encoding
+YSFLIGHT_MAPPED_MIN_BYTES = 1 << 20  # import_file(mapped=None) maps files at least this large
+YSFLIGHT_MAPPED_SCAN_BYTES = 1 << 26  # bytes searched for newlines at a time
+YSFLIGHT_MAPPED_BLOCK_LINES = 65536  # lines decoded together when iterating a MappedFile
+YSFLIGHT_ARCHIVE_TYPES = [".zip"]
+YSFLIGHT_ARCHIVE_HANDLES = 8  # zip archives kept open per process
+YSFLIGHT_STREAM_CHUNK_BYTES = 1 << 16  # bytes read at a time when streaming a file line by line
 
+# Import standard modules
 import os
+import re
+import mmap
+import locale
+import zipfile
+import contextlib
+from itertools import accumulate
+from collections import OrderedDict
+
+# Import 3rd Party Modules
+from .lazy import LazyModule
+np = LazyModule("numpy")  # imported when an array function first uses it
+
+
+def file_encoding():
+    """The encoding every YSFlight text file is read with."""
+    if YSFLIGHT_FILE_ENCODING is not None:
+        return YSFLIGHT_FILE_ENCODING
+    return locale.getpreferredencoding(False)
+
+
+_archives = OrderedDict()  # (process id, archive, size, mtime_ns): open zipfile.ZipFile
+
+
+def split_archive_path(filepath):
+    """Split a path to a member of a zip archive into the archive and the member.
+
+    input:
+    filepath (str): os.path like string, e.g. "packs/f16.zip/aircraft/f16.dat"
+
+    output:
+    archive (str, None): path to the archive, None when filepath is not inside an archive
+    member (str, None): name of the member inside the archive, with / separators
+    """
+    if isinstance(filepath, (str, os.PathLike)) is False:
+        return None, None
+    filepath = os.fspath(filepath)
+    if os.path.isfile(filepath):
+        return None, None
+
+    pattern = r"({})[\\/]".format("|".join(re.escape(i) for i in YSFLIGHT_ARCHIVE_TYPES))
+    for match in re.finditer(pattern, filepath, flags=re.IGNORECASE):
+        archive = filepath[:match.end() - 1]
+        if os.path.isfile(archive):
+            return archive, filepath[match.end():].replace("\\", "/")
+    return None, None
+
+
+def is_archive(filepath):
+    """True when filepath is a zip archive that files can be read out of."""
+    return os.path.splitext(filepath)[-1].lower() in YSFLIGHT_ARCHIVE_TYPES and zipfile.is_zipfile(filepath)
+
+
+def is_file_like(source):
+    """True for open file objects and anything else with a read method."""
+    return hasattr(source, "read")
+
+
+def is_virtual(source):
+    """True for archive members and file-like objects, which are streamed instead of mapped."""
+    return is_file_like(source) or split_archive_path(source)[0] is not None
+
+
+def source_name(source):
+    """The name a source is checked against YSFLIGHT_FILE_TYPES by. None for a file-like object
+    without a name, which is not checked."""
+    if is_file_like(source):
+        name = getattr(source, "name", None)
+        return name if isinstance(name, str) else None
+    return os.fspath(source)
+
+
+def open_archive(archive):
+    """Open a zip archive for reading, reusing the handle this process already has open.
+
+    Handles are not shared with worker processes started by fork, each process opens its own.
+
+    input:
+    archive (str): os.path like string to a zip archive
+
+    output:
+    handle (zipfile.ZipFile): the open archive
+    """
+    stat = os.stat(archive)
+    key = (os.getpid(), os.path.abspath(archive), stat.st_size, stat.st_mtime_ns)
+    handle = _archives.pop(key, None)
+    if handle is None:
+        handle = zipfile.ZipFile(archive, mode='r')
+    _archives[key] = handle
+    while len(_archives) > YSFLIGHT_ARCHIVE_HANDLES:
+        _archives.popitem(last=False)[1].close()
+    return handle
+
+
+def iter_archive(archive, extensions=None):
+    """List the members of a zip archive as filepaths that every reader accepts.
+
+    input:
+    archive (str): os.path like string to a zip archive
+    extensions (list, None): lower case extensions, e.g. [".dat"], to keep. None keeps every file.
+
+    output:
+    filepaths (list): "<archive>/<member>" for every file in the archive
+    """
+    filepaths = list()
+    for info in open_archive(archive).infolist():
+        if info.is_dir():
+            continue
+        if extensions is None or info.filename.lower().endswith(tuple(extensions)):
+            filepaths.append(archive + "/" + info.filename)
+    return filepaths
+
+
+def open_source(source):
+    """Open a file, zip archive member or file-like object for reading bytes.
+
+    input:
+    source (str, file-like): os.path like string to a file or archive member, or a file-like object
+
+    output:
+    stream (context manager): the binary stream. A file-like object is handed back as it is and
+                              is not closed at the end of the with block.
+    """
+    if is_file_like(source):
+        return contextlib.nullcontext(source)
+
+    archive, member = split_archive_path(source)
+    if archive is not None:
+        try:
+            return open_archive(archive).open(member, mode='r')
+        except KeyError:
+            raise FileNotFoundError
+    if os.path.isfile(source) is False:
+        raise FileNotFoundError
+    return open(source, mode='rb')
+
+
+def source_exists(source):
+    """True when a file or archive member exists. File-like objects always do."""
+    if is_file_like(source):
+        return True
+    archive, member = split_archive_path(source)
+    if archive is None:
+        return os.path.isfile(source)
+    try:
+        open_archive(archive).getinfo(member)
+    except (KeyError, OSError, zipfile.BadZipFile):
+        return False
+    return True
+
+
+def source_stat(source):
+    """Size and modification time of a file or archive member.
+
+    input:
+    source (str): os.path like string to a file or archive member
+
+    output:
+    size (int): bytes, uncompressed for an archive member
+    mtime_ns (int): modification time, the archive's for an archive member
+    """
+    archive, member = split_archive_path(source)
+    if archive is None:
+        stat = os.stat(source)
+        return stat.st_size, stat.st_mtime_ns
+    try:
+        info = open_archive(archive).getinfo(member)
+    except KeyError:
+        raise FileNotFoundError
+    return info.file_size, os.stat(archive).st_mtime_ns
+
+
+def source_size(source):
+    """Size in bytes of a file or archive member, None for a file-like object."""
+    if is_file_like(source):
+        return None
+    return source_stat(source)[0]
+
 
-def import_file(filepath):
+def read_source(source):
+    """Every byte of a file, archive member or file-like object."""
+    with open_source(source) as stream:
+        data = stream.read()
+    return data.encode(file_encoding()) if isinstance(data, str) else data
+
+
+def _check_source(source):
+    """The FileNotFoundError and TypeError checks shared by the readers."""
+    if source_exists(source) is False:
+        raise FileNotFoundError
+    name = source_name(source)
+    if name is not None and os.path.splitext(name)[-1] not in YSFLIGHT_FILE_TYPES:
+        print("Error: File is not a valid YSFlight File Type: {}".format(YSFLIGHT_FILE_TYPES))
+        raise TypeError
+
+
+def import_file(filepath, mapped=False):
     """Import a text file and format as needed based on type of file. Only import
     YSFlight files as defined by file extension.
     
     input:
-    filepath (str): os.path like string to where a file is
+    filepath (str, file-like): os.path like string to where a file or zip archive member is, or
+                               a file-like object
+    mapped (bool, None): return a MappedFile instead of reading the whole file. None maps files
+                         of at least YSFLIGHT_MAPPED_MIN_BYTES. Archive members and file-like
+                         objects are never mapped.
     
     output:
-    lines (list): a list of strings which are the lines of the ysflight file.
+    lines (list, MappedFile): the lines of the ysflight file. A MappedFile can be iterated,
+                              indexed and sliced like the list.
     """    
-    if os.path.isfile(filepath) is False:
-        raise FileNotFoundError
-    elif os.path.splitext(filepath)[-1] not in YSFLIGHT_FILE_TYPES:
-        print("Error: File is not a valid YSFlight File Type: {}".format(YSFLIGHT_FILE_TYPES))
-        raise TypeError
+    _check_source(filepath)
+
+    if is_virtual(filepath):
+        with open_source(filepath) as stream:
+            data = stream.read()
+        lines = (data if isinstance(data, str) else data.decode(file_encoding())).splitlines()
+        if len(lines) == 0:
+            print("YSFlight File Import Issue: No lines in file")
+        return lines
+
+    if mapped is None:
+        mapped = os.path.getsize(filepath) >= YSFLIGHT_MAPPED_MIN_BYTES
+    if mapped:
+        lines = MappedFile(filepath)
+        if len(lines) == 0:
+            print("YSFlight File Import Issue: No lines in file")
+        return lines
         
     # If valid YSFlight file found, proceed with import and ensure that the 
     # newline (\n) character is removed from each row
-    with open(filepath, mode='r') as ysflight_file:
+    with open(filepath, mode='r', encoding=file_encoding()) as ysflight_file:
         lines = ysflight_file.read().splitlines()
     
     # Make sure we imported something
@@ -44,6 +276,196 @@ def import_file(filepath):
     return lines
 
 
+def iter_file(filepath):
+    """Read a YSFlight text file one line at a time instead of loading it all at once. Only YSFlight 
+    files as defined by file extension are read.
+    
+    input:
+    filepath (str, file-like): os.path like string to where a file or zip archive member is, or
+                               a file-like object
+    
+    output:
+    lines (generator): yields each line of the file without the newline character. The file is 
+                       closed when the generator is exhausted or closed early.
+    """
+    _check_source(filepath)
+
+    if is_virtual(filepath):
+        for _, line in _iter_stream_offsets(filepath):
+            yield line
+        return
+
+    with open(filepath, mode='r', encoding=file_encoding()) as ysflight_file:
+        for line in ysflight_file:
+            yield line.rstrip("\r\n")
+
+
+def iter_file_offsets(filepath):
+    """Read a YSFlight text file one line at a time along with the byte offset each line starts at,
+    so that a later read can seek straight back to it.
+    
+    input:
+    filepath (str, file-like): os.path like string to where a file or zip archive member is, or
+                               a file-like object
+    
+    output:
+    lines (generator): yields (offset, line) tuples with the newline character removed from line.
+                       Only one chunk of YSFLIGHT_STREAM_CHUNK_BYTES is held at a time, no line
+                       offsets are kept for the whole file.
+    """
+    _check_source(filepath)
+    yield from _iter_stream_offsets(filepath)
+
+
+def _iter_stream_offsets(source):
+    """iter_file_offsets for files, archive members and file-like objects, decoding a chunk at a time."""
+    encoding = file_encoding()
+    with open_source(source) as stream:
+        offset = 0
+        tail = b""
+        while True:
+            chunk = stream.read(YSFLIGHT_STREAM_CHUNK_BYTES)
+            if isinstance(chunk, str):
+                chunk = chunk.encode(encoding)
+            if len(chunk) == 0:
+                break
+
+            # Only whole lines are decoded, the rest is kept for the next chunk.
+            data = tail + chunk
+            cut = data.rfind(b"\n") + 1
+            tail = data[cut:]
+            if cut == 0:
+                continue
+            text = data[:cut - 1].decode(encoding)
+            lines = text.split("\n")
+            # Line lengths in characters are the byte lengths unless something decoded to fewer.
+            raw = lines if len(text) == cut - 1 else data[:cut - 1].split(b"\n")
+            starts = list(accumulate([len(i) + 1 for i in raw[:-1]], initial=offset))
+            if b"\r" in data:
+                lines = [line.rstrip("\r") for line in lines]
+            yield from zip(starts, lines)
+            offset += cut
+
+        if len(tail) > 0:
+            yield offset, tail.decode(encoding).rstrip("\r")
+
+
+def read_file_range(filepath, start, end):
+    """Read the lines between two byte offsets of a YSFlight text file.
+    
+    input:
+    filepath (str): os.path like string to where a file or zip archive member is
+    start (int): byte offset of the first line to read
+    end (int, None): byte offset to stop reading at. None reads to the end of the file.
+    
+    output:
+    lines (list): a list of strings which are the lines in the byte range.
+    """
+    with open_source(filepath) as ysflight_file:
+        ysflight_file.seek(start)
+        data = ysflight_file.read() if end is None else ysflight_file.read(end - start)
+    
+    return data.decode(file_encoding()).splitlines()
+
+
+class MappedFile:
+    """A read only, memory-mapped YSFlight text file.
+
+    The byte offset of every line is found once when the file is opened. Indexing decodes single
+    lines on demand, raw() returns the bytes of a line as a memoryview into the map and
+    iter_offsets() decodes blocks of lines at a time. Lines end at \\n with a trailing \\r removed,
+    the encoding must keep \\n a single byte (ASCII compatible encodings do).
+
+    Use as a context manager or call close() to release the file. Memoryviews returned by raw()
+    have to be released first.
+    """
+    def __init__(self, filepath, encoding=None):
+        """
+        inputs:
+        filepath (str): os.path like string to where a file is
+        encoding (str, None): text encoding, defaults to file_encoding()
+        """
+        if os.path.isfile(filepath) is False:
+            raise FileNotFoundError
+        elif os.path.splitext(filepath)[-1] not in YSFLIGHT_FILE_TYPES:
+            print("Error: File is not a valid YSFlight File Type: {}".format(YSFLIGHT_FILE_TYPES))
+            raise TypeError
+
+        self.filepath = filepath
+        self.encoding = file_encoding() if encoding is None else encoding
+        self._file = open(filepath, mode='rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+
+        # mmap cannot map an empty file.
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else b""
+
+        # starts[i] is the offset of line i and ends[i] the offset of its newline (or \r\n).
+        newlines = list()
+        for block_start in range(0, self.size, YSFLIGHT_MAPPED_SCAN_BYTES):
+            block = np.frombuffer(self._map, dtype=np.uint8, count=min(YSFLIGHT_MAPPED_SCAN_BYTES, self.size - block_start), offset=block_start)
+            newlines.append(np.flatnonzero(block == 10) + block_start)
+            del block
+        newlines = np.concatenate(newlines) if len(newlines) > 0 else np.zeros(0, dtype=np.int64)
+
+        # Text after the last newline is one more line.
+        if self.size > 0 and (len(newlines) == 0 or newlines[-1] != self.size - 1):
+            newlines = np.append(newlines, self.size)
+        self.starts = np.concatenate([[0], newlines[:-1] + 1]).astype(np.int64) if len(newlines) > 0 else np.zeros(0, dtype=np.int64)
+        self.ends = newlines.astype(np.int64)
+        if self.size > 0 and len(newlines) > 0:
+            has_cr = np.zeros(len(newlines), dtype=bool)
+            inside = (self.ends > self.starts) & (self.ends <= self.size)
+            has_cr[inside] = np.frombuffer(self._map, dtype=np.uint8)[self.ends[inside] - 1] == 13
+            self.ends = self.ends - has_cr
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        for _, line in self.iter_offsets():
+            yield line
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        return self._map[self.starts[item]:self.ends[item]].decode(self.encoding)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def raw(self, item):
+        """The bytes of line item, without the newline, as a memoryview into the map."""
+        return memoryview(self._map)[self.starts[item]:self.ends[item]]
+
+    def line_at(self, offset):
+        """Index of the line holding byte offset."""
+        return int(np.searchsorted(self.starts, offset, side="right")) - 1
+
+    def iter_offsets(self, start=0, stop=None):
+        """Yield (byte offset, line) tuples for lines start to stop, decoding a block at a time."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for block_start in range(start, stop, YSFLIGHT_MAPPED_BLOCK_LINES):
+            block_stop = min(block_start + YSFLIGHT_MAPPED_BLOCK_LINES, stop)
+            text = self._map[self.starts[block_start]:self.ends[block_stop - 1]].decode(self.encoding)
+            lines = text.split("\n")
+            if "\r" in text:
+                lines = [line.rstrip("\r") for line in lines]
+            yield from zip(self.starts[block_start:block_stop].tolist(), lines)
+
+    def read_range(self, start, end):
+        """The lines between two byte offsets, like read_file_range."""
+        end = self.size if end is None else end
+        return self._map[start:end].decode(self.encoding).splitlines()
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+
 def export_file(filepath, data):
     """Export a ysflight file to a specified location. Overwrite an existing file
     if one exists.
@@ -43,19 +43,25 @@ YSFLIGHT_WEAPON_NAMES = ["B500", "B500HD", "B250", "RKT", "FUEL", "AGM65", "AIM9
 import os
 
 # Import 3rd Party Modules
-import numpy as np
+from ..lazy import LazyModule
+np = LazyModule("numpy")  # imported when an array function first uses it
 
 # Import YSFlight Modules
-from ..file import import_file
+from .. import instrument
+from ..file import import_file, source_name, source_size, MappedFile
 from ..units import convert_unit, determine_value_units
-from ..simulation import YSFLIGHT_G, get_air_density, calculate_thrust
+from ..simulation import calculate_thrust, calculate_thrust_array
+from ..atmosphere import air_density, air_density_array
 
 
-def AircraftDat(filepath):
+@instrument.timed("AircraftDat")
+def AircraftDat(filepath, keep_raw=False):
     """Parse an aircraft dat from a filepath.
     
     inputs:
-    filepath (str): an os.path-like string to a dat file.
+    filepath (str, file-like): an os.path-like string to a dat file or to a dat file inside a zip
+                               archive ("pack.zip/aircraft/f16.dat"), or an open file-like object.
+    keep_raw (bool): keep the raw DAT line on every hardpoint, weapon shape and camera.
     
     output:
     airplane (AirplaneDat): an AirplaneDat class instance
@@ -63,26 +69,46 @@ def AircraftDat(filepath):
     
     # Only want to import a .dat file. Flag other filetypes as invalid because 
     # they may not contain the expected data the user wants.
-    if filepath.lower().endswith("dat") is False:
-        print("Error: [AircraftDat] expected a DAT file but was provided a {} file.".format(os.path.splitext(filepath)[-1]))
+    name = source_name(filepath)
+    if name is not None and name.lower().endswith("dat") is False:
+        print("Error: [AircraftDat] expected a DAT file but was provided a {} file.".format(os.path.splitext(name)[-1]))
         raise TypeError
     
-    # Import the file
-    raw_dat = import_file(filepath)
+    # Import the file. Unusually large DATs are memory-mapped instead of read whole.
+    profiling = instrument.enabled()
+    with instrument.stage("AircraftDat.import_file") as timer:
+        raw_dat = import_file(filepath, mapped=None)
+        if profiling:
+            timer.count(len(raw_dat), source_size(filepath) or 0)
     
     # Extract information from the DAT.
-    dat = dict()
-    smokecols = dict()
-    turrets = dict()
-    weaponshapes = list()
-    hardpoints = list()
-    realprops = dict()
-    loadweapons = dict()
-    excameras = list()
-    flap_positions = list()
-    for key in YSFLIGHT_WEAPON_NAMES:
-        loadweapons[key] = 0
+    parse = DatParse(keep_raw)
+    try:
+        with instrument.stage("AircraftDat.parse_lines", len(raw_dat) if profiling else 0):
+            _parse_lines(parse, raw_dat, _profiled_keywords() if profiling else YSFLIGHT_DAT_KEYWORDS)
+    finally:
+        # Release the file and map of a memory-mapped DAT right away instead of at garbage collection.
+        if isinstance(raw_dat, MappedFile):
+            raw_dat.close()
     
+    # Package up into class
+    with instrument.stage("AircraftDat.package"):
+        DAT = AirplaneDat(parse.dat, parse.smokecols, parse.turrets, parse.weaponshapes, parse.hardpoints, parse.realprops, 
+                          parse.loadweapons, parse.excameras, parse.flap_positions, parse.unknown_keywords)
+
+    return DAT
+
+
+def _parse_lines(parse, raw_dat, keywords=None):
+    """Hand every DAT variable line to its keyword handler.
+    
+    inputs:
+    parse (DatParse): collects the values
+    raw_dat (list, MappedFile): the lines of the DAT
+    keywords (dict, None): DAT variable: handler, defaults to YSFLIGHT_DAT_KEYWORDS
+    """
+    if keywords is None:
+        keywords = YSFLIGHT_DAT_KEYWORDS
     for line in raw_dat:
         if len(line) > 8 and line.startswith("REM") is False:
             if " " not in line[:8]:
@@ -92,93 +118,231 @@ def AircraftDat(filepath):
                 # variable) and process the units.
                 parts = line.split('#')[0].split()[1:]
                 
-                # Evaluate if we need to prep the turret, and realprop dicts to contain all the parts of the DAT
-                if datvar == "NMTURRET":
-                    for i in range(int(parts[0])):
-                        turrets[i] = dict()     
-                elif datvar == "NREALPRP":
-                    for i in range(int(parts[0])):
-                        realprops[i] = dict()
-
-                # Handle dat variables that can be fully defined in a single line, but multiple 
-                # definitions would be overwritten using the normal process because they use the 
-                # same DAT variable.
-                if datvar == "WPNSHAPE":
-                    weaponshapes.append(WeaponShape(line))
-                    continue  # No need for further analysis of this line
-                elif datvar == "HRDPOINT":
-                    hardpoints.append(HardPoints(line, len(hardpoints)))
-                    continue  # No need for further analysis of this line
-                elif datvar == "LOADWEPN":
-                    loadweapons[parts[0]] = int(parts[1])
-                    continue  # No need for further analysis of this line
-                elif datvar == "SMOKECOL":
-                    smokecols[int(parts[0])] = [int(i) for i in parts[1:]]
-                    continue  # No need for further analysis of this line
-                elif datvar == "EXCAMERA":
-                    excameras.append(ExCamera(line))
-                    continue  # No need for further analysis of this line
-                elif datvar == "FLAPPOSI":
-                    flap_positions.append(float(parts[0].split()[1]))
-                        
-                # Assign values for properties that take mulitple lines to fully define.
-                if datvar in YSFLIGHT_DAT_TURRET_VARS:
-                    turret_id = int(parts[0])
-                    parts = parts[1:]   # Ignore the turret ID
-                    
-                    # Handle the boolean (present/not present) turret targetting
-                    if datvar in ["TURRETAR", "TURRETGD"]:
-                        turrets[turret_id][datvar] = True
-                    else:
-                        for idx, part in enumerate(parts): 
-                            value, units = determine_value_units(part)
-                            if units not in ["STRING", "NUMBER", "BOOL"]:    
-                                parts[idx] = convert_unit(value, units)
-                        turrets[turret_id][datvar] = parts
-                        
-                elif datvar == "REALPROP":
-                    engine_id = int(parts[0])
-                    parts = parts[1:]
-                    
-                    for idx, part in enumerate(parts):
-                        value, units = determine_value_units(part)
-                        if units not in ["STRING", "NUMBER", "BOOL"]:
-                            parts[idx] = convert_unit(value, units)
-                            
-                    realprops[engine_id][datvar] = parts
-                
-                elif datvar in YSFLIGHT_DAT_NONDIM_VARS:
-                    try:
-                        dat[datvar] = float(parts[0])
-                    except ValueError:
-                        dat[datvar] = parts[0]
-                        
-                elif datvar in YSFLIGHT_DAT_BOOL_VARS:
-                    dat[datvar] = determine_value_units(parts[0])[0]
-                        
+                handler = keywords.get(datvar)
+                if handler is None:
+                    parse.unknown_keywords.setdefault(datvar, list()).append(line)
                 else:
-                    for idx, part in enumerate(parts):
-                        value, units = determine_value_units(part)
-                        if units not in ["STRING", "NUMBER", "BOOL"]:
-                            # print(line)
-                            parts[idx] = convert_unit(value, units)
-                            
-                    if len(parts) == 1:
-                        dat[datvar] = parts[0]
-                    else:
-                        dat[datvar] = parts
-                
+                    handler(parse, datvar, parts, line)
+
+
+def _profiled_keywords():
+    """YSFLIGHT_DAT_KEYWORDS with every handler recorded as an AircraftDat.keywords.<name> stage.
+    Only used while instrumentation is on so the plain handlers run without any wrapper."""
+    timed = dict()
+    for handler in set(YSFLIGHT_DAT_KEYWORDS.values()):
+        name = "AircraftDat.keywords." + handler.__name__[len("_handle_"):]
+        timed[handler] = instrument.timed(name, items=lambda *args: 1)(handler)
+    return {datvar: timed[handler] for datvar, handler in YSFLIGHT_DAT_KEYWORDS.items()}
+
+
+class DatParse:
+    """Everything collected from the lines of a DAT file while it is being parsed."""
+    def __init__(self, keep_raw=False):
+        self.keep_raw = keep_raw  # keep the raw DAT line on hardpoints, weapon shapes and cameras
+        self.dat = dict()
+        self.smokecols = dict()
+        self.turrets = dict()
+        self.weaponshapes = list()
+        self.hardpoints = list()
+        self.realprops = dict()
+        self.loadweapons = dict()
+        self.excameras = list()
+        self.flap_positions = list()
+        self.unknown_keywords = dict()  # DAT variable: list of raw lines
+        for key in YSFLIGHT_WEAPON_NAMES:
+            self.loadweapons[key] = 0
+
+
+# DAT keyword handlers. Each is called with the DatParse being filled, the DAT variable, the values 
+# on the line (comment and DAT variable removed) and the raw line.
+
+@instrument.timed("AircraftDat.units", items=len)
+def _convert_parts(parts):
+    """Convert every value with units into default YSFlight units in place."""
+    for idx, part in enumerate(parts):
+        value, units = determine_value_units(part)
+        if units not in ["STRING", "NUMBER", "BOOL"]:
+            parts[idx] = convert_unit(value, units)
+    return parts
+
+
+def _handle_units(parse, datvar, parts, line):
+    """Values that may carry units. A single value is stored on its own, several as a list."""
+    _convert_parts(parts)
+    if len(parts) == 1:
+        parse.dat[datvar] = parts[0]
+    else:
+        parse.dat[datvar] = parts
+
+
+def _handle_nondim(parse, datvar, parts, line):
+    try:
+        parse.dat[datvar] = float(parts[0])
+    except ValueError:
+        parse.dat[datvar] = parts[0]
+
+
+def _handle_bool(parse, datvar, parts, line):
+    parse.dat[datvar] = determine_value_units(parts[0])[0]
+
+
+def _handle_turret(parse, datvar, parts, line):
+    turret_id = int(parts[0])
+    parts = parts[1:]   # Ignore the turret ID
     
-    # Package up into class
-    DAT = AirplaneDat(dat, smokecols, turrets, weaponshapes, hardpoints, realprops, loadweapons, excameras, flap_positions)
+    # Handle the boolean (present/not present) turret targetting
+    if datvar in ["TURRETAR", "TURRETGD"]:
+        parse.turrets[turret_id][datvar] = True
+    else:
+        parse.turrets[turret_id][datvar] = _convert_parts(parts)
 
-    return DAT
+
+def _handle_realprop(parse, datvar, parts, line):
+    engine_id = int(parts[0])
+    parse.realprops[engine_id][datvar] = _convert_parts(parts[1:])
+
+
+def _handle_nmturret(parse, datvar, parts, line):
+    # Prep the turret dict to contain all the turrets of the DAT
+    for i in range(int(parts[0])):
+        parse.turrets[i] = dict()
+    _handle_nondim(parse, datvar, parts, line)
+
+
+def _handle_nrealprp(parse, datvar, parts, line):
+    # Prep the realprop dict to contain all the engines of the DAT
+    for i in range(int(parts[0])):
+        parse.realprops[i] = dict()
+    _handle_nondim(parse, datvar, parts, line)
+
+
+# Handle dat variables that can be fully defined in a single line, but multiple definitions would be
+# overwritten using the normal process because they use the same DAT variable.
+
+def _handle_wpnshape(parse, datvar, parts, line):
+    parse.weaponshapes.append(WeaponShape(line, parse.keep_raw))
+
+
+def _handle_hrdpoint(parse, datvar, parts, line):
+    parse.hardpoints.append(HardPoints(line, len(parse.hardpoints), parse.keep_raw))
+
+
+def _handle_loadwepn(parse, datvar, parts, line):
+    parse.loadweapons[parts[0]] = int(parts[1])
+
+
+def _handle_smokecol(parse, datvar, parts, line):
+    parse.smokecols[int(parts[0])] = [int(i) for i in parts[1:]]
+
+
+def _handle_excamera(parse, datvar, parts, line):
+    parse.excameras.append(ExCamera(line, parse.keep_raw))
+
+
+def _handle_flapposi(parse, datvar, parts, line):
+    parse.flap_positions.append(float(parts[0]))
+    _handle_nondim(parse, datvar, parts, line)
+
+
+# Keyword registry. Maps every known DAT variable to the handler that stores its line. Parsing a line
+# is a single lookup in this dict. Lines whose DAT variable is not registered are collected in
+# AirplaneDat.unknown_keywords, so new DAT variables only need to be added here.
+YSFLIGHT_DAT_KEYWORDS = dict()
+for _datvars in [YSFLIGHT_DAT_DISTANCE_VARS, YSFLIGHT_DAT_SPEED_VARS, YSFLIGHT_DAT_FORCE_VARS, 
+                 YSFLIGHT_DAT_WEIGHT_VARS, YSFLIGHT_DAT_AREA_VARS, YSFLIGHT_DAT_ANGLE_VARS]:
+    for _datvar in _datvars:
+        YSFLIGHT_DAT_KEYWORDS[_datvar] = _handle_units
+for _datvar in YSFLIGHT_DAT_BOOL_VARS:
+    YSFLIGHT_DAT_KEYWORDS[_datvar] = _handle_bool
+for _datvar in YSFLIGHT_DAT_NONDIM_VARS:
+    YSFLIGHT_DAT_KEYWORDS[_datvar] = _handle_nondim
+for _datvar in YSFLIGHT_DAT_TURRET_VARS:
+    YSFLIGHT_DAT_KEYWORDS[_datvar] = _handle_turret
+
+YSFLIGHT_DAT_KEYWORDS.update({"IDENTIFY": _handle_units, 
+                              "SUBSTNAM": _handle_units, 
+                              "CATEGORY": _handle_units, 
+                              "AIRCLASS": _handle_units, 
+                              "INSTPANL": _handle_units, 
+                              "INITFUEL": _handle_units, 
+                              "GUNINTVL": _handle_units, 
+                              "BULSPEED": _handle_units, 
+                              "BULRANGE": _handle_units, 
+                              "PROPELLR": _handle_units, 
+                              "REALPROP": _handle_realprop, 
+                              "NMTURRET": _handle_nmturret, 
+                              "NREALPRP": _handle_nrealprp, 
+                              "WPNSHAPE": _handle_wpnshape, 
+                              "HRDPOINT": _handle_hrdpoint, 
+                              "LOADWEPN": _handle_loadwepn, 
+                              "SMOKECOL": _handle_smokecol, 
+                              "EXCAMERA": _handle_excamera, 
+                              "FLAPPOSI": _handle_flapposi})
     
     
+class DatValues(dict):
+    """The dat dictionary of an AirplaneDat. Counts every modification in version so that values 
+    derived from the dat know when they have to be recalculated."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+        
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+        
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+        
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return super().setdefault(key, default)
+        
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+        
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+        
+    def clear(self):
+        super().clear()
+        self.version += 1
+        
+    def __reduce__(self):
+        # Rebuild from a plain dict so pickle does not call __setitem__ before version exists.
+        return (self.__class__, (dict(self),), self.__dict__)
+        
+        
+def _aero_property(name, doc):
+    """Read only property for a coefficient that autocalc derives from the dat."""
+    return property(lambda self: self.coefficients()[name], doc=doc)
     
     
 class AirplaneDat:
-    def __init__(self, dat, smokecols, turrets, weaponshapes, hardpoints, realprops, loadweapons, excameras, flap_positions):
+    # Aerodynamic properties derived from the dat. They are calculated on first access and kept 
+    # until the dat is modified, so code that only reads dat values never runs autocalc.
+    cl_zero = _aero_property("cl_zero", "Lift coefficient at zero angle of attack.")
+    cl_land = _aero_property("cl_land", "Lift coefficient at the landing reference angle of attack.")
+    cl_slope = _aero_property("cl_slope", "Lift curve slope per radian.")
+    cd_zero = _aero_property("cd_zero", "Drag coefficient at zero angle of attack.")
+    cd_land = _aero_property("cd_land", "Drag coefficient at the landing reference angle of attack.")
+    cd_const = _aero_property("cd_const", "Induced drag factor applied to the angle of attack squared.")
+    cd_max = _aero_property("cd_max", "Drag coefficient at maximum speed.")
+    t_cruise = _aero_property("t_cruise", "Thrust at the cruise reference condition in Newtons.")
+    t_vmax = _aero_property("t_vmax", "Thrust at maximum speed in Newtons.")
+    t_landing = _aero_property("t_landing", "Thrust at the landing reference condition in Newtons.")
+    cl_angles = _aero_property("cl_angles", "Angles of attack of the lift curve points in radians.")
+    cl_points = _aero_property("cl_points", "Lift coefficients of the lift curve points.")
+    
+    def __init__(self, dat, smokecols, turrets, weaponshapes, hardpoints, realprops, loadweapons, excameras, flap_positions, unknown_keywords=None):
         self.dat = dat
         self.smokecols = smokecols
         self.turrets = turrets
@@ -188,27 +352,33 @@ class AirplaneDat:
         self.loadweapons = loadweapons
         self.excameras = excameras
         self.flap_positions = flap_positions
+        self.unknown_keywords = dict() if unknown_keywords is None else unknown_keywords  # DAT variable: raw lines
         
-        # Define class properties
-        self.cl_zero = np.nan
-        self.cl_land = np.nan
-        self.cl_slope = np.nan
-        
-        self.cd_zero = np.nan
-        self.cd_land = np.nan
-        self.cd_const = np.nan
-        self.cd_max = np.nan
-        
-        self.t_cruise = np.nan
-        self.t_vmax = np.nan
-        self.t_landing = np.nan
+        # Perform initial analysis. The aerodynamic properties are calculated when first used.
+        self.apply_defaults()
         
-        self.cl_angles = list()
-        self.cl_points = list()
+    @property
+    def dat(self):
+        return self._dat
+    
+    @dat.setter
+    def dat(self, dat):
+        if isinstance(dat, DatValues) is False:
+            dat = DatValues(dat)
+        self._dat = dat
+        self._aero = None
+        self._aero_version = None
+        
+    def coefficients(self):
+        """Return the aerodynamic properties derived from the dat, running autocalc if the dat has 
+        changed since they were last calculated.
         
-        # Perform initial analysis
-        self.apply_defaults()
-        self.autocalc()
+        outputs:
+        aero (dict): property name: value for cl_zero, cd_zero, t_cruise, cl_points, etc.
+        """
+        if self._aero is None or self._aero_version != self._dat.version:
+            self.autocalc()
+        return self._aero
         
     def apply_defaults(self):
         """Ensure dat file has default values incorporated incase something requires them."""
@@ -250,40 +420,49 @@ class AirplaneDat:
             self.flap_positions = [0, 0.25, 0.5, 0.75, 1.0]  # default from fsairplaneproperty.cpp
         
         
+    @instrument.timed("AirplaneDat.autocalc")
     def autocalc(self):
         """Automatically calculate the properties from the dat file."""
         
+        dat = self.dat
+        
         # Caluclate CL properties
-        # print(type(self.dat['WEIGHCLN']),self.dat['WEIGHCLN'], type(self.dat['WEIGFUEL']),self.dat['WEIGFUEL'], type(self.dat['REFACRUS']), self.dat['REFACRUS'], type(self.dat['REFVCRUS']), self.dat['REFVCRUS'], type(self.dat['WINGAREA']), self.dat['WINGAREA'])
-        self.cl_zero = YSFLIGHT_G * (self.dat['WEIGHCLN'] + self.dat["WEIGFUEL"]) / (0.5 * get_air_density(self.dat['REFACRUS']) * self.dat['REFVCRUS']**2 * self.dat['WINGAREA'])
-        self.cl_land = YSFLIGHT_G * (self.dat['WEIGHCLN'] + self.dat['WEIGFUEL']) / (0.5 * get_air_density(0) * self.dat['REFVCRUS']**2 * self.dat['WINGAREA']) * (1 / (1 + self.dat['CLBYFLAP'])) * (1 / (1 + self.dat['CLVARGEO']))
-        self.cl_slope = (self.cl_land - self.cl_zero) / (self.dat['REFAOALD'])
+        # Weights are already converted to Newtons by the DAT parser.
+        cl_zero = (dat['WEIGHCLN'] + dat["WEIGFUEL"]) / (0.5 * air_density(dat['REFACRUS']) * dat['REFVCRUS']**2 * dat['WINGAREA'])
+        cl_land = (dat['WEIGHCLN'] + dat['WEIGFUEL']) / (0.5 * air_density(0) * dat['REFVLAND']**2 * dat['WINGAREA']) * (1 / (1 + dat['CLBYFLAP'])) * (1 / (1 + dat['CLVARGEO']))
+        cl_slope = (cl_land - cl_zero) / (dat['REFAOALD'])
         
         # Calculate Thrust values
-        self.t_cruise = calculate_thrust(self.dat['REFACRUS'], self.dat['REFVCRUS'], self.dat['REFTCRUS'], False, self.dat, self.realprops)
-        self.t_vmax = calculate_thrust(self.dat['REFACRUS'], self.dat['MAXSPEED'], 1.0, True, self.dat, self.realprops)
-        self.t_landing = calculate_thrust(0, self.dat['REFVLAND'], self.dat['REFTHRLD'], False, self.dat, self.realprops)
+        t_cruise = calculate_thrust(dat['REFACRUS'], dat['REFVCRUS'], dat['REFTCRUS'], False, dat, self.realprops)
+        t_vmax = calculate_thrust(dat['REFACRUS'], dat['MAXSPEED'], 1.0, True, dat, self.realprops)
+        t_landing = calculate_thrust(0, dat['REFVLAND'], dat['REFTHRLD'], False, dat, self.realprops)
         
         # Calculate drag properties
-        self.cd_zero = self.t_cruise / (0.5 * get_air_density(self.dat["REFACRUS"]) * self.dat["REFVCRUS"]**2 * self.dat["WINGAREA"])
-        self.cd_land = (self.t_landing / (0.5 * get_air_density(0) * self.dat["REFVLAND"]**2 * self.dat["WINGAREA"])) * (1 / (1 + self.dat["CLBYFLAP"])) * (1 / (1 + self.dat["CLVARGEO"])) * (1 / (1 + self.dat["CDBYGEAR"]))
-        self.cd_const = (self.cd_land - self.cd_zero) / self.dat["REFAOALD"]**2
-        self.cd_max = self.t_vmax / (0.5 * get_air_density(self.dat["REFACRUS"]) * self.dat["MAXSPEED"]**2 * self.dat["WINGAREA"])
+        cd_zero = t_cruise / (0.5 * air_density(dat["REFACRUS"]) * dat["REFVCRUS"]**2 * dat["WINGAREA"])
+        cd_land = (t_landing / (0.5 * air_density(0) * dat["REFVLAND"]**2 * dat["WINGAREA"])) * (1 / (1 + dat["CLBYFLAP"])) * (1 / (1 + dat["CLVARGEO"])) * (1 / (1 + dat["CDBYGEAR"]))
+        cd_const = (cd_land - cd_zero) / dat["REFAOALD"]**2
+        cd_max = t_vmax / (0.5 * air_density(dat["REFACRUS"]) * dat["MAXSPEED"]**2 * dat["WINGAREA"])
         
         # Define the lift coefficient curve points
-        self.cl_angles.append(self.dat['CRITAOAM'] - self.dat['FLATCLR2'] - self.dat['CLDECAY2'])
-        self.cl_angles.append(self.dat['CRITAOAM'] - self.dat['FLATCLR2'])
-        self.cl_angles.append(self.dat['CRITAOAM'])
-        self.cl_angles.append(self.dat['CRITAOAP'])
-        self.cl_angles.append(self.dat['CRITAOAP'] + self.dat['FLATCLR1'])
-        self.cl_angles.append(self.dat['CRITAOAP'] + self.dat['FLATCLR1'] + self.dat['CLDECAY1'])
-        
-        self.cl_points.append(0)
-        self.cl_points.append(self.cl_zero + self.dat["CRITAOAM"] * self.cl_slope)
-        self.cl_points.append(self.cl_zero + self.dat["CRITAOAM"] * self.cl_slope)
-        self.cl_points.append(self.cl_zero + self.dat["CRITAOAM"] * self.cl_slope)
-        self.cl_points.append(self.cl_zero + self.dat["CRITAOAM"] * self.cl_slope)
-        self.cl_points.append(0)
+        cl_angles = [dat['CRITAOAM'] - dat['FLATCLR2'] - dat['CLDECAY2'], 
+                     dat['CRITAOAM'] - dat['FLATCLR2'], 
+                     dat['CRITAOAM'], 
+                     dat['CRITAOAP'], 
+                     dat['CRITAOAP'] + dat['FLATCLR1'], 
+                     dat['CRITAOAP'] + dat['FLATCLR1'] + dat['CLDECAY1']]
+        
+        cl_points = [0, 
+                     cl_zero + dat["CRITAOAM"] * cl_slope, 
+                     cl_zero + dat["CRITAOAM"] * cl_slope, 
+                     cl_zero + dat["CRITAOAP"] * cl_slope, 
+                     cl_zero + dat["CRITAOAP"] * cl_slope, 
+                     0]
+        
+        self._aero = {"cl_zero": cl_zero, "cl_land": cl_land, "cl_slope": cl_slope, 
+                      "cd_zero": cd_zero, "cd_land": cd_land, "cd_const": cd_const, "cd_max": cd_max, 
+                      "t_cruise": t_cruise, "t_vmax": t_vmax, "t_landing": t_landing, 
+                      "cl_angles": cl_angles, "cl_points": cl_points}
+        self._aero_version = dat.version
         
     def calc_cl(self, aoa, flap_pct=0, vgw_pct=1):
         """calculate a the lift coefficient at a provided angle of attack.
@@ -333,17 +512,17 @@ class AirplaneDat:
         if vgw_pct == -1 and self.dat['VARGEOMW'] == True:
             # Need to calculate the vgw_percent since it has not been provided. 
             vgw_pct = self.calculate_vgw_position(airspeed)
-        else:
+        elif vgw_pct == -1:
             vgw_pct = 1
         
         cd = self.cd_zero + self.cd_const * aoa**2
         
         # Acount for transonic drag
-        if airspeed > self.dat['CRITSPEED'] or (self.cd_max < self.cd_zero and self.dat['CRITSPED'] < self.dat['MAXSPEED']):
+        if airspeed > self.dat['CRITSPED'] or (self.cd_max < self.cd_zero and self.dat['CRITSPED'] < self.dat['MAXSPEED']):
             cd = cd + (self.cd_max - self.cd_zero) * (airspeed - self.dat['CRITSPED']) / (self.dat['MAXSPEED'] - self.dat['CRITSPED'])
         
         # Acount for effectors
-        cd = cd * (1 + self.dat['CDSPOILR'] * spoiler_pct) * (1 + self.dat['CDVARGEO'] * vgw_pct) * (1 + self.dat['CDBYFLAP'] * gear_pct) * (1 + self.dat['CDBYGEAR'] * gear_pct)
+        cd = cd * (1 + self.dat['CDSPOILR'] * spoiler_pct) * (1 + self.dat['CDVARGEO'] * vgw_pct) * (1 + self.dat['CDBYFLAP'] * flap_pct) * (1 + self.dat['CDBYGEAR'] * gear_pct)
         
         return cd
     
@@ -369,6 +548,194 @@ class AirplaneDat:
             return np.interp(airspeed, [self.dat['VGWSPED1'], self.dat['VGWSPED2']], [0, 1])
         
     
+    def calculate_vgw_position_array(self, airspeed):
+        """Array version of calculate_vgw_position.
+        
+        inputs
+        airspeed (array-like): speeds of aircraft in m/s
+        
+        outputs
+        vgw_pct (np.ndarray): 0=fully spread, 1=fully swept
+        """
+        
+        airspeed = np.asarray(airspeed, dtype=float)
+        if self.dat['VARGEOMW'] == False:
+            return np.ones_like(airspeed)
+        
+        return np.interp(airspeed, [self.dat['VGWSPED1'], self.dat['VGWSPED2']], [0, 1])
+    
+    def _vgw_array(self, vgw_pct, airspeed):
+        """Replace every -1 vgw_pct entry with the scheduled position at the airspeed, like calc_cd."""
+        vgw_pct = np.asarray(vgw_pct, dtype=float)
+        if np.any(vgw_pct == -1):
+            return np.where(vgw_pct == -1, self.calculate_vgw_position_array(airspeed), vgw_pct)
+        return vgw_pct
+    
+    def calc_cl_array(self, aoa, flap_pct=0, vgw_pct=1):
+        """Array version of calc_cl. All inputs broadcast against each other.
+        
+        inputs:
+        aoa (array-like): the angles of attack of the aircraft as radian values.
+        flap_pct (array-like): the decimal percent that the flaps are deployed (0=clean/1=down)
+        vgw_pct (array-like): the decimal percent that the VGW are swept (0=forward/1=swept)
+        
+        outputs:
+        cl (np.ndarray): the lift coefficients at the specified angles of attack.
+        """
+        
+        # calc_cl shifts every lift curve point by the same amount, including the two zero end 
+        # points, so the shift can be added after interpolating the unshifted curve.
+        aoa = np.asarray(aoa, dtype=float)
+        shift = np.asarray(flap_pct, dtype=float) * self.dat['CLBYFLAP'] - np.asarray(vgw_pct, dtype=float) * self.dat['CLVARGEO']
+        return np.interp(aoa, self.cl_angles, self.cl_points) + shift
+    
+    def calc_cd_array(self, aoa, flap_pct=0, vgw_pct=-1, spoiler_pct=0, gear_pct=0, airspeed=0):
+        """Array version of calc_cd. All inputs broadcast against each other.
+        
+        inputs:
+        aoa (array-like): the angles of attack of the aircraft as radian values.
+        flap_pct (array-like): the decimal percent that the flaps are deployed (0=clean/1=down)
+        vgw_pct (array-like): the decimal percent that the VGW are swept (0=forward/1=swept), -1 to 
+                              use the scheduled position at the airspeed.
+        spoiler_pct (array-like): the decimal percent that the spoiler is extended (0=retracted/1=extended)
+        gear_pct (array-like): the decimal percent that the landing gear is extended (0=retracted/1=extended)
+        airspeed (array-like): the airspeeds the aircraft is traveling.
+        
+        outputs:
+        cd (np.ndarray): the drag coefficients at the specified angles of attack.
+        """
+        
+        aoa = np.asarray(aoa, dtype=float)
+        airspeed = np.asarray(airspeed, dtype=float)
+        vgw_pct = self._vgw_array(vgw_pct, airspeed)
+        
+        cd = self.cd_zero + self.cd_const * aoa**2
+        
+        # Acount for transonic drag
+        critsped = self.dat['CRITSPED']
+        maxspeed = self.dat['MAXSPEED']
+        if self.cd_max < self.cd_zero and critsped < maxspeed:
+            transonic = np.ones(airspeed.shape, dtype=bool)
+        else:
+            transonic = airspeed > critsped
+        if maxspeed != critsped:
+            cd = np.where(transonic, cd + (self.cd_max - self.cd_zero) * (airspeed - critsped) / (maxspeed - critsped), cd)
+        
+        # Acount for effectors
+        return cd * (1 + self.dat['CDSPOILR'] * np.asarray(spoiler_pct)) * (1 + self.dat['CDVARGEO'] * vgw_pct) * (1 + self.dat['CDBYFLAP'] * np.asarray(flap_pct)) * (1 + self.dat['CDBYGEAR'] * np.asarray(gear_pct))
+    
+    def calc_trim_aoa(self, altitude, velocity, flap_pct=0, vgw_pct=-1, g=1, weight=None):
+        """Calculate the angle of attack where lift equals the g loaded weight.
+        
+        Between CRITAOAM and CRITAOAP the lift curve is the straight line cl_zero + cl_slope * aoa 
+        shifted by the flap and VGW settings, so the trim angle is solved directly on that line. 
+        Conditions that need more lift than the curve provides at CRITAOAP (or less than at 
+        CRITAOAM) cannot be trimmed.
+        
+        inputs:
+        altitude (array-like): the aircraft's altitudes in meters
+        velocity (array-like): the aircraft's speeds in meters per second
+        flap_pct (array-like): the decimal percent that the flaps are deployed (0=clean/1=down)
+        vgw_pct (array-like): the decimal percent that the VGW are swept (0=forward/1=swept), -1 to 
+                              use the scheduled position at the velocity.
+        g (array-like): the g loading of the aircraft.
+        weight (float, None): the aircraft weight in Newtons. Defaults to the clean weight with full 
+                              fuel, the same weight the lift curve is derived from.
+        
+        outputs:
+        aoa (np.ndarray): the trim angles of attack in radians, NaN where trim is not possible.
+        feasible (np.ndarray): boolean mask of the conditions that can be trimmed.
+        """
+        
+        if weight is None:
+            weight = self.dat['WEIGHCLN'] + self.dat['WEIGFUEL']
+        
+        altitude, velocity = np.broadcast_arrays(np.asarray(altitude, dtype=float), np.asarray(velocity, dtype=float))
+        vgw_pct = self._vgw_array(vgw_pct, velocity)
+        shift = np.asarray(flap_pct, dtype=float) * self.dat['CLBYFLAP'] - vgw_pct * self.dat['CLVARGEO']
+        
+        dynamic_pressure = 0.5 * air_density_array(altitude) * velocity**2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cl_required = np.asarray(g, dtype=float) * weight / (dynamic_pressure * self.dat['WINGAREA'])
+            aoa = (cl_required - shift - self.cl_zero) / self.cl_slope
+        
+        feasible = (dynamic_pressure > 0) & (aoa >= self.dat['CRITAOAM']) & (aoa <= self.dat['CRITAOAP'])
+        return np.where(feasible, aoa, np.nan), feasible
+    
+    @instrument.timed("AirplaneDat.calc_envelope", items=lambda self, altitudes, speeds, *args, **kwargs: int(np.size(altitudes) * np.size(speeds)))
+    def calc_envelope(self, altitudes, speeds, weight=None, flap_pct=0, gear_pct=0):
+        """Calculate the performance envelope of the aircraft over a grid of altitudes and speeds.
+        
+        Every quantity is evaluated for 1g level flight in a single pass over the whole grid. The 
+        VGW follow their speed schedule.
+        
+        inputs:
+        altitudes (array-like): 1D array of altitudes in meters
+        speeds (array-like): 1D array of true airspeeds in meters per second
+        weight (float, None): the aircraft weight in Newtons. Defaults to the clean weight with full fuel.
+        flap_pct (float, int): the decimal percent that the flaps are deployed (0=clean/1=down)
+        gear_pct (float, int): the decimal percent that the landing gear is extended (0=retracted/1=extended)
+        
+        outputs:
+        envelope (dict): NumPy arrays. Grid values have shape (len(altitudes), len(speeds)):
+            altitude, speed: the grid coordinates
+            max_thrust: thrust in Newtons at full throttle, with afterburner if fitted
+            trim_aoa: angle of attack in radians for 1g flight, NaN where it cannot be trimmed
+            drag: drag in Newtons at the trim angle of attack, NaN where it cannot be trimmed or the 
+                  drag coefficient is not positive
+            specific_excess_power: (max_thrust - drag) * speed / weight in m/s
+            stall_speed: per altitude, the speed where 1g needs the maximum lift coefficient
+            max_level_speed: per altitude, the fastest grid speed that can be trimmed with 
+                             max_thrust >= drag, NaN if there is none
+        """
+        
+        if weight is None:
+            weight = self.dat['WEIGHCLN'] + self.dat['WEIGFUEL']
+        
+        altitudes = np.asarray(altitudes, dtype=float).ravel()
+        speeds = np.asarray(speeds, dtype=float).ravel()
+        altitude, speed = np.meshgrid(altitudes, speeds, indexing='ij')
+        
+        max_thrust = calculate_thrust_array(altitude, speed, 1.0, True, self.dat, self.realprops)
+        
+        trim_aoa, feasible = self.calc_trim_aoa(altitude, speed, flap_pct, -1, 1, weight)
+        
+        # With CRITSPED above MAXSPEED the transonic slope is negative and the drag coefficient would 
+        # fall through zero above CRITSPED, so the drag is evaluated no faster than MAXSPEED.
+        cd_speed = speed
+        if self.dat['CRITSPED'] > self.dat['MAXSPEED']:
+            cd_speed = np.minimum(speed, self.dat['MAXSPEED'])
+        cd = self.calc_cd_array(trim_aoa, flap_pct, self._vgw_array(-1, speed), 0, gear_pct, cd_speed)
+        
+        # A drag coefficient that is still not positive is outside the model, treat it as untrimmable.
+        with np.errstate(invalid='ignore'):
+            feasible = feasible & (cd > 0)
+        cd = np.where(feasible, cd, np.nan)
+        drag = 0.5 * air_density_array(altitude) * speed**2 * self.dat['WINGAREA'] * cd
+        specific_excess_power = (max_thrust - drag) * speed / weight
+        
+        # The wings are spread at low speed, so the stall uses the VGW position at zero airspeed.
+        vgw_low = self.calculate_vgw_position(0)
+        cl_max = self.cl_zero + self.cl_slope * self.dat['CRITAOAP'] + flap_pct * self.dat['CLBYFLAP'] - vgw_low * self.dat['CLVARGEO']
+        density = air_density_array(altitudes)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stall_speed = np.sqrt(weight / (0.5 * density * self.dat['WINGAREA'] * cl_max))
+        stall_speed = np.where((density > 0) & (cl_max > 0), stall_speed, np.nan)
+        
+        # Fastest speed per altitude that still has thrust to spare.
+        level = feasible & (max_thrust >= drag)
+        last = speeds.size - 1 - np.argmax(level[:, ::-1], axis=1)
+        max_level_speed = np.where(level.any(axis=1), speeds[last], np.nan)
+        
+        return {"altitude": altitudes,
+                "speed": speeds,
+                "max_thrust": max_thrust,
+                "trim_aoa": trim_aoa,
+                "drag": drag,
+                "specific_excess_power": specific_excess_power,
+                "stall_speed": stall_speed,
+                "max_level_speed": max_level_speed}
+    
     def calc_lift_force(self, aoa, flap_pct, vgw_pct, velocity, altitude):
         """Calculate the lift force at the specified angle of attack.
         
@@ -383,7 +750,7 @@ class AirplaneDat:
         lift (float): the lift force in Newtons
         """
         
-        density = get_air_density(altitude)
+        density = air_density(altitude)
         cl = self.calc_cl(aoa, flap_pct, vgw_pct)
         
         return 0.5 * density * velocity**2 * self.dat['WINGAREA'] * cl
@@ -405,31 +772,69 @@ class AirplaneDat:
         drag (float): the drag force in Newtons
         """
         
-        density = get_air_density(altitude)
+        density = air_density(altitude)
         cd = self.calc_cd(aoa, flap_pct, vgw_pct, spoiler_pct, gear_pct, velocity)
         
         return 0.5 * density * velocity**2 * self.dat['WINGAREA'] * cd
     
     
-    def calc_required_throttle(self, altitude, velocity, flap_pct, vgw_pct, spoiler_pct, gear_pct, g = 1):
+    def calc_required_throttle(self, altitude, velocity, flap_pct, vgw_pct, spoiler_pct, gear_pct, g = 1, weight=None):
         """Calculate the required throttle for straight and level flight (g=1) unless overridden with a g loading.
         
+        Every input may be an array and they broadcast against each other, so a whole table of 
+        conditions is trimmed at once. The trim angle of attack comes from calc_trim_aoa. Thrust is 
+        a straight line in the throttle setting for every engine model, so the throttle that 
+        balances the drag at that angle is solved directly. The afterburner is only used when 
+        military power at full throttle is not enough.
+        
         inputs:
-        flap_pct (float, int): the decimal percent that the flaps are deployed (0=clean/1=down)
-        vgw_pct (float, int): the decimal percent that the VGW are swept (0=forward/1=swept)
-        spoiler_pct (float, int): the decimal percent that the spoiler is extended (0=retracted/1=extended)
-        gear_pct (float, int): the decimal percent that the landing gear is extended (0=retracted/1=extended)
-        velocity (float, int): the airspeed the aircraft is traveling.
-        altitude (float, int): the aircraft's altitude in meters
-        g (float, int): the g loading of the aircraft.
+        flap_pct (array-like): the decimal percent that the flaps are deployed (0=clean/1=down)
+        vgw_pct (array-like): the decimal percent that the VGW are swept (0=forward/1=swept), -1 to 
+                              use the scheduled position at the velocity.
+        spoiler_pct (array-like): the decimal percent that the spoiler is extended (0=retracted/1=extended)
+        gear_pct (array-like): the decimal percent that the landing gear is extended (0=retracted/1=extended)
+        velocity (array-like): the airspeed the aircraft is traveling.
+        altitude (array-like): the aircraft's altitude in meters
+        g (array-like): the g loading of the aircraft.
+        weight (float, None): the aircraft weight in Newtons. Defaults to the clean weight with full fuel.
         
         outputs:
-        throttle_setting (float): throttle position
-        afterburner (Boolean): indication if afterburner is required.
+        throttle_setting (np.ndarray): throttle position, NaN where infeasible
+        afterburner (np.ndarray): indication if afterburner is required.
+        aoa (np.ndarray): trim angle of attack in radians, NaN where infeasible
+        infeasible (np.ndarray): True where the condition cannot be trimmed or the engine cannot 
+                                 overcome the drag.
         """
         
-        # TODO: Finish this section
-        
+        altitude, velocity, flap_pct, vgw_pct, spoiler_pct, gear_pct, g = np.broadcast_arrays(
+            *[np.asarray(i, dtype=float) for i in [altitude, velocity, flap_pct, vgw_pct, spoiler_pct, gear_pct, g]])
+        vgw_pct = self._vgw_array(vgw_pct, velocity)
+        
+        aoa, feasible = self.calc_trim_aoa(altitude, velocity, flap_pct, vgw_pct, g, weight)
+        cd = self.calc_cd_array(aoa, flap_pct, vgw_pct, spoiler_pct, gear_pct, velocity)
+        drag = 0.5 * air_density_array(altitude) * velocity**2 * self.dat['WINGAREA'] * cd
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            throttle = self._solve_throttle(drag, altitude, velocity, False)
+            afterburner = np.zeros(throttle.shape, dtype=bool)
+            if self.dat.get('AFTBURNR', False) == True and "PROPELLR" not in self.dat.keys() and len(self.realprops) == 0:
+                throttle_ab = self._solve_throttle(drag, altitude, velocity, True)
+                afterburner = feasible & (throttle > 1) & (throttle_ab <= 1)
+                throttle = np.where(afterburner, throttle_ab, throttle)
+        
+        infeasible = ~(feasible & (throttle >= 0) & (throttle <= 1))
+        throttle = np.where(infeasible, np.nan, throttle)
+        aoa = np.where(infeasible, np.nan, aoa)
+        afterburner = afterburner & ~infeasible
+        
+        return throttle, afterburner, aoa, infeasible
+        
+    def _solve_throttle(self, drag, altitude, velocity, afterburner):
+        """Solve the throttle setting where thrust equals drag, using thrust at zero and full throttle."""
+        idle = calculate_thrust_array(altitude, velocity, 0.0, afterburner, self.dat, self.realprops)
+        full = calculate_thrust_array(altitude, velocity, 1.0, afterburner, self.dat, self.realprops)
+        return (drag - idle) / (full - idle)
+    
     def assign_weapon_config_event(self, wonconfig):
         """Assign weapons to hardpoints based on the YSF file weapon config event block.
         
@@ -445,25 +850,30 @@ class AirplaneDat:
           
                     
 class ExCamera:
-    def __init__(self, line):
-        self.line = line
-        self.location = line.split()[-1]  # INSIDE, OUTSIDE, CABIN
+    __slots__ = ("line", "location", "name", "position", "orientation")
+    
+    def __init__(self, line, keep_raw=False):
+        self.line = line if keep_raw else None
+        parts = line.split()
+        self.location = parts[-1]  # INSIDE, OUTSIDE, CABIN
         self.name = line.split('"')[1]
         
         self.position = list()
-        for pos in line.split()[2:5]:
+        for pos in parts[2:5]:
             value, units = determine_value_units(pos)
             self.position.append(convert_unit(value, units))
         
         self.orientation = list()
-        for pos in line.split()[5:8]:
+        for pos in parts[5:8]:
             value, units = determine_value_units(pos)
             self.orientation.append(convert_unit(value, units))
         
                     
 class HardPoints:
-    def __init__(self, line, count):
-        self.line = line
+    __slots__ = ("line", "internal", "position", "weapon_count", "current_load")
+    
+    def __init__(self, line, count, keep_raw=False):
+        self.line = line if keep_raw else None
         self.internal = False
         self.position = [0, 0, 0]  # Default position
         self.weapon_count = dict()
@@ -472,23 +882,32 @@ class HardPoints:
             
         self.current_load = (None, None)  # indication of type and quantity of weapon on hardpoint.
             
-        self.parse()        
+        self.parse(line)        
         
-    def parse(self):
-        parts = self.line.split()
+    def parse(self, line=None):
+        """Read the position, $INTERNAL flag and weapon counts of a HARDPOIN line.
+        
+        inputs:
+        line (str, None): the HARDPOIN line. None uses the line kept with keep_raw=True.
+        """
+        if line is None:
+            line = self.line
+        if line is None:
+            print("Error: [HardPoints.parse] no HARDPOIN line to parse. Pass the line or create the hardpoint with keep_raw=True.")
+            raise TypeError
+        parts = line.split()
         idx = 0
         for pos in parts[1:4]:
             value, units = determine_value_units(pos)
             self.position[idx] = convert_unit(value, units)
             idx += 1
-        # self.position = [convert_unit(determine_value_units(pos)) for pos in parts[1:4]]
         
         if "$INTERNAL" in parts:
             self.internal = True
         
         for element in parts[4:]:
             if any(element.startswith(wpn_name) for wpn_name in YSFLIGHT_WEAPON_NAMES):
-                element.replace("&", "*")
+                element = element.replace("&", "*")
                 values = element.split("*")
                 if len(values) == 1:
                     self.weapon_count[values[0]] = 1
@@ -496,24 +915,48 @@ class HardPoints:
                     self.weapon_count[values[0]] = float(values[1])
                 
 class WeaponShape:
-    def __init__(self, line):
-        self.line = line
+    __slots__ = ("line", "weapon", "phase", "filename")
+    
+    def __init__(self, line, keep_raw=False):
+        self.line = line if keep_raw else None
         
         parts = line.split()
         self.weapon = parts[1]
         self.phase = parts[2]
-        self.parts[3]
+        self.filename = parts[3] if len(parts) > 3 else None
         
         
 class RealProp:
+    """Properties of one real propeller engine. Each DAT variable is readable as an attribute."""
+    __slots__ = ("engine_id", "properties")
+    
     def __init__(self, engine_id, properties):
-        self.engine_id = engine_id                    
-        for k, v in properties.items():
-            setattr(self, k, v)
+        self.engine_id = engine_id
+        self.properties = dict(properties)
+        
+    def __getattr__(self, name):
+        # Only called when name is not a slot. properties is unset while unpickling.
+        if name == "properties" or name.startswith("__"):
+            raise AttributeError(name)
+        try:
+            return self.properties[name]
+        except KeyError:
+            raise AttributeError(name) from None
                     
 
 class Turret:
+    """Properties of one turret. Each DAT variable is readable as an attribute."""
+    __slots__ = ("turret_id", "properties")
+    
     def __init__(self, id_number, properties):
         self.turret_id = id_number
-        for k, v in properties.items():
-            setattr(self, k, v)
+        self.properties = dict(properties)
+        
+    def __getattr__(self, name):
+        # Only called when name is not a slot. properties is unset while unpickling.
+        if name == "properties" or name.startswith("__"):
+            raise AttributeError(name)
+        try:
+            return self.properties[name]
+        except KeyError:
+            raise AttributeError(name) from None
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+A compact binary container for parsed replays (.yfsb) that reloads without parsing any text.
+
+Layout
+    YFSB_MAGIC                  8 bytes
+    header length               little endian uint64
+    header                      UTF-8 JSON: replay header lines, airplane and ground object block
+                                headers, the string pool and the location of every segment
+    segments                    raw NumPy arrays, each starting on a YFSB_ALIGNMENT byte boundary
+
+The segments hold the airplane and ground object records (every object's records joined into one
+array), the bullet records, the kill credits and the event table: event times, event type codes and
+the text of every event. Uncompressed containers are memory-mapped on load and every array is a
+read only view into the map, nothing is copied. Compressed containers store each segment with zlib
+and decompress it on load.
+
+    export_replay_binary(yfs, filepath, compress=False)     write a replay
+    ReplayBinary(filepath)                                  load it back into a replay
+    convert_replay(source, destination)                     .yfs to .yfsb or .yfsb to .yfs
+
+"""
+
+# Import standard modules
+import os
+import mmap
+import json
+import zlib
+import struct
+from collections.abc import Sequence
+
+# Import 3rd Party Modules
+import numpy as np
+
+# Import YSFlight Modules
+from ..file import is_virtual, open_source, source_name
+from .ReplayYFS import (ReplayYFS, replay, airplane, groundob, event, string_pool, export_replay_yfs,
+                        YFS_AIRPLANE_RECORD_DTYPE, YFS_GROUND_RECORD_DTYPE, YFS_BULLET_RECORD_DTYPE,
+                        YFS_KILL_CREDIT_DTYPE)
+
+# Define constants
+YFSB_MAGIC = b"YFSBIN\x00\x01"
+YFSB_VERSION = 1
+YFSB_ALIGNMENT = 64
+YFSB_COMPRESSION_LEVEL = 6
+YFSB_EXTENSION = ".yfsb"
+
+
+def _align(offset):
+    return (offset + YFSB_ALIGNMENT - 1) // YFSB_ALIGNMENT * YFSB_ALIGNMENT
+
+
+def _dtype_to_json(dtype):
+    return dtype.descr if dtype.names is not None else dtype.str
+
+
+def _dtype_from_json(descr):
+    if isinstance(descr, str):
+        return np.dtype(descr)
+    return np.dtype([tuple(field[:2]) + ((tuple(field[2]),) if len(field) > 2 else ()) for field in descr])
+
+
+def _event_table_arrays(yfs, strings):
+    """Event times, type codes, text offsets and UTF-8 text of every event of a replay."""
+    if isinstance(yfs.events, event_table) and yfs.events.pending() == 0:
+        # Loaded from a container already, reuse the arrays.
+        events = yfs.events
+        return events.time, strings.translate(events.strings)[events.event_type], events.offsets, events.text
+
+    times = np.array([i.time for i in yfs.events], dtype=np.float64)
+    codes = strings.encode([i.event_type for i in yfs.events])
+    text = ["\n".join(i.to_lines()).encode("utf-8") for i in yfs.events]
+    offsets = np.zeros(len(text) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(i) for i in text])
+    return times, codes, offsets, np.frombuffer(b"".join(text), dtype=np.uint8)
+
+
+def export_replay_binary(yfs, filepath, compress=False):
+    """Write a replay to a binary container.
+
+    inputs:
+    yfs (replay): the replay to write
+    filepath (str): os.path-like to the container, usually ending in .yfsb
+    compress (bool): zlib compress every segment. Smaller, but loading has to decompress instead
+                     of memory-mapping.
+
+    outputs:
+    size (int): number of bytes written
+    """
+    if isinstance(yfs, replay) is False:
+        print("Error: [export_replay_binary] expected a replay. Got {}".format(type(yfs)))
+        raise TypeError
+
+    strings = string_pool()
+    for name in yfs.strings.names:
+        strings.code(name)
+    event_times, event_types, event_offsets, event_text = _event_table_arrays(yfs, strings)
+
+    def joined(objects, dtype):
+        if len(objects) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate([np.asarray(i.records, dtype=dtype) for i in objects])
+
+    arrays = {"airplane_records": joined(yfs.airplanes, YFS_AIRPLANE_RECORD_DTYPE),
+              "ground_records": joined(yfs.groundob, YFS_GROUND_RECORD_DTYPE),
+              "bullet_records": np.asarray(yfs.bulletrecords, dtype=YFS_BULLET_RECORD_DTYPE),
+              "kill_credits": np.asarray(yfs.killcredits, dtype=YFS_KILL_CREDIT_DTYPE),
+              "event_time": event_times,
+              "event_type": np.asarray(event_types, dtype=np.int16),
+              "event_offsets": event_offsets,
+              "event_text": event_text}
+
+    # Segment locations are relative to the end of the header, which is only known after.
+    segments = dict()
+    blobs = list()
+    position = 0
+    for name, array in arrays.items():
+        data = np.ascontiguousarray(array).tobytes()
+        stored = zlib.compress(data, YFSB_COMPRESSION_LEVEL) if compress else data
+        position = _align(position)
+        segments[name] = {"dtype": _dtype_to_json(array.dtype), "count": len(array),
+                          "offset": position, "nbytes": len(data), "stored": len(stored)}
+        blobs.append((position, stored))
+        position += len(stored)
+
+    header = {"version": YFSB_VERSION,
+              "compression": "zlib" if compress else None,
+              "header": [[key, list(values)] for key, values in yfs.header.items()],
+              "fieldname": yfs.fieldname,
+              "strings": strings.names,
+              "airplanes": [{"lines": list(i.lines), "count": len(i.records)} for i in yfs.airplanes],
+              "groundob": [{"lines": list(i.lines), "count": len(i.records)} for i in yfs.groundob],
+              "segments": segments}
+    header = json.dumps(header).encode("utf-8")
+    data_start = _align(len(YFSB_MAGIC) + 8 + len(header))
+
+    with open(filepath, mode='wb') as binary_file:
+        binary_file.write(YFSB_MAGIC)
+        binary_file.write(struct.pack("<Q", len(header)))
+        binary_file.write(header)
+        for offset, stored in blobs:
+            binary_file.seek(data_start + offset)
+            binary_file.write(stored)
+        binary_file.truncate(data_start + position)
+
+    return data_start + position
+
+
+def ReplayBinary(filepath, keep_raw=False):
+    """Load a replay written by export_replay_binary.
+
+    inputs:
+    filepath (str, file-like): os.path-like to the container, to a container inside a zip archive
+                               or an open file-like object
+    keep_raw (bool): keep the text lines on the events built from the event table
+
+    outputs:
+    yfs (replay): the replay. Record arrays of an uncompressed container are read only views into
+                  the memory-mapped file and yfs.events is an event_table that builds each event
+                  when it is accessed. Containers in an archive or file-like object cannot be
+                  mapped, they are read into memory once instead.
+    """
+    if is_virtual(filepath):
+        with open_source(filepath) as binary_file:
+            buffer = binary_file.read()
+    elif os.path.isfile(filepath) is False:
+        raise FileNotFoundError
+    else:
+        # The map stays open for as long as an array still refers to it.
+        with open(filepath, mode='rb') as binary_file:
+            size = os.fstat(binary_file.fileno()).st_size
+            buffer = mmap.mmap(binary_file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b""
+
+    if buffer[:len(YFSB_MAGIC)] != YFSB_MAGIC:
+        print("Error: [ReplayBinary] {} is not a binary replay container.".format(source_name(filepath)))
+        raise TypeError
+    length = struct.unpack_from("<Q", buffer, len(YFSB_MAGIC))[0]
+    header = json.loads(buffer[len(YFSB_MAGIC) + 8:len(YFSB_MAGIC) + 8 + length].decode("utf-8"))
+    if header.get("version") != YFSB_VERSION:
+        print("Error: [ReplayBinary] unsupported container version {}. Expected {}".format(header.get("version"), YFSB_VERSION))
+        raise ValueError
+    data_start = _align(len(YFSB_MAGIC) + 8 + length)
+
+    arrays = dict()
+    for name, segment in header["segments"].items():
+        dtype = _dtype_from_json(segment["dtype"])
+        start = data_start + segment["offset"]
+        if segment["count"] == 0:
+            arrays[name] = np.zeros(0, dtype=dtype)
+        elif header["compression"] == "zlib":
+            data = zlib.decompress(buffer[start:start + segment["stored"]])
+            arrays[name] = np.frombuffer(data, dtype=dtype, count=segment["count"])
+        else:
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=segment["count"], offset=start)
+
+    yfs = replay()
+    for key, values in header["header"]:
+        yfs.header[key] = values
+    yfs.fieldname = header["fieldname"]
+    for name in header["strings"]:
+        yfs.strings.code(name)
+
+    for kind, cls, segment in [("airplanes", airplane, "airplane_records"), ("groundob", groundob, "ground_records")]:
+        start = 0
+        for block in header[kind]:
+            getattr(yfs, kind).append(cls.from_records(block["lines"], arrays[segment][start:start + block["count"]]))
+            start += block["count"]
+
+    yfs.bulletrecords = arrays["bullet_records"]
+    yfs.killcredits = arrays["kill_credits"]
+    yfs.events = event_table(arrays["event_time"], arrays["event_type"], arrays["event_offsets"],
+                             arrays["event_text"], yfs.strings, keep_raw)
+    return yfs
+
+
+class event_table(Sequence):
+    """The events of a binary container. Each event is built from its text when it is accessed,
+    the times and type codes of every event are available as arrays without building any."""
+    def __init__(self, times, event_types, offsets, text, strings, keep_raw=False):
+        self.time = times
+        self.event_type = event_types
+        self.offsets = offsets
+        self.text = text
+        self.strings = strings
+        self.keep_raw = keep_raw
+        self._added = list()
+
+    def __len__(self):
+        return len(self.time) + len(self._added)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if item < 0 or item >= len(self):
+            raise IndexError(item)
+        if item >= len(self.time):
+            return self._added[item - len(self.time)]
+
+        lines = self.text[self.offsets[item]:self.offsets[item + 1]].tobytes().decode("utf-8").split("\n")
+        new_event = event(lines, self.keep_raw)
+        new_event.parse(lines)
+        return new_event
+
+    def append(self, item):
+        """Events added by replay.add after loading are kept as they are."""
+        self._added.append(item)
+
+    def pending(self):
+        """Number of events appended after loading."""
+        return len(self._added)
+
+
+def convert_replay(source, destination, compress=False, keep_raw=False):
+    """Convert a text replay to a binary container or a binary container back to a text replay,
+    depending on the extension of the destination.
+
+    inputs:
+    source (str): os.path-like to a .yfs or .yfsb file, which may be inside a zip archive
+    destination (str): os.path-like to write, ending in .yfs or .yfsb
+    compress (bool): compress the container when writing a .yfsb
+    keep_raw (bool): keep the raw event lines when reading a .yfs, so they are written unchanged
+
+    outputs:
+    None
+    """
+    if source.lower().endswith(YFSB_EXTENSION):
+        yfs = ReplayBinary(source)
+    else:
+        yfs = ReplayYFS(source, use_index=False, keep_raw=keep_raw)
+
+    if destination.lower().endswith(YFSB_EXTENSION):
+        export_replay_binary(yfs, destination, compress)
+    elif destination.lower().endswith(".yfs"):
+        export_replay_yfs(yfs, destination)
+    else:
+        print("Error: [convert_replay] expected a .yfs or {} destination. Got {}".format(YFSB_EXTENSION, destination))
+        raise TypeError
@@ -4,131 +4,1303 @@
 Created on Mon May 29 17:09:44 2023
 
 @author: Decaff42
+
+Parse YSFlight replay (.yfs) files.
+
+A replay is a sequence of top level sections. Every line that does not belong to a section is a
+header line (YFSVERSI, FIELDNAM, ...). The sections are:
+
+AIRPLANE "<identify>" <player flag>     Airplane block. Header lines follow until NUMRECOR <n> <version>,
+                                        then n flight records. Each record starts with a line holding
+                                        only the time, followed by a fixed number of numeric lines.
+GROUNDOB "<identify>" ...               Ground object block, laid out like an airplane block.
+EVTBLOCK ... ENDEVTBLOCK                Event block. Each event starts with "<TYPE> <time> ... <flag>",
+                                        has body lines and ends with EVTEND.
+BULRECOR                                Bullet records, one numeric line per weapon launch.
+KILLCRED                                Kill credits, one numeric line per kill.
+
+Record lines always start with a number, so a record run ends at the first line that does not.
+Airplanes and ground objects are identified by the order they appear in the file starting at 0.
+
+Airplane flight records are four lines:
+    time
+    x y z heading pitch bank g                                                (m, rad)
+    state vgw spoiler gear flap brake smoke vapor                             (integers)
+    throttle elevator aileron rudder trim thrust_vector thrust_reverser bomb_bay  (integers)
+Ground object records are three lines:
+    time
+    x y z heading pitch bank
+    state
+Missing trailing values are read as 0 and extra values are ignored.
+
+Bullet records and kill credits are one line each:
+    time weapon x y z heading pitch bank velocity lifetime power shooter_type shooter_id
+    time victim_type victim_id killer_type killer_id weapon x y z
+They are parsed YFS_RECORD_CHUNK_LINES lines at a time into structured arrays. Their text columns
+(weapon and object types) are stored as int16 codes into the string_pool of the replay. Airplane
+and ground object records are also read YFS_RECORD_CHUNK_LINES lines at a time and only joined
+into one array per block once parsed.
+
 """
 
 # Import standard modules
 import os
+import sys
+import json
+import time
+import bisect
+import itertools
 
 # Import 3rd Party Modules
 import numpy as np
 
 # Import YSFlight Modules
-from ..file import import_file
+from .. import instrument
+from ..file import import_file, iter_file_offsets, file_encoding, MappedFile, is_virtual, source_name, source_size
 from ..units import convert_unit, determine_value_units
 from ..simulation import YSFLIGHT_G, get_air_density, calculate_thrust
 
+# Define constants
+YFS_EVENT_TYPES = ["TXTEVT", "WNDCHG", "VISCHG", "PLRAIR", "AIRCMD", "WPNCFG"]
+YFS_EVENT_BLOCK_START = "EVTBLOCK"
+YFS_EVENT_BLOCK_END = "ENDEVTBLOCK"
+YFS_EVENT_END = "EVTEND"
+YFS_NUMERIC_START = set("-+.0123456789")
+YFS_SECTION_KEYWORDS = ["AIRPLANE", "GROUNDOB", "BULRECOR", "KILLCRED", YFS_EVENT_BLOCK_START]
+YFS_RECORD_LINES = {"AIRPLANE": 4, "GROUNDOB": 3}  # lines of each flight record
+
+YFS_AIRPLANE_STATE_FIELDS = ["state", "vgw", "spoiler", "gear", "flap", "brake", "smoke", "vapor"]
+YFS_AIRPLANE_CONTROL_FIELDS = ["throttle", "elevator", "aileron", "rudder", "trim", "thrust_vector", "thrust_reverser", "bomb_bay"]
+
+# One flight record per row. Positions and attitudes are single precision to halve the memory of a
+# long replay. That is about 7 significant digits: steps of about 1 mm up to 16 km from the origin
+# and coarser further out, so a stored 7395.24 reads back as 7395.24023.
+YFS_AIRPLANE_RECORD_DTYPE = np.dtype([("time", "f8"), 
+                                      ("position", "f4", (3,)), 
+                                      ("attitude", "f4", (3,)), 
+                                      ("g", "f4"), 
+                                      ("speed", "f4"), 
+                                      ("states", "i2", (len(YFS_AIRPLANE_STATE_FIELDS),)), 
+                                      ("controls", "i2", (len(YFS_AIRPLANE_CONTROL_FIELDS),))])
+YFS_GROUND_RECORD_DTYPE = np.dtype([("time", "f8"), 
+                                    ("position", "f4", (3,)), 
+                                    ("attitude", "f4", (3,)), 
+                                    ("state", "i2")])
 
-def ReplayYFS(filepath):
+# Bullet records and kill credits. Text columns hold codes into a string_pool.
+YFS_BULLET_RECORD_DTYPE = np.dtype([("time", "f8"),
+                                    ("weapon", "i2"),
+                                    ("position", "f4", (3,)),
+                                    ("attitude", "f4", (3,)),
+                                    ("velocity", "f4"),
+                                    ("lifetime", "f4"),
+                                    ("power", "f4"),
+                                    ("shooter_type", "i2"),
+                                    ("shooter_id", "i4")])
+YFS_KILL_CREDIT_DTYPE = np.dtype([("time", "f8"),
+                                  ("victim_type", "i2"),
+                                  ("victim_id", "i4"),
+                                  ("killer_type", "i2"),
+                                  ("killer_id", "i4"),
+                                  ("weapon", "i2"),
+                                  ("position", "f4", (3,))])
+YFS_BULLET_STRING_FIELDS = ["weapon", "shooter_type"]
+YFS_KILL_STRING_FIELDS = ["victim_type", "killer_type", "weapon"]
+YFS_RECORD_CHUNK_LINES = 65536  # record lines parsed together
+YFS_LINE_SEPARATOR = " \x00 "  # joins record lines so the number of tokens on each can be checked
+
+
+@instrument.timed("ReplayYFS")
+def ReplayYFS(filepath, time_window=None, use_index=True, keep_raw=False):
     """Import and parse a replay file.
-    
+
     inputs
-    filepath (str): os.path-like to where the replay file is.
-    
+    filepath (str, file-like): os.path-like to where the replay file is, to a replay inside a zip
+                               archive ("replays.zip/dogfight.yfs") or an open file-like object.
+    time_window (tuple, None): (start, end) times in seconds. Only the records, events, bullet records
+                               and kill credits within the window are read. None reads everything.
+    use_index (bool): read and write the <replay>.yfs.idx seek index next to the replay. Without a
+                      valid index, and always for archive members and file-like objects, the
+                      whole file is read once and clipped to the time window while streaming.
+    keep_raw (bool): keep the raw text lines of every event, bullet record and kill credit. By
+                     default only the parsed values are kept. The bullet record and kill credit
+                     lines are kept in yfs.bulletlines and yfs.killlines.
+
+    output
+    yfs (replay): a replay class instance holding everything in the file.
     """
-    # Only want to import a .yfs file. Flag other filetypes as invalid because 
+    # Only want to import a .yfs file. Flag other filetypes as invalid because
     # they may not contain the expected data the user wants.
-    if filepath.lower().endswith("yfs") is False:
-        print("Error: [AircraftDat] expected a YFS file but was provided a {} file.".format(os.path.splitext(filepath)[-1]))
+    name = source_name(filepath)
+    if name is not None and name.lower().endswith("yfs") is False:
+        print("Error: [ReplayYFS] expected a YFS file but was provided a {} file.".format(os.path.splitext(name)[-1]))
         raise TypeError
-        
-    # Import the file
-    raw_yfs = import_file(filepath)
-    
+
+    # Archive members and file-like objects have no index next to them.
+    virtual = is_virtual(filepath)
+    index = load_replay_index(filepath) if use_index and virtual is False else None
+    if time_window is not None and index is not None:
+        return _read_replay_window(filepath, index, time_window[0], time_window[1], keep_raw)
+
+    # Otherwise parse the whole file once, clipping to the time window while streaming. The seek
+    # index is built alongside when there is not a valid one already.
+    builder = None
+    if use_index and virtual is False and index is None:
+        stat = os.stat(filepath)
+        builder = replay_index_builder(stat.st_size, stat.st_mtime_ns)
+
     # Initialize properties
-    fieldname = ""
-    events = list()
-    airplanes = list()
-    groundob = list()
-    bulletrecords = list()
-    killcredits = list()
-    
-    
-    
+    yfs = replay()
+    for record in iter_replay_yfs(filepath, builder, keep_raw):
+        if time_window is not None:
+            record = _clip_to_window(record, time_window[0], time_window[1])
+        if record is not None:
+            yfs.add(record)
+
+    if builder is not None:
+        try:
+            with instrument.stage("ReplayYFS.write_index"):
+                builder.write(replay_index_path(filepath))
+        except OSError:
+            print("Caution: [ReplayYFS] could not write the seek index for {}".format(filepath))
+
+    return yfs
+
+
+def iter_replay_yfs(filepath, index_builder=None, keep_raw=False):
+    """Stream a replay file, yielding typed records as they are read. Only the section currently
+    being parsed is held in memory and the caller can stop at any time without reading the rest of
+    the file.
+
+    inputs
+    filepath (str, file-like): os.path-like to where the replay file is, to a replay inside a zip
+                               archive or an open file-like object.
+    index_builder (replay_index_builder, None): collects section byte offsets while streaming.
+    keep_raw (bool): keep the raw text lines on the records.
+
+    outputs
+    records (generator): yields replay_header, airplane, groundob, event, bullet_records and
+                         kill_credits instances in file order. The last two each hold a chunk of
+                         up to YFS_RECORD_CHUNK_LINES records.
+    """
+    name = source_name(filepath)
+    if name is not None and name.lower().endswith("yfs") is False:
+        print("Error: [iter_replay_yfs] expected a YFS file but was provided a {} file.".format(os.path.splitext(name)[-1]))
+        raise TypeError
+
+    lines = iter_file_offsets(filepath)
+    try:
+        if instrument.enabled():
+            records = _records_from_blocks_profiled(_scan_yfs(lines, index_builder), keep_raw, source_size(filepath) or 0)
+        else:
+            records = _records_from_blocks(_scan_yfs(lines, index_builder), keep_raw)
+        for record in records:
+            yield record
+    finally:
+        lines.close()
+
+
+def _records_from_blocks(blocks, keep_raw=False):
+    """Convert the (kind, block) tuples from _scan_yfs into typed records."""
+    pending = None  # The airplane or ground object still collecting its record chunks.
+    for kind, block in blocks:
+        if kind == "RECORDS":
+            pending.add(block)
+            continue
+        if pending is not None:
+            yield pending.finish()
+            pending = None
+
+        if kind == "HEADER":
+            yield replay_header(block)
+        elif kind in ["AIRPLANE", "GROUNDOB"]:
+            pending = _record_block(kind, block)
+        elif kind == "EVENT":
+            new_event = event(block, keep_raw)
+            new_event.parse(block)
+            yield new_event
+        elif kind == "BULRECOR":
+            yield bullet_records(block, keep_raw)
+        elif kind == "KILLCRED":
+            yield kill_credits(block, keep_raw)
+
+    if pending is not None:
+        yield pending.finish()
+
+
+def _records_from_blocks_profiled(blocks, keep_raw, nbytes):
+    """_records_from_blocks recording the time spent scanning the file into sections and building
+    each kind of record. Time the caller spends between records is not counted."""
+    clock = time.perf_counter
+    scanned = [0.0, 0]  # seconds, lines
+    kinds = dict()  # record class name: [calls, seconds, lines]
+
+    def timed_blocks():
+        while True:
+            t0 = clock()
+            item = next(blocks, None)
+            scanned[0] += clock() - t0
+            if item is None:
+                return
+            scanned[1] += 1 if item[0] == "HEADER" else len(item[1])
+            yield item
+
+    records = _records_from_blocks(timed_blocks(), keep_raw)
+    try:
+        while True:
+            scan_time, count = scanned
+            t0 = clock()
+            record = next(records, None)
+            if record is None:
+                return
+            counters = kinds.setdefault(type(record).__name__, [0, 0.0, 0])
+            counters[0] += 1
+            counters[1] += clock() - t0 - (scanned[0] - scan_time)
+            counters[2] += scanned[1] - count
+            yield record
+    finally:
+        instrument.record("ReplayYFS.scan", scanned[0], 1, scanned[1], nbytes)
+        for name, (calls, seconds, count) in kinds.items():
+            instrument.record("ReplayYFS." + name, seconds, calls, count)
+
+
+def _is_record_line(line):
+    """Record lines are the numeric lines inside a section."""
+    stripped = line.lstrip()
+    return len(stripped) > 0 and stripped[0] in YFS_NUMERIC_START
+
+
+def _is_section_line(line):
+    """Section lines start with one of YFS_SECTION_KEYWORDS."""
+    parts = line.split(None, 1)
+    return len(parts) > 0 and parts[0] in YFS_SECTION_KEYWORDS
+
+
+def _scan_yfs(lines, index=None):
+    """Split the lines of a replay into its sections.
+
+    inputs
+    lines (iterator): (byte offset, line) tuples of the replay file.
+    index (replay_index_builder, None): given the byte offsets of each section as it is scanned.
+
+    outputs
+    (kind, block) tuples where block is a single line for HEADER entries, a list of up to
+    YFS_RECORD_CHUNK_LINES lines for BULRECOR, KILLCRED and RECORDS entries and a list of lines for
+    AIRPLANE, GROUNDOB and EVENT entries. The AIRPLANE and GROUNDOB entries are only the header
+    lines of the block, the flight records follow as RECORDS entries.
+    """
+    pending = None  # A line that ended the previous section and still needs to be handled.
+    while True:
+        if pending is None:
+            item = next(lines, None)
+        else:
+            item, pending = pending, None
+        if item is None:
+            return
+        offset, line = item
+        if len(line.strip()) == 0:
+            continue
+
+        keyword = line.split()[0]
+        if keyword in ["AIRPLANE", "GROUNDOB"]:
+            # Header lines until NUMRECOR. A record line or the next section also ends the header
+            # so that a block without NUMRECOR does not take in the rest of the file.
+            header = [line]
+            for item in lines:
+                if _is_record_line(item[1]) or _is_section_line(item[1]):
+                    pending = item
+                    break
+                header.append(item[1])
+                if item[1].startswith("NUMRECOR"):
+                    break
+            if pending is None:
+                pending = next(lines, None)
+
+            if index is not None:
+                index.start_record_block(keyword, offset, None if pending is None else pending[0], YFS_RECORD_LINES[keyword])
+            yield keyword, header
+
+            # Then every numeric record line, a whole number of records at a time.
+            size = YFS_RECORD_CHUNK_LINES - YFS_RECORD_CHUNK_LINES % YFS_RECORD_LINES[keyword]
+            chunk = list()
+            starts = list()
+            first, pending = pending, None
+            for item in lines if first is None else itertools.chain([first], lines):
+                if _is_record_line(item[1]) is False:
+                    pending = item
+                    break
+                chunk.append(item[1])
+                if index is not None:
+                    starts.append(item[0])
+                if len(chunk) == size:
+                    if index is not None:
+                        index.add_entries(starts, chunk)
+                    yield "RECORDS", chunk
+                    chunk = list()
+                    starts = list()
+            if len(chunk) > 0:
+                if index is not None:
+                    index.add_entries(starts, chunk)
+                yield "RECORDS", chunk
+            if index is not None:
+                index.end_section(None if pending is None else pending[0])
+
+        elif keyword == YFS_EVENT_BLOCK_START:
+            if index is not None:
+                index.start_section("EVENTS", offset)
+            block = list()
+            end = None
+            for offset, line in lines:
+                if line.startswith(YFS_EVENT_BLOCK_END):
+                    end = offset
+                    break
+                elif len(line.strip()) == 0:
+                    continue
+                if len(block) == 0 and index is not None:
+                    index.add_entry(offset, float(line.split()[1]))
+                block.append(line)
+                if line.startswith(YFS_EVENT_END):
+                    yield "EVENT", block
+                    block = list()
+            if index is not None:
+                index.end_section(end)
+
+        elif keyword in ["BULRECOR", "KILLCRED"]:
+            if index is not None:
+                index.start_section(keyword, offset)
+            chunk = list()
+            starts = list()
+            # Millions of lines can pass through here, so the record line check is done inline.
+            for item in lines:
+                line = item[1]
+                stripped = line.lstrip()
+                if stripped[:1] not in YFS_NUMERIC_START:
+                    if line.startswith("NUMRECOR"):
+                        continue
+                    pending = item
+                    break
+                chunk.append(line)
+                if index is not None:
+                    starts.append(item[0])
+                if len(chunk) == YFS_RECORD_CHUNK_LINES:
+                    if index is not None:
+                        index.add_entries(starts, chunk)
+                    yield keyword, chunk
+                    chunk = list()
+                    starts = list()
+            if len(chunk) > 0:
+                if index is not None:
+                    index.add_entries(starts, chunk)
+                yield keyword, chunk
+            if index is not None:
+                index.end_section(None if pending is None else pending[0])
+
+        else:
+            if index is not None:
+                index.header.append(line)
+            yield "HEADER", line
+
+
+# Seek index
+#
+# The index is a JSON sidecar (<replay>.yfs.idx) holding the byte range of every section of the
+# replay along with the time and byte offset of every YFS_INDEX_STRIDE-th record, event, bullet
+# record or kill credit. Records within a section are assumed to be in time order. The index
+# records the size and modification time of the replay and is ignored once either changes.
+
+YFS_INDEX_VERSION = 1
+YFS_INDEX_STRIDE = 256
+
+
+def replay_index_path(filepath):
+    """Location of the seek index for a replay."""
+    return filepath + ".idx"
+
+
+@instrument.timed("ReplayYFS.load_index")
+def load_replay_index(filepath):
+    """Load the seek index of a replay if it exists and still matches the replay.
+
+    inputs
+    filepath (str): os.path-like to where the replay file is.
+
+    outputs
+    index (dict, None): the index, or None when it is missing or stale.
+    """
+    try:
+        with open(replay_index_path(filepath), mode='r') as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+
+    stat = os.stat(filepath)
+    if index.get("version") != YFS_INDEX_VERSION or index.get("size") != stat.st_size or index.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+
+    return index
+
+
+class replay_index_builder:
+    """Collects the byte offsets of replay sections while the replay is scanned."""
+    def __init__(self, size, mtime_ns):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.header = list()
+        self.sections = list()
+        self._count = 0
+
+    def start_section(self, kind, offset):
+        self.sections.append({"kind": kind, "start": offset, "end": None, "times": list(), "offsets": list(), "last_time": None})
+        self._count = 0
+
+    def start_record_block(self, kind, offset, header_end, lines_per_record):
+        """Start an airplane or ground object block whose records begin at byte header_end."""
+        self.start_section(kind, offset)
+        self.sections[-1]["header_end"] = self.size if header_end is None else header_end
+        self.sections[-1]["lines_per_record"] = lines_per_record
+
+    def add_entry(self, offset, time):
+        """Note one event, bullet record or kill credit of the current section."""
+        section = self.sections[-1]
+        if self._count % YFS_INDEX_STRIDE == 0:
+            section["times"].append(time)
+            section["offsets"].append(offset)
+        section["last_time"] = time
+        self._count += 1
+
+    def add_entries(self, offsets, lines):
+        """Note a chunk of record, bullet record or kill credit lines of the current section. Only
+        whole records are counted, their first line starts with the time."""
+        section = self.sections[-1]
+        step = section.get("lines_per_record", 1)
+        count = len(lines) // step
+        if count == 0:
+            return
+        for idx in range((-self._count) % YFS_INDEX_STRIDE, count, YFS_INDEX_STRIDE):
+            section["times"].append(float(lines[idx * step].split(None, 1)[0]))
+            section["offsets"].append(offsets[idx * step])
+        section["last_time"] = float(lines[(count - 1) * step].split(None, 1)[0])
+        self._count += count
+
+    def end_section(self, offset):
+        self.sections[-1]["end"] = self.size if offset is None else offset
+
+    def write(self, filepath):
+        index = {"version": YFS_INDEX_VERSION, "size": self.size, "mtime_ns": self.mtime_ns, "header": self.header, "sections": self.sections}
+        with open(filepath, mode='w') as index_file:
+            json.dump(index, index_file)
+
+
+def _window_range(section, t0, t1):
+    """Byte range of a section that covers every entry between t0 and t1, or None if none can."""
+    times = section["times"]
+    if len(times) == 0 or t1 < times[0] or (section["last_time"] is not None and t0 > section["last_time"]):
+        return None
+
+    # The last stride starting at or before t0 through the first stride starting after t1.
+    first = max(bisect.bisect_right(times, t0) - 1, 0)
+    last = bisect.bisect_right(times, t1)
+    end = section["offsets"][last] if last < len(times) else section["end"]
+    return section["offsets"][first], end
+
+
+@instrument.timed("ReplayYFS.window")
+def _read_replay_window(filepath, index, t0, t1, keep_raw=False):
+    """Build a replay from only the parts of the file between times t0 and t1 using the seek index."""
+    with MappedFile(filepath) as mapped:
+        return _read_mapped_window(mapped, index, t0, t1, keep_raw)
+
+
+def _read_mapped_window(mapped, index, t0, t1, keep_raw):
+    """_read_replay_window reading every section from one MappedFile."""
+    yfs = replay()
+    for line in index["header"]:
+        yfs.add(replay_header(line))
+
+    for section in index["sections"]:
+        kind = section["kind"]
+        byte_range = _window_range(section, t0, t1)
+
+        if kind in ["AIRPLANE", "GROUNDOB"]:
+            # Airplanes outside the window are still added, without records, so that object ids
+            # keep matching the order of the blocks in the file.
+            header = mapped.read_range(section["start"], section["header_end"])
+            record_lines = list() if byte_range is None else mapped.read_range(byte_range[0], byte_range[1])
+            if len(header) > 0 and header[-1].startswith("NUMRECOR"):
+                numrecor = header[-1].split()
+                numrecor[1] = str(len(record_lines) // section["lines_per_record"])
+                header[-1] = " ".join(numrecor)
+
+            record = airplane(header + record_lines) if kind == "AIRPLANE" else groundob(header + record_lines)
+            yfs.add(_clip_to_window(record, t0, t1))
+            continue
+
+        if byte_range is None:
+            continue
+        lines = mapped.read_range(byte_range[0], byte_range[1])
+        if kind == "EVENTS":
+            lines = [YFS_EVENT_BLOCK_START] + lines + [YFS_EVENT_BLOCK_END]
+        else:
+            lines = [kind] + lines
+        for record in _records_from_blocks(_scan_yfs(enumerate(lines)), keep_raw):
+            record = _clip_to_window(record, t0, t1)
+            if record is not None:
+                yfs.add(record)
+
+    return yfs
+
+
+def _clip_to_window(record, t0, t1):
+    """The part of a record between times t0 and t1, or None when none of it is. Header lines and
+    airplanes and ground objects are always kept, the latter with only their records in the window."""
+    if isinstance(record, replay_header):
+        return record
+    elif isinstance(record, (airplane, groundob)):
+        times = record.records["time"]
+        record.records = record.records[(times >= t0) & (times <= t1)]
+        return record
+    elif isinstance(record, (bullet_records, kill_credits)):
+        times = record.records["time"]
+        record.select((times >= t0) & (times <= t1))
+        return record if len(record.records) > 0 else None
+    return record if t0 <= record.time <= t1 else None
+
+
+class replay:
+    """Everything parsed from a replay file."""
+    def __init__(self):
+        self.fieldname = ""
+        self.header = dict()
+        self.events = list()
+        self.airplanes = list()
+        self.groundob = list()
+        self.strings = string_pool()
+
+        # Chunks are collected and only joined into one array when the records are first used.
+        self._bulletrecords = np.zeros(0, dtype=YFS_BULLET_RECORD_DTYPE)
+        self._killcredits = np.zeros(0, dtype=YFS_KILL_CREDIT_DTYPE)
+        self._pending = {"_bulletrecords": list(), "_killcredits": list()}
+        self.bulletlines = list()
+        self.killlines = list()
+
+    def _joined(self, name):
+        if len(self._pending[name]) > 0:
+            setattr(self, name, np.concatenate([getattr(self, name)] + self._pending[name]))
+            self._pending[name] = list()
+        return getattr(self, name)
+
+    @property
+    def bulletrecords(self):
+        """YFS_BULLET_RECORD_DTYPE array of every bullet record in file order."""
+        return self._joined("_bulletrecords")
+
+    @bulletrecords.setter
+    def bulletrecords(self, value):
+        self._pending["_bulletrecords"] = list()
+        self._bulletrecords = value
+
+    @property
+    def killcredits(self):
+        """YFS_KILL_CREDIT_DTYPE array of every kill credit in file order."""
+        return self._joined("_killcredits")
+
+    @killcredits.setter
+    def killcredits(self, value):
+        self._pending["_killcredits"] = list()
+        self._killcredits = value
+
+    def names(self, codes):
+        """The strings behind the codes of a text column, e.g. yfs.names(yfs.bulletrecords["weapon"])."""
+        return self.strings.decode(codes)
+
+    def add(self, record):
+        """Add a record produced by iter_replay_yfs to the replay."""
+        if isinstance(record, airplane):
+            self.airplanes.append(record)
+        elif isinstance(record, groundob):
+            self.groundob.append(record)
+        elif isinstance(record, event):
+            self.events.append(record)
+        elif isinstance(record, bullet_records):
+            self._pending["_bulletrecords"].append(record.recode(self.strings))
+            if record.lines is not None:
+                self.bulletlines.extend(record.lines)
+        elif isinstance(record, kill_credits):
+            self._pending["_killcredits"].append(record.recode(self.strings))
+            if record.lines is not None:
+                self.killlines.extend(record.lines)
+        elif isinstance(record, replay_header):
+            self.header[record.key] = record.values
+            if record.key.startswith("FIELDNAM") and len(record.values) > 0:
+                self.fieldname = record.values[0].strip('"')
+
+    def resample(self, times=None, dt=0.1, channels=None, method="linear"):
+        """Resample every airplane onto a shared time grid. See ysflight.resample.resample_airplanes.
+
+        inputs
+        times (array-like, None): grid times in seconds. None builds a grid with spacing dt covering
+                                  every airplane's records.
+        dt (float, int): grid spacing in seconds when times is None
+        channels (list, None): channel names, defaults to x y z heading pitch bank g speed
+        method (str): "linear" or "hold"
+
+        outputs
+        times (np.ndarray): the grid times
+        data (np.ndarray): (len(times), len(airplanes), len(channels)) array, NaN where an airplane
+                           has no record around a grid time.
+        """
+        from ..resample import resample_airplanes, time_grid
+
+        if times is None:
+            times = time_grid(self.airplanes, dt)
+        times = np.asarray(times, dtype=np.float64)
+        return times, resample_airplanes(self.airplanes, times, channels, method)
+
+
+# Writing replays
+
+YFS_BULLET_RECORD_VERSION = 3
+YFS_KILL_CREDIT_VERSION = 2
+
+# One flight record per format. f4 values are passed in as text from _float32_text.
+_AIRPLANE_RECORD_FORMAT = "\n".join(["%r",
+                                     " ".join(["%s"] * 7),
+                                     " ".join(["%d"] * len(YFS_AIRPLANE_STATE_FIELDS)),
+                                     " ".join(["%d"] * len(YFS_AIRPLANE_CONTROL_FIELDS))]) + "\n"
+_GROUND_RECORD_FORMAT = "%r\n" + " ".join(["%s"] * 6) + "\n%d\n"
+_BULLET_RECORD_FORMAT = "%r %s " + " ".join(["%s"] * 9) + " %s %d\n"
+_KILL_CREDIT_FORMAT = "%r %s %d %s %d %s %s %s %s\n"
+
+
+def _float32_text(values):
+    """The shortest text of every float32 value that still reads back as the same float32."""
+    return np.asarray(values, dtype=np.float32).astype(str).tolist()
+
+
+def _format_rows(row_format, columns):
+    """Format the rows of a list of equal length columns, YFS_RECORD_CHUNK_LINES rows at a time."""
+    count = len(columns[0]) if len(columns) > 0 else 0
+    for start in range(0, count, YFS_RECORD_CHUNK_LINES):
+        rows = zip(*[column[start:start + YFS_RECORD_CHUNK_LINES] for column in columns])
+        yield "".join(row_format % row for row in rows)
+
+
+def _numrecor_header(lines, count):
+    """Block header lines with the NUMRECOR count replaced."""
+    header = list(lines)
+    parts = header[-1].split()
+    if parts[0] == "NUMRECOR":
+        parts[1] = str(count)
+        header[-1] = " ".join(parts)
+    else:
+        header.append("NUMRECOR {} 3".format(count))
+    return header
+
+
+def iter_replay_lines(yfs):
+    """Write a replay back out as .yfs text.
+
+    inputs
+    yfs (replay): a replay, parsed from text or loaded any other way
+
+    outputs
+    text (generator): yields chunks of the replay text, each ending with a newline.
+    """
+    yield "".join("{}\n".format(" ".join([key] + list(values))) for key, values in yfs.header.items())
+
+    for plane in yfs.airplanes:
+        records = plane.records
+        yield "\n".join(_numrecor_header(plane.lines, len(records))) + "\n"
+        columns = [records["time"].tolist()]
+        columns += [_float32_text(records["position"][:, i]) for i in range(3)]
+        columns += [_float32_text(records["attitude"][:, i]) for i in range(3)]
+        columns += [_float32_text(records["g"])]
+        columns += [records["states"][:, i].tolist() for i in range(len(YFS_AIRPLANE_STATE_FIELDS))]
+        columns += [records["controls"][:, i].tolist() for i in range(len(YFS_AIRPLANE_CONTROL_FIELDS))]
+        yield from _format_rows(_AIRPLANE_RECORD_FORMAT, columns)
+
+    for ground in yfs.groundob:
+        records = ground.records
+        yield "\n".join(_numrecor_header(ground.lines, len(records))) + "\n"
+        columns = [records["time"].tolist()]
+        columns += [_float32_text(records["position"][:, i]) for i in range(3)]
+        columns += [_float32_text(records["attitude"][:, i]) for i in range(3)]
+        columns += [records["state"].tolist()]
+        yield from _format_rows(_GROUND_RECORD_FORMAT, columns)
+
+    if len(yfs.events) > 0:
+        yield YFS_EVENT_BLOCK_START + "\n"
+        for start in range(0, len(yfs.events), YFS_RECORD_CHUNK_LINES):
+            yield "".join("\n".join(i.to_lines()) + "\n" for i in yfs.events[start:start + YFS_RECORD_CHUNK_LINES])
+        yield YFS_EVENT_BLOCK_END + "\n"
+
+    names = np.array(yfs.strings.names, dtype=object)
+    bullets = yfs.bulletrecords
+    if len(bullets) > 0:
+        yield "BULRECOR\nNUMRECOR {} {}\n".format(len(bullets), YFS_BULLET_RECORD_VERSION)
+        columns = [bullets["time"].tolist(), names[bullets["weapon"]].tolist()]
+        columns += [_float32_text(bullets["position"][:, i]) for i in range(3)]
+        columns += [_float32_text(bullets["attitude"][:, i]) for i in range(3)]
+        columns += [_float32_text(bullets[i]) for i in ["velocity", "lifetime", "power"]]
+        columns += [names[bullets["shooter_type"]].tolist(), bullets["shooter_id"].tolist()]
+        yield from _format_rows(_BULLET_RECORD_FORMAT, columns)
+
+    kills = yfs.killcredits
+    if len(kills) > 0:
+        yield "KILLCRED\nNUMRECOR {} {}\n".format(len(kills), YFS_KILL_CREDIT_VERSION)
+        columns = [kills["time"].tolist(), names[kills["victim_type"]].tolist(), kills["victim_id"].tolist(),
+                   names[kills["killer_type"]].tolist(), kills["killer_id"].tolist(), names[kills["weapon"]].tolist()]
+        columns += [_float32_text(kills["position"][:, i]) for i in range(3)]
+        yield from _format_rows(_KILL_CREDIT_FORMAT, columns)
+
+
+def export_replay_yfs(yfs, filepath):
+    """Write a replay to a .yfs file, overwriting an existing file.
+
+    inputs
+    yfs (replay): the replay to write
+    filepath (str): os.path-like to the .yfs file to write
+
+    output
+    None
+    """
+    if filepath.lower().endswith("yfs") is False:
+        print("Error: [export_replay_yfs] expected a YFS filepath but was provided a {} file.".format(os.path.splitext(filepath)[-1]))
+        raise TypeError
+
+    with open(filepath, mode='w', encoding=file_encoding(), newline="\n") as yfs_file:
+        for text in iter_replay_lines(yfs):
+            yfs_file.write(text)
+
+
+class replay_header:
+    def __init__(self, line):
+        self.line = line
+        parts = line.split()
+        self.key = parts[0]
+        self.values = parts[1:]
+
+
+def _split_record_block(lines):
+    """Split an airplane or ground object block into its header lines, up to NUMRECOR or the first
+    record line, and the record lines."""
+    for idx, line in enumerate(lines):
+        if line.startswith("NUMRECOR"):
+            return lines[:idx + 1], lines[idx + 1:]
+        elif idx > 0 and _is_record_line(line):
+            return lines[:idx], lines[idx:]
+
+    return lines, list()
+
+
+def _uniform_tokens(lines):
+    """Split lines into tokens with one split call, as long as every line has as many tokens.
+
+    inputs
+    lines (list): text lines
+
+    outputs
+    tokens (list, None): every token of every line in order, None when the lines do not all have
+                         the same number of tokens.
+    width (int): number of tokens on each line
+    """
+    if len(lines) == 0:
+        return list(), 0
+
+    # The separator becomes a token of its own between lines. They only all land every width + 1
+    # tokens when every line has the same number of tokens.
+    tokens = YFS_LINE_SEPARATOR.join(lines).split()
+    width = (len(tokens) + 1) // len(lines) - 1
+    if len(tokens) != len(lines) * (width + 1) - 1 or tokens[width::width + 1].count(YFS_LINE_SEPARATOR.strip()) != len(lines) - 1:
+        return None, 0
+    del tokens[width::width + 1]
+    return tokens, width
+
+
+def _padded_tokens(lines, width):
+    """Split lines into exactly width tokens each. Missing trailing values are "0" and extra values are dropped."""
+    tokens = list()
+    for line in lines:
+        parts = line.split()[:width]
+        tokens.extend(parts + ["0"] * (width - len(parts)))
+    return tokens
+
+
+def _parse_record_columns(record_lines, widths):
+    """Parse a block of flight records in bulk.
+
+    inputs
+    record_lines (list): the record lines of a block, or a chunk of them
+    widths (list): number of values to keep from each line of a record
+
+    outputs
+    columns (list): one (n, width) float64 array per line of the record.
+    """
+    lines_per_record = len(widths)
+    count = len(record_lines) // lines_per_record
+    if len(record_lines) % lines_per_record != 0:
+        # A replay cut off while recording. Drop the incomplete record at the end.
+        print("Caution: [ReplayYFS] incomplete flight record block, keeping the first {} records.".format(count))
+    if count == 0:
+        return [np.zeros((0, width)) for width in widths]
+
+    columns = list()
+    for idx, width in enumerate(widths):
+        # Parse every record's copy of this line with one conversion instead of looping per line.
+        # Records with ragged lines are padded or trimmed line by line instead.
+        selected = record_lines[idx:count * lines_per_record:lines_per_record]
+        tokens, found = _uniform_tokens(selected)
+        if tokens is None:
+            tokens, found = _padded_tokens(selected, width), width
+        values = np.array(tokens, dtype=np.float64).reshape(count, found)
+
+        # Pad or trim so every record has the expected number of values.
+        if values.shape[1] < width:
+            values = np.hstack([values, np.zeros((count, width - values.shape[1]))])
+        columns.append(values[:, :width])
+
+    return columns
+
+
+def _block_identify(line):
+    """Name of an airplane or ground object from the first line of its block."""
+    return line.split('"')[1] if '"' in line else line.split()[1]
+
+
+def _airplane_records(record_lines):
+    """YFS_AIRPLANE_RECORD_DTYPE array of airplane record lines, without the speed."""
+    times, pose, states, controls = _parse_record_columns(record_lines, [1, 7, len(YFS_AIRPLANE_STATE_FIELDS), len(YFS_AIRPLANE_CONTROL_FIELDS)])
+    records = np.zeros(len(times), dtype=YFS_AIRPLANE_RECORD_DTYPE)
+    records["time"] = times[:, 0]
+    records["position"] = pose[:, 0:3]
+    records["attitude"] = pose[:, 3:6]
+    records["g"] = pose[:, 6]
+    records["states"] = states
+    records["controls"] = controls
+    return records
+
+
+def _ground_records(record_lines):
+    """YFS_GROUND_RECORD_DTYPE array of ground object record lines."""
+    times, pose, states = _parse_record_columns(record_lines, [1, 6, 1])
+    records = np.empty(len(times), dtype=YFS_GROUND_RECORD_DTYPE)
+    records["time"] = times[:, 0]
+    records["position"] = pose[:, 0:3]
+    records["attitude"] = pose[:, 3:6]
+    records["state"] = states[:, 0]
+    return records
+
+
+def _set_record_speed(records):
+    # From the stored single precision positions so the speed only depends on the records.
+    records["speed"] = _record_speed(records["time"], records["position"].astype(np.float64))
+
+
+class _record_block:
+    """An airplane or ground object block built from its header lines and the RECORDS chunks that
+    _scan_yfs yields after it. Each chunk is parsed as it arrives so only one chunk of text is held."""
+    __slots__ = ("kind", "lines", "chunks")
+
+    def __init__(self, kind, lines):
+        self.kind = kind
+        self.lines = lines
+        self.chunks = list()
+
+    def add(self, record_lines):
+        """Parse the next chunk of record lines."""
+        self.chunks.append(_airplane_records(record_lines) if self.kind == "AIRPLANE" else _ground_records(record_lines))
+
+    def finish(self):
+        """The airplane or groundob holding the records of every chunk."""
+        dtype = YFS_AIRPLANE_RECORD_DTYPE if self.kind == "AIRPLANE" else YFS_GROUND_RECORD_DTYPE
+        if len(self.chunks) == 0:
+            records = np.zeros(0, dtype=dtype)
+        elif len(self.chunks) == 1:
+            records = self.chunks[0]
+        else:
+            records = np.concatenate(self.chunks)
+        self.chunks = list()
+
+        if self.kind == "AIRPLANE":
+            _set_record_speed(records)
+            return airplane.from_records(self.lines, records)
+        return groundob.from_records(self.lines, records)
+
+
 class airplane:
+    __slots__ = ("lines", "identify", "records")
+
     def __init__(self, lines):
-        self.lines = lines
-        
-        
-class event:
+        self.lines, record_lines = _split_record_block(lines)
+        self.identify = _block_identify(lines[0])
+        self.records = _airplane_records(record_lines)
+        _set_record_speed(self.records)
+
+    @classmethod
+    def from_records(cls, lines, records):
+        """Build an airplane from its header lines and an already parsed records array."""
+        new = cls.__new__(cls)
+        new.lines = lines
+        new.identify = _block_identify(lines[0])
+        new.records = records
+        return new
+
+    # Accessors return views into the records array, no data is copied.
+    @property
+    def time(self):
+        return self.records["time"]
+
+    @property
+    def position(self):
+        return self.records["position"]
+
+    @property
+    def attitude(self):
+        return self.records["attitude"]
+
+    @property
+    def heading(self):
+        return self.records["attitude"][:, 0]
+
+    @property
+    def pitch(self):
+        return self.records["attitude"][:, 1]
+
+    @property
+    def bank(self):
+        return self.records["attitude"][:, 2]
+
+    @property
+    def speed(self):
+        return self.records["speed"]
+
+    @property
+    def g(self):
+        return self.records["g"]
+
+    @property
+    def throttle(self):
+        return self.records["controls"][:, 0]
+
+    def state(self, name):
+        """Return the column of one of YFS_AIRPLANE_STATE_FIELDS."""
+        return self.records["states"][:, YFS_AIRPLANE_STATE_FIELDS.index(name)]
+
+    def control(self, name):
+        """Return the column of one of YFS_AIRPLANE_CONTROL_FIELDS."""
+        return self.records["controls"][:, YFS_AIRPLANE_CONTROL_FIELDS.index(name)]
+
+
+def _record_speed(times, positions):
+    """Speed in m/s between consecutive records, the first record uses the speed to the second."""
+    speed = np.zeros(len(times), dtype=np.float64)
+    if len(times) < 2:
+        return speed
+
+    distance = np.sqrt(np.sum(np.diff(positions, axis=0)**2, axis=1))
+    dt = np.diff(times)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed[1:] = np.where(dt > 0, distance / dt, 0)
+    speed[0] = speed[1]
+    return speed
+
+
+class groundob:
+    __slots__ = ("lines", "identify", "records")
+
     def __init__(self, lines):
-        self.lines = lines
-        self.time = float(lines[0].split()[1])
-        self.event_type = lines[0].split()[0]
-        self.event_flag = lines[0].split()[-1]
-        
+        self.lines, record_lines = _split_record_block(lines)
+        self.identify = _block_identify(lines[0])
+        self.records = _ground_records(record_lines)
+
+    @classmethod
+    def from_records(cls, lines, records):
+        """Build a ground object from its header lines and an already parsed records array."""
+        new = cls.__new__(cls)
+        new.lines = lines
+        new.identify = _block_identify(lines[0])
+        new.records = records
+        return new
+
+    @property
+    def time(self):
+        return self.records["time"]
+
+    @property
+    def position(self):
+        return self.records["position"]
+
+    @property
+    def attitude(self):
+        return self.records["attitude"]
+
+
+class string_pool:
+    """Assigns an int16 code to every distinct string of the text columns."""
+    __slots__ = ("names", "codes")
+
+    def __init__(self):
+        self.names = list()
+        self.codes = dict()
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, name):
+        """Code of a string, adding it to the pool when it is new."""
+        if name not in self.codes:
+            self.codes[name] = len(self.names)
+            self.names.append(name)
+        return self.codes[name]
+
+    def encode(self, strings):
+        """Codes of a list of strings as an int16 array. Only the distinct strings are looked up."""
+        if len(strings) == 0:
+            return np.zeros(0, dtype=np.int16)
+        distinct, inverse = np.unique(strings, return_inverse=True)
+        return np.array([self.code(i) for i in distinct.tolist()], dtype=np.int16)[inverse.ravel()]
+
+    def decode(self, codes):
+        """Strings of an array of codes as an object array."""
+        return np.array(self.names, dtype=object)[np.asarray(codes)]
+
+    def translate(self, other):
+        """Array mapping the codes of another pool to the codes of this one."""
+        return np.array([self.code(i) for i in other.names], dtype=np.int16)
+
+
+def _parse_token_columns(lines, width, text_columns):
+    """Split single line records into a float64 array and lists of the text columns.
+
+    inputs
+    lines (list): record lines
+    width (int): number of values per line. Missing trailing values are read as 0 and extra values
+                 are ignored.
+    text_columns (list): indices of the columns that are not numbers
+
+    outputs
+    values (np.ndarray): (len(lines), width) array, 0 in the text columns
+    text (dict): column index: list of the strings of that column
+    """
+    # One split for the whole chunk only when every line has exactly width values, otherwise a short
+    # line next to a long one would shift every later column.
+    tokens, found = _uniform_tokens(lines)
+    if tokens is None or found != width:
+        tokens = _padded_tokens(lines, width)
+
+    text = dict()
+    for column in text_columns:
+        text[column] = tokens[column::width]
+        tokens[column::width] = ["0"] * len(lines)
+
+    # Convert every number of the chunk in one call instead of looping per line.
+    values = np.array(tokens, dtype=np.float64).reshape(len(lines), width)
+    return values, text
+
+
+class bullet_records:
+    """A chunk of the bullet records section. See YFS_BULLET_RECORD_DTYPE."""
+    __slots__ = ("lines", "records", "strings")
+
+    def __init__(self, lines, keep_raw=False):
+        self.lines = list(lines) if keep_raw else None
+        self.strings = string_pool()
+        values, text = _parse_token_columns(lines, 13, [1, 11])
+
+        self.records = np.empty(len(lines), dtype=YFS_BULLET_RECORD_DTYPE)
+        self.records["time"] = values[:, 0]
+        self.records["weapon"] = self.strings.encode(text[1])
+        self.records["position"] = values[:, 2:5]
+        self.records["attitude"] = values[:, 5:8]
+        self.records["velocity"] = values[:, 8]
+        self.records["lifetime"] = values[:, 9]
+        self.records["power"] = values[:, 10]
+        self.records["shooter_type"] = self.strings.encode(text[11])
+        self.records["shooter_id"] = values[:, 12]
+
+    def select(self, mask):
+        """Keep only the records where mask is True."""
+        _select_records(self, mask)
+
+    def recode(self, pool):
+        """Copy of the records with the text columns coded by another string_pool."""
+        return _recode_records(self.records, self.strings, pool, YFS_BULLET_STRING_FIELDS)
+
+
+class kill_credits:
+    """A chunk of the kill credits section. See YFS_KILL_CREDIT_DTYPE."""
+    __slots__ = ("lines", "records", "strings")
+
+    def __init__(self, lines, keep_raw=False):
+        self.lines = list(lines) if keep_raw else None
+        self.strings = string_pool()
+        values, text = _parse_token_columns(lines, 9, [1, 3, 5])
+
+        self.records = np.empty(len(lines), dtype=YFS_KILL_CREDIT_DTYPE)
+        self.records["time"] = values[:, 0]
+        self.records["victim_type"] = self.strings.encode(text[1])
+        self.records["victim_id"] = values[:, 2]
+        self.records["killer_type"] = self.strings.encode(text[3])
+        self.records["killer_id"] = values[:, 4]
+        self.records["weapon"] = self.strings.encode(text[5])
+        self.records["position"] = values[:, 6:9]
+
+    def select(self, mask):
+        """Keep only the records where mask is True."""
+        _select_records(self, mask)
+
+    def recode(self, pool):
+        """Copy of the records with the text columns coded by another string_pool."""
+        return _recode_records(self.records, self.strings, pool, YFS_KILL_STRING_FIELDS)
+
+
+def _select_records(chunk, mask):
+    chunk.records = chunk.records[mask]
+    if chunk.lines is not None:
+        chunk.lines = [line for line, keep in zip(chunk.lines, mask.tolist()) if keep]
+
+
+def _recode_records(records, source, pool, fields):
+    records = records.copy()
+    mapping = pool.translate(source)
+    for field in fields:
+        records[field] = mapping[records[field]]
+    return records
+
+
+class event:
+    """A single event of the event block. Only the properties of its event_type are set, the
+    others stay None."""
+    __slots__ = ("lines", "time", "event_type", "event_flag", "wind", "message", "visibility", "cloud_layers",
+                 "object_id", "commands", "weapons", "misc")
+
+    def __init__(self, lines, keep_raw=True):
+        """
+        inputs
+        lines (list): the lines of the event from the type line through EVTEND.
+        keep_raw (bool): keep the lines on the event. Without them parse() has to be given the lines.
+        """
+        self.lines = lines if keep_raw else None
+        parts = lines[0].split()
+        self.time = float(parts[1])
+        self.event_type = sys.intern(parts[0])
+        self.event_flag = sys.intern(parts[-1])
+
         # Initialize properties for each type of event
         self.wind = None  # only WNDCHG
         self.message = None  # only TXTEVT
         self.visibility = None  # only VISCHG
         self.cloud_layers = None  # only VISCHG
         self.object_id = None  # PLRAIR, AIRCMD, WPNCFG
-        self.weapons = None  # AIRCMD
-        self.misc = None  # AIRCMD
-        
-    def parse(self):
-        """Extract information from the raw data"""
+        self.commands = None  # AIRCMD
+        self.weapons = None  # WPNCFG
+        self.misc = None  # WPNCFG
+
+    def parse(self, lines=None):
+        """Extract information from the raw data
+
+        inputs
+        lines (list, None): the lines of the event. None uses the lines kept on the event.
+        """
+        if lines is None:
+            lines = self.lines
+        if lines is None:
+            # Events read without keep_raw were already parsed by the reader.
+            return
+
         if self.event_type == "TXTEVT":
-            self.message = self.lines[1][4:]
-            
+            self.message = lines[1][4:]
+
         elif self.event_type == "WNDCHG":
-            parts = self.lines[1].split()[1:]
+            parts = lines[1].split()[1:]
             self.wind = list()
             for i in parts:
                 self.wind.append(float(i[:-3]))
-                
+
         elif self.event_type == "VISCHG":
             # May have visibility or cloud later inputs
             self.cloud_layers = list()
-            for line in self.lines[1:-1]:
+            for line in lines[1:-1]:
                 if "CLDLYR" in line:
                     self.cloud_layers.append(line.split()[1:])
                 else:
                     self.visibility = float(line.split()[1][:-1])
-            
+
             # Reset cloud layers if not used.
             if len(self.cloud_layers) == 0:
                 self.cloud_layers = None
-                
+
         elif self.event_type == "PLRAIR":
-            self.object_id = int(self.lines[1].split()[1])
-            
+            self.object_id = int(lines[1].split()[1])
+
         elif self.event_type == "AIRCMD":
-            self.object_id = int(self.lines[1].split()[1])
-            
+            self.object_id = int(lines[1].split()[1])
+
             self.commands = list()
-            for line in self.lines[2:-1]:
+            for line in lines[2:-1]:
                 self.commands.append(line.split()[1:])
-                
+
         elif self.event_type == "WPNCFG":
-            self.object_id = int(self.lines[1].split()[1])
+            self.object_id = int(lines[1].split()[1])
             self.weapons = list()
             self.misc = list()
-            for line in self.lines:
+            for line in lines:
                 parts = line.split()
                 if parts[0] == "CFG":
-                    self.weapons.append(parts[1], float(parts[2]))
+                    self.weapons.append((parts[1], float(parts[2])))
                 elif parts[0] == "TXT":
-                    self.misc.append(parts[1], float(parts[2]))
-            
+                    self.misc.append((parts[1], float(parts[2])))
+
             # Reset unused properties
             if len(self.weapons) == 0:
                 self.weapons = None
             if len(self.misc) == 0:
                 self.misc = None
-                    
-                    
-        
+
+    def to_lines(self):
+        """The lines of the event from the type line through EVTEND. Without the raw lines they are
+        rebuilt from the parsed properties."""
+        if self.lines is not None:
+            return list(self.lines)
+
+        lines = ["{} {!r} {}".format(self.event_type, self.time, self.event_flag)]
+        if self.event_type == "TXTEVT":
+            lines.append("TXT " + self.message)
+        elif self.event_type == "WNDCHG":
+            lines.append("WND " + " ".join("{!r}m/s".format(i) for i in self.wind))
+        elif self.event_type == "VISCHG":
+            if self.visibility is not None:
+                lines.append("VIS {!r}m".format(self.visibility))
+            for layer in self.cloud_layers or list():
+                lines.append("CLDLYR " + " ".join(layer))
+        elif self.event_type in ["PLRAIR", "AIRCMD", "WPNCFG"]:
+            lines.append("OBJ {}".format(self.object_id))
+            for command in self.commands or list():
+                lines.append("CMD " + " ".join(command))
+            for name, value in self.weapons or list():
+                lines.append("CFG {} {:g}".format(name, value))
+            for name, value in self.misc or list():
+                lines.append("TXT {} {:g}".format(name, value))
+        lines.append(YFS_EVENT_END)
+        return lines
+
+
+
 class text_event:
-    def __init__(self, lines):
-        self.lines = lines
+    __slots__ = ("lines", "time", "message", "event_type", "event_flag")
+
+    def __init__(self, lines, keep_raw=True):
+        self.lines = lines if keep_raw else None
         self.time = float(lines[0].split()[1])
         self.message = lines[1][4:]
         self.event_type = lines[0].split()[0]
         self.event_flag = lines[0].split()[-1]
-        
+
 class player_ob_change_event:
+    __slots__ = ("lines",)
+
     def __init__(self, lines):
         self.lines = lines
-        
-        
-        
\ No newline at end of file
+
+
+
@@ -1 +1,22 @@
-#
\ No newline at end of file
+#
+"""
+The parser modules are imported the first time they are used as attributes of the package.
+"""
+
+# Import standard modules
+import importlib
+
+# Define constants
+FILEPARSE_SUBMODULES = ["AircraftDat", "ReplayYFS", "ReplayBinary"]
+
+__all__ = list(FILEPARSE_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in FILEPARSE_SUBMODULES:
+        return importlib.import_module("." + name, __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(FILEPARSE_SUBMODULES))
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Load many aircraft DAT files at once by parsing them across a pool of worker processes.
+
+"""
+
+# Import standard modules
+import os
+import glob
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Import 3rd Party Modules
+
+# Import YSFlight Modules
+from .file import is_archive, iter_archive
+from .fileparse.AircraftDat import AircraftDat
+from .cache import DatCache, get_default_cache
+
+# Define constants
+FLEET_CHUNK_SIZE = 16  # Number of DAT files each worker parses per task
+
+
+class FleetLoadError:
+    """Record of a DAT file that could not be parsed. Returned in place of an AirplaneDat so that a
+    single bad file does not abort the whole batch."""
+    def __init__(self, filepath, error_type, message):
+        self.filepath = filepath
+        self.error_type = error_type
+        self.message = message
+
+    def __repr__(self):
+        return "FleetLoadError({!r}, {}: {})".format(self.filepath, self.error_type, self.message)
+
+
+class Fleet:
+    """A collection of parsed aircraft indexed by their IDENTIFY name."""
+    def __init__(self):
+        self.airplanes = dict()   # IDENTIFY: AirplaneDat
+        self.paths = dict()       # IDENTIFY: filepath
+        self.errors = list()      # FleetLoadError for every file that failed to parse
+        self.duplicates = list()  # (IDENTIFY, filepath) for files repeating an IDENTIFY already loaded
+
+    def add(self, filepath, result):
+        """Add the result of parsing a DAT file to the fleet.
+
+        inputs:
+        filepath (str): the DAT file the result came from
+        result (AirplaneDat, FleetLoadError): the parsed airplane or the error raised parsing it
+        """
+        if isinstance(result, FleetLoadError):
+            self.errors.append(result)
+            return
+
+        identify = dat_identify(result)
+        if identify in self.airplanes:
+            self.duplicates.append((identify, filepath))
+        else:
+            self.airplanes[identify] = result
+            self.paths[identify] = filepath
+
+    def __getitem__(self, identify):
+        return self.airplanes[identify]
+
+    def __contains__(self, identify):
+        return identify in self.airplanes
+
+    def __iter__(self):
+        return iter(self.airplanes)
+
+    def __len__(self):
+        return len(self.airplanes)
+
+    def items(self):
+        return self.airplanes.items()
+
+
+def dat_identify(airplane):
+    """Get the IDENTIFY name of a parsed airplane without the surrounding quotes.
+
+    inputs:
+    airplane (AirplaneDat): a parsed airplane
+
+    outputs:
+    identify (str): the IDENTIFY name, or an empty string if the DAT does not define one.
+    """
+    identify = airplane.dat.get("IDENTIFY", "")
+
+    # Names containing spaces are split into several parts by the DAT parser.
+    if isinstance(identify, list):
+        identify = " ".join(str(i) for i in identify)
+
+    return str(identify).strip('"')
+
+
+def find_files(paths_or_dir, extensions, archives=True):
+    """Expand a directory, glob pattern, filepath or list of any of those into filepaths.
+
+    inputs:
+    paths_or_dir (str, list): a directory (searched recursively), glob pattern or filepath, or a
+                              list of them.
+    extensions (list): lower case extensions, e.g. [".dat"], that directories and glob patterns
+                       are filtered by. Explicit filepaths are always kept.
+    archives (bool): also list the matching members of the zip archives found, as
+                     "<archive>/<member>" filepaths every parser reads without extracting.
+
+    outputs:
+    filepaths (list): sorted list of filepaths.
+    """
+    if isinstance(paths_or_dir, (str, os.PathLike)):
+        paths_or_dir = [paths_or_dir]
+    extensions = tuple(extensions)
+
+    def expand(path, explicit=False):
+        if path.lower().endswith(extensions):
+            return [path]
+        elif archives and is_archive(path):
+            return iter_archive(path, extensions)
+        return [path] if explicit else []
+
+    filepaths = list()
+    for path in paths_or_dir:
+        path = os.fspath(path)
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                for filename in filenames:
+                    filepaths.extend(expand(os.path.join(root, filename)))
+        elif glob.has_magic(path):
+            for filepath in glob.glob(path, recursive=True):
+                filepaths.extend(expand(filepath))
+        else:
+            filepaths.extend(expand(path, explicit=True))
+
+    return sorted(set(filepaths))
+
+
+def find_dat_files(paths_or_dir):
+    """Expand a directory, glob pattern, filepath or list of any of those into DAT filepaths.
+
+    inputs:
+    paths_or_dir (str, list): a directory (searched recursively), glob pattern, DAT filepath or zip
+                              archive, or a list of them.
+
+    outputs:
+    filepaths (list): sorted list of DAT filepaths.
+    """
+    return find_files(paths_or_dir, [".dat"])
+
+
+def _parse_dat(filepath):
+    """Parse a single DAT file, returning a FleetLoadError instead of raising."""
+    try:
+        return AircraftDat(filepath)
+    except Exception as error:
+        return FleetLoadError(filepath, type(error).__name__, str(error))
+
+
+def _parse_dat_chunk(filepaths):
+    """Worker task: parse a group of DAT files."""
+    return [(filepath, _parse_dat(filepath)) for filepath in filepaths]
+
+
+def iter_fleet(paths_or_dir, workers=None, chunksize=FLEET_CHUNK_SIZE, cache=None):
+    """Parse DAT files in a process pool and yield the results as they complete.
+
+    inputs:
+    paths_or_dir (str, list): a directory, glob pattern, DAT filepath or zip archive, or a list of them.
+    workers (int, None): number of worker processes. None uses every CPU and 1 parses in this process.
+    chunksize (int): number of DAT files sent to a worker at a time.
+    cache (DatCache, bool, None): on-disk cache to read from and store into. True uses the shared
+                                  cache, None or False parses every file.
+
+    outputs:
+    (filepath, result) tuples where result is an AirplaneDat or a FleetLoadError. Results are yielded
+    in completion order, not in filepath order.
+    """
+    filepaths = find_dat_files(paths_or_dir)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if cache is True:
+        cache = get_default_cache()
+
+    # Serve what we can from the cache and only send the misses to the workers.
+    if isinstance(cache, DatCache):
+        hits = cache.get_many(filepaths)
+        for filepath, airplane in hits.items():
+            yield filepath, airplane
+        filepaths = [i for i in filepaths if i not in hits]
+    else:
+        cache = None
+
+    parsed = list()
+    try:
+        for filepath, result in _iter_parse(filepaths, workers, chunksize):
+            if cache is not None and isinstance(result, FleetLoadError) is False:
+                parsed.append((filepath, result))
+            yield filepath, result
+    finally:
+        if cache is not None:
+            cache.put_many(parsed)
+
+
+def _iter_parse(filepaths, workers, chunksize):
+    """Parse DAT files serially or in a process pool, yielding results as they complete."""
+    if workers <= 1 or len(filepaths) <= 1:
+        for filepath in filepaths:
+            yield filepath, _parse_dat(filepath)
+        return
+
+    chunks = [filepaths[i:i + chunksize] for i in range(0, len(filepaths), chunksize)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_parse_dat_chunk, chunk): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as error:
+                # A worker that crashed, or a result that could not be sent back, loses its whole chunk.
+                results = [(filepath, FleetLoadError(filepath, type(error).__name__, str(error))) for filepath in futures[future]]
+            for filepath, result in results:
+                yield filepath, result
+
+
+def load_fleet(paths_or_dir, workers=None, chunksize=FLEET_CHUNK_SIZE, cache=None):
+    """Parse every DAT file in a directory or list of paths in parallel and collect them into a Fleet.
+
+    inputs:
+    paths_or_dir (str, list): a directory, glob pattern, DAT filepath or zip archive, or a list of them.
+    workers (int, None): number of worker processes. None uses every CPU and 1 parses in this process.
+    chunksize (int): number of DAT files sent to a worker at a time.
+    cache (DatCache, bool, None): on-disk cache to read from and store into. True uses the shared
+                                  cache, None or False parses every file.
+
+    outputs:
+    fleet (Fleet): the parsed airplanes indexed by IDENTIFY along with any per-file errors.
+    """
+    fleet = Fleet()
+    for filepath, result in iter_fleet(paths_or_dir, workers, chunksize, cache):
+        fleet.add(filepath, result)
+
+    return fleet
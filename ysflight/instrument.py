@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Opt-in timing and counters for the stages of the DAT and replay parsers and the simulation
+functions.
+
+Instrumentation is off by default. Turn it on with enable() or by setting the YSFLIGHT_PROFILE
+environment variable to 1 before importing ysflight, in which case the report is also printed to
+stderr when Python exits. While it is off every hook is a single check of a module flag.
+
+Each stage records its number of calls, wall time, the items it processed (lines for the parsers,
+values for the simulation functions) and bytes read. Stages are named "<module>.<stage>" and may
+nest: the time of AircraftDat.keywords.turret includes the AircraftDat.units conversions it makes.
+
+    with stage("AircraftDat.import_file") as timer:
+        lines = import_file(filepath)
+        timer.count(len(lines), size)
+
+    @timed("simulation.calculate_thrust")
+    def calculate_thrust(...)
+
+    report()            table of every stage and registered cache
+    report("json")      the same as JSON
+    snapshot()          the counters as a dict
+    reset()             start counting again
+
+Counters are kept per process, work done in the worker processes of ysflight.fleet and
+ysflight.store is not included.
+
+"""
+
+# Import standard modules
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+
+# Import 3rd Party Modules
+
+# Import YSFlight Modules
+
+# Define constants
+INSTRUMENT_ENVIRONMENT = "YSFLIGHT_PROFILE"
+INSTRUMENT_FORMATS = ["table", "json"]
+
+_enabled = False
+_stages = dict()         # name: [calls, seconds, items, bytes]
+_caches = dict()         # name: lru_cache wrapped function
+_cache_baseline = dict()  # name: (hits, misses) when reset() was last called
+
+
+def enabled():
+    """True while instrumentation is recording."""
+    return _enabled
+
+
+def enable():
+    """Start recording every stage."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording. The counters collected so far are kept."""
+    global _enabled
+    _enabled = False
+
+
+def enabled_by_environment():
+    """Check the YSFLIGHT_PROFILE environment variable. Instrumentation is off unless it is 1/true/on/yes."""
+    return os.environ.get(INSTRUMENT_ENVIRONMENT, "0").strip().lower() in ["1", "true", "on", "yes"]
+
+
+def reset():
+    """Clear every stage counter and restart the cache statistics from their current values."""
+    _stages.clear()
+    for name, function in _caches.items():
+        info = function.cache_info()
+        _cache_baseline[name] = (info.hits, info.misses)
+
+
+def record(name, seconds, calls=1, items=0, nbytes=0):
+    """Add to the counters of a stage.
+
+    inputs:
+    name (str): the stage
+    seconds (float): wall time spent in the stage
+    calls (int): number of calls the time covers
+    items (int): lines, records or values processed
+    nbytes (int): bytes read
+
+    outputs:
+    None
+    """
+    counters = _stages.get(name)
+    if counters is None:
+        _stages[name] = [calls, seconds, items, nbytes]
+    else:
+        counters[0] += calls
+        counters[1] += seconds
+        counters[2] += items
+        counters[3] += nbytes
+
+
+class _StageTimer:
+    """Times a with block and records it on exit."""
+    __slots__ = ["name", "items", "nbytes", "start"]
+
+    def __init__(self, name, items, nbytes):
+        self.name = name
+        self.items = items
+        self.nbytes = nbytes
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        record(self.name, time.perf_counter() - self.start, 1, self.items, self.nbytes)
+        return False
+
+    def count(self, items=0, nbytes=0):
+        """Add items and bytes processed once they are known inside the block."""
+        self.items += items
+        self.nbytes += nbytes
+
+
+class _NullStage:
+    """Stand in for _StageTimer while instrumentation is off."""
+    __slots__ = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def count(self, items=0, nbytes=0):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, items=0, nbytes=0):
+    """Context manager timing a block as one call of a stage.
+
+    inputs:
+    name (str): the stage
+    items (int): lines, records or values processed, if known up front
+    nbytes (int): bytes read, if known up front
+
+    outputs:
+    timer: use timer.count(items, nbytes) to add counts found inside the block
+    """
+    if _enabled is False:
+        return _NULL_STAGE
+    return _StageTimer(name, items, nbytes)
+
+
+def timed(name, items=None):
+    """Decorator recording every call of a function as a stage.
+
+    inputs:
+    name (str): the stage
+    items (function, None): called with the same arguments as the function, returns the number of
+                            items it processes. Only called while instrumentation is on.
+
+    outputs:
+    decorator (function)
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _enabled is False:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start, 1, 0 if items is None else items(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def register_cache(name, function):
+    """Include the statistics of a functools.lru_cache wrapped function in the report.
+
+    inputs:
+    name (str): name shown in the report
+    function (function): the lru_cache wrapped function
+
+    outputs:
+    None
+    """
+    if hasattr(function, "cache_info") is False:
+        print("Error: [register_cache] expected a functools.lru_cache function. Got {}".format(type(function)))
+        raise TypeError
+    _caches[name] = function
+    info = function.cache_info()
+    _cache_baseline[name] = (info.hits, info.misses)
+
+
+def snapshot():
+    """The current counters.
+
+    inputs:
+    None
+
+    outputs:
+    counters (dict): {"stages": {name: {calls, seconds, items, bytes}},
+                      "caches": {name: {hits, misses, size, maxsize}}}. Cache hits and misses are
+                      counted from the last reset().
+    """
+    stages = dict()
+    for name in sorted(_stages):
+        calls, seconds, items, nbytes = _stages[name]
+        stages[name] = {"calls": calls, "seconds": seconds, "items": items, "bytes": nbytes}
+
+    caches = dict()
+    for name in sorted(_caches):
+        info = _caches[name].cache_info()
+        hits, misses = _cache_baseline.get(name, (0, 0))
+        caches[name] = {"hits": info.hits - hits, "misses": info.misses - misses,
+                        "size": info.currsize, "maxsize": info.maxsize}
+    return {"stages": stages, "caches": caches}
+
+
+def report(fmt="table"):
+    """Format the counters for reading.
+
+    inputs:
+    fmt (str): "table" for an aligned text table or "json"
+
+    outputs:
+    text (str): the report
+    """
+    if fmt not in INSTRUMENT_FORMATS:
+        print("Error: [report] expected fmt to be one of {}. Got {}".format(INSTRUMENT_FORMATS, fmt))
+        raise ValueError
+
+    counters = snapshot()
+    if fmt == "json":
+        return json.dumps(counters, indent=2)
+
+    rows = [["stage", "calls", "total s", "mean ms", "items", "items/s", "MB", "MB/s"]]
+    for name, stats in counters["stages"].items():
+        seconds = stats["seconds"]
+        rows.append([name, str(stats["calls"]), "{:.4f}".format(seconds),
+                     "{:.4f}".format(1000 * seconds / stats["calls"]) if stats["calls"] > 0 else "-",
+                     str(stats["items"]) if stats["items"] > 0 else "-",
+                     "{:.0f}".format(stats["items"] / seconds) if stats["items"] > 0 and seconds > 0 else "-",
+                     "{:.3f}".format(stats["bytes"] / 1e6) if stats["bytes"] > 0 else "-",
+                     "{:.1f}".format(stats["bytes"] / 1e6 / seconds) if stats["bytes"] > 0 and seconds > 0 else "-"])
+    lines = _format_table(rows)
+
+    if len(counters["caches"]) > 0:
+        rows = [["cache", "hits", "misses", "hit rate", "size", "maxsize"]]
+        for name, stats in counters["caches"].items():
+            lookups = stats["hits"] + stats["misses"]
+            rows.append([name, str(stats["hits"]), str(stats["misses"]),
+                         "{:.1%}".format(stats["hits"] / lookups) if lookups > 0 else "-",
+                         str(stats["size"]), str(stats["maxsize"])])
+        lines += [""] + _format_table(rows)
+    return "\n".join(lines)
+
+
+def _format_table(rows):
+    """Left align the first column and right align the rest."""
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = list()
+    for row in rows:
+        cells = [row[0].ljust(widths[0])] + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+        lines.append("  ".join(cells))
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return lines
+
+
+def _report_at_exit():
+    if len(_stages) > 0:
+        print(report(), file=sys.stderr)
+
+
+if enabled_by_environment():
+    enable()
+    atexit.register(_report_at_exit)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Deferred imports, so that importing ysflight does not pay for NumPy until something needs it.
+
+    np = LazyModule("numpy")
+
+np behaves like the module itself, but numpy is only imported the first time one of its
+attributes is used. Every attribute is copied onto the proxy when it is first looked up, so later
+lookups are plain module attribute lookups.
+
+"""
+
+# Import standard modules
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    """Stand in for a module that imports it on first attribute access."""
+    def __getattr__(self, attribute):
+        # Only called for attributes not copied onto the proxy yet.
+        value = getattr(importlib.import_module(self.__name__), attribute)
+        setattr(self, attribute, value)
+        return value
+
+    def __dir__(self):
+        return dir(importlib.import_module(self.__name__))
+
+    def __repr__(self):
+        return "<lazy module {!r}>".format(self.__name__)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Resample the flight records of every airplane in a replay onto one shared time grid.
+
+Each airplane records at its own irregular times. resample_airplanes looks up every grid time for
+every airplane with a single searchsorted call: the record times of all airplanes are concatenated
+and each airplane's times are shifted by its index times a span longer than the whole replay, so
+the airplanes occupy separate, sorted segments of one array. Each query time is shifted the same
+way by the airplane it asks about and the search result is an index into that airplane's segment.
+sample_airplanes takes one (airplane, time) pair per query, resample_airplanes asks every airplane
+at every grid time.
+
+The result is a dense (time, airplane, channel) array. Grid times before an airplane's first record
+or after its last are NaN.
+
+"""
+
+# Import standard modules
+import math
+
+# Import 3rd Party Modules
+import numpy as np
+
+# Import YSFlight Modules
+from .fileparse.ReplayYFS import YFS_AIRPLANE_STATE_FIELDS, YFS_AIRPLANE_CONTROL_FIELDS
+
+# Define constants
+RESAMPLE_METHODS = ["linear", "hold"]
+RESAMPLE_DEFAULT_CHANNELS = ["x", "y", "z", "heading", "pitch", "bank", "g", "speed"]
+RESAMPLE_ANGLE_CHANNELS = ["heading", "bank"]  # interpolated along the shortest arc
+
+# Channel name: (records field, column or None)
+RESAMPLE_CHANNEL_FIELDS = {"x": ("position", 0),
+                           "y": ("position", 1),
+                           "z": ("position", 2),
+                           "heading": ("attitude", 0),
+                           "pitch": ("attitude", 1),
+                           "bank": ("attitude", 2),
+                           "g": ("g", None),
+                           "speed": ("speed", None)}
+for _idx, _name in enumerate(YFS_AIRPLANE_STATE_FIELDS):
+    RESAMPLE_CHANNEL_FIELDS[_name] = ("states", _idx)
+for _idx, _name in enumerate(YFS_AIRPLANE_CONTROL_FIELDS):
+    RESAMPLE_CHANNEL_FIELDS[_name] = ("controls", _idx)
+
+# State and control channels are discrete settings, so they always hold the previous record.
+RESAMPLE_HOLD_CHANNELS = YFS_AIRPLANE_STATE_FIELDS + YFS_AIRPLANE_CONTROL_FIELDS
+
+
+def time_grid(airplanes, dt):
+    """Build a uniform time grid covering the records of every airplane.
+
+    inputs:
+    airplanes (list): airplane instances from a replay
+    dt (float, int): grid spacing in seconds
+
+    outputs:
+    times (np.ndarray): grid times from the earliest to the latest record
+    """
+    if dt <= 0:
+        print("Error: [time_grid] expected a positive time step. Got {}".format(dt))
+        raise ValueError
+
+    starts = [a.records["time"].min() for a in airplanes if len(a.records) > 0]
+    ends = [a.records["time"].max() for a in airplanes if len(a.records) > 0]
+    if len(starts) == 0:
+        return np.zeros(0)
+
+    start = min(starts)
+    count = int(math.floor((max(ends) - start) / dt + 1e-9)) + 1
+    return start + np.arange(count) * dt
+
+
+def resample_airplanes(airplanes, times, channels=None, method="linear"):
+    """Resample every airplane onto a shared time grid in one vectorized pass.
+
+    inputs:
+    airplanes (list): airplane instances from a replay
+    times (array-like): the grid times in seconds
+    channels (list, None): channel names, any of RESAMPLE_CHANNEL_FIELDS. Defaults to
+                           RESAMPLE_DEFAULT_CHANNELS.
+    method (str): "linear" interpolates between the records either side of a grid time, "hold"
+                  keeps the value of the last record at or before it.
+
+    outputs:
+    data (np.ndarray): float64 array of shape (len(times), len(airplanes), len(channels))
+    """
+    times = np.asarray(times, dtype=np.float64).ravel()
+    count = len(airplanes)
+    ids = np.repeat(np.arange(count), times.size)
+    data = sample_airplanes(airplanes, ids, np.tile(times, count), channels, method)
+    return np.ascontiguousarray(data.reshape(count, times.size, data.shape[1]).transpose(1, 0, 2))
+
+
+def sample_airplanes(airplanes, airplane_ids, times, channels=None, method="linear"):
+    """Look up one airplane at one time per query, for many queries at once.
+
+    inputs:
+    airplanes (list): airplane instances from a replay
+    airplane_ids (array-like): index of the airplane of each query
+    times (array-like): time in seconds of each query
+    channels (list, None): channel names, any of RESAMPLE_CHANNEL_FIELDS. Defaults to
+                           RESAMPLE_DEFAULT_CHANNELS.
+    method (str): "linear" or "hold", see resample_airplanes.
+
+    outputs:
+    data (np.ndarray): float64 array of shape (len(times), len(channels)). NaN for queries outside
+                       the airplane's records or with an airplane id that does not exist.
+    """
+    if channels is None:
+        channels = RESAMPLE_DEFAULT_CHANNELS
+    if method not in RESAMPLE_METHODS:
+        print("Error: [sample_airplanes] expected method to be one of {}. Got {}".format(RESAMPLE_METHODS, method))
+        raise ValueError
+    for channel in channels:
+        if channel not in RESAMPLE_CHANNEL_FIELDS:
+            print("Error: [sample_airplanes] unknown channel {}. Expected one of {}".format(channel, list(RESAMPLE_CHANNEL_FIELDS.keys())))
+            raise ValueError
+
+    airplane_ids, times = np.broadcast_arrays(np.asarray(airplane_ids, dtype=np.int64).ravel(), np.asarray(times, dtype=np.float64).ravel())
+    counts = np.array([len(a.records) for a in airplanes], dtype=np.intp)
+    data = np.full((times.size, len(channels)), np.nan)
+    if len(airplanes) == 0 or times.size == 0 or counts.sum() == 0:
+        return data
+
+    # Concatenate the records of every airplane into segments of one array.
+    records = np.concatenate([a.records for a in airplanes])
+    owner = np.repeat(np.arange(len(airplanes)), counts)
+    seg_start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    seg_last = seg_start + counts - 1
+
+    # Queries before an airplane's first record land in the previous segment and queries after
+    # its last record in the next one, so they are rejected by the segment bounds below.
+    origin = records["time"].min()
+    span = records["time"].max() - origin + 1.0
+    keys = (records["time"] - origin) + owner * span
+
+    # Sorting the shifted keys sorts the records within each segment and keeps the segments in place.
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    records = records[order]
+
+    known = (airplane_ids >= 0) & (airplane_ids < len(airplanes))
+    ids = np.where(known, airplane_ids, 0)
+    queries = (times - origin) + ids * span
+    idx = np.searchsorted(keys, queries, side="right") - 1
+
+    # Only times between the airplane's first and last record have a value.
+    first = seg_start[ids]
+    last = seg_last[ids]
+    valid = known & (idx >= first) & (idx <= last) & (counts[ids] > 0)
+    valid &= queries <= keys[np.clip(last, 0, keys.size - 1)]
+    i0 = np.clip(idx, 0, keys.size - 1)
+    i1 = np.minimum(i0 + 1, np.maximum(last, 0))
+
+    if method == "linear":
+        t0 = keys[i0]
+        t1 = keys[i1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            frac = np.where(t1 > t0, (queries - t0) / (t1 - t0), 0.0)
+
+    for c, channel in enumerate(channels):
+        field, column = RESAMPLE_CHANNEL_FIELDS[channel]
+        values = records[field] if column is None else records[field][:, column]
+        values = values.astype(np.float64)
+        v0 = values[i0]
+        if method == "hold" or channel in RESAMPLE_HOLD_CHANNELS:
+            result = v0
+        elif channel in RESAMPLE_ANGLE_CHANNELS:
+            delta = np.mod(values[i1] - v0 + math.pi, 2 * math.pi) - math.pi
+            result = np.mod(v0 + frac * delta + math.pi, 2 * math.pi) - math.pi
+        else:
+            result = v0 + frac * (values[i1] - v0)
+        data[:, c] = np.where(valid, result, np.nan)
+
+    return data
@@ -10,15 +10,24 @@ Perform calculations that rely on YSFlight source code calculations
 import math
 
 # Import 3rd Party Modules
-import numpy as np
+from .lazy import LazyModule
+np = LazyModule("numpy")  # imported when an array function first uses it
 
 # Import ysflight modules
+from .atmosphere import (YSFLIGHT_DENSITY_ALTITUDES, YSFLIGHT_DENSITY_VALUES, YSFLIGHT_DENSITY_CEILING, 
+                         YSFLIGHT_JET_EFFICIENCY_ALTITUDES, YSFLIGHT_JET_EFFICIENCY_VALUES, 
+                         YSFLIGHT_SOUND_ALTITUDES, YSFLIGHT_SOUND_SPEEDS, YSFLIGHT_SOUND_CEILING)
+from . import atmosphere
+from . import instrument
+from .constants import YSFLIGHT_G
 
 
-# Define constants
-YSFLIGHT_G = 9.807
+def _values(altitude, *args, **kwargs):
+    """Number of conditions an array function is evaluated at, for instrumentation."""
+    return int(np.size(altitude))
 
 
+@instrument.timed("simulation.calculate_thrust")
 def calculate_thrust(altitude: (float, int), airspeed: (float, int), throttle: (float, int), afterburner: bool, airplane_dat, realprop):
     """Calculate the thrust of an aircraft at a specific altitude and air speed.
     
@@ -114,7 +123,7 @@ def calculate_ias(altitude, airspeed):
     outputs:
     ias (float, int): the indicated air speed
     """
-    return airspeed * math.sqrt(get_air_density(altitude) / get_air_density(0))
+    return airspeed * math.sqrt(atmosphere.density_ratio(altitude))
 
     
 def calculate_simple_prop_thrust(altitude, airspeed, throttle, airplane_dat):
@@ -163,13 +172,14 @@ def calculate_jet_thrust(altitude, throttle, afterburner, airplane_dat):
     
     n = calculate_jet_efficiency(altitude)
     if afterburner is True and airplane_dat['AFTBURNR'] == True:
-        thrust = n * airplane_dat['THRMILIT'] * (airplane_dat['THRAFTBN'] - airplane_dat['THRMILIT']) * throttle
+        thrust = n * (airplane_dat['THRMILIT'] + (airplane_dat['THRAFTBN'] - airplane_dat['THRMILIT']) * throttle)
     else:
         thrust = n * airplane_dat['THRMILIT'] * throttle
         
     return thrust
 
     
+@instrument.timed("simulation.calculate_drag")
 def calculate_drag(altitude, airspeed, aoa, airplane_dat):
     """Calculate the drag on the aircraft.
     
@@ -209,17 +219,8 @@ def get_air_density(altitude):
         print("Error: [get_air_density] was expecting altitude input to be float or int. Got {}".format(type(altitude)))
         raise TypeError
     
-    ref_altitude = [0, 4000, 8000, 12000, 16000, 20000]
-    ref_density = [1.224991, 0.819122, 0.529999, 0.299988, 0.153000, 0.084991]
-    
-    if altitude < 0:
-        return 0
-    elif altitude > 32000:
-        return 0
-    elif altitude > 20000:
-        return ref_density[-1]
-    else:
-        return np.interp(altitude, ref_altitude, ref_density)
+    # Zero below 0m and above 32000m, held constant above 20000m.
+    return atmosphere.air_density(altitude)
     
     
 def calculate_jet_efficiency(altitude):
@@ -236,10 +237,7 @@ def calculate_jet_efficiency(altitude):
         print("Error: [calculate_jet_efficiency] was expecting altitude input to be float or int. Got {}".format(type(altitude)))
         raise TypeError
     
-    ref_alt = [0, 4000, 12000, 16000, 20000, 20000.00001, 36000, 36.000001]
-    ref_n = [1, 1, 0.6, 0.3, 0.0, 0.084991, 0.084991, 0]
-
-    return np.interp(altitude, ref_alt, ref_n)
+    return atmosphere.jet_cutback(altitude)
 
 
 def calculate_mach(altitude, velocity):
@@ -261,28 +259,185 @@ def calculate_mach(altitude, velocity):
         print("Error: [calculate_mach] was expecting velocity input to be float or int. Got {}".format(type(altitude)))
         raise TypeError
     
-    ref_alt = [0, 4000, 8000, 12000, 16000, 20000, 36000]
-    ref_mach = [340.294, 324.579, 308.063, 295.069, 295.069, 295.069, 295.069]
-
-    if altitude < 0:
-        a = ref_mach[0]
-    elif altitude > 36000:
+    if altitude > YSFLIGHT_SOUND_CEILING:
         return 0
-    else:
-        a = np.interp(altitude, ref_alt, ref_mach)
 
-    return velocity / a
+    return velocity / atmosphere.speed_of_sound(altitude)
 
 
+# Array versions of the atmosphere and thrust calculations. These accept NumPy arrays (or anything
+# np.asarray accepts) of any shape, broadcast them against each other and return float arrays. The
+# results match the scalar functions above element for element. Both are served from the
+# precomputed tables in ysflight.atmosphere.
 
+@instrument.timed("simulation.get_air_density_array", items=_values)
+def get_air_density_array(altitude):
+    """Converts an array of altitudes into the equivalent air densities.
+    
+    inputs:
+    altitude (array-like): aircraft altitudes in meters
+    
+    outputs:
+    density (np.ndarray): air density at each input altitude. Zero below 0m and above 32000m.
+    """
+    
+    return atmosphere.air_density_array(altitude)
 
 
+@instrument.timed("simulation.calculate_jet_efficiency_array", items=_values)
+def calculate_jet_efficiency_array(altitude):
+    """Determine the thrust cutback factor for an array of altitudes.
+    
+    inputs:
+    altitude (array-like): aircraft altitudes in meters
+    
+    outputs:
+    efficiency (np.ndarray): jet engine thrust efficiency at each altitude.
+    """
+    
+    return atmosphere.jet_cutback_array(altitude)
 
 
+@instrument.timed("simulation.calculate_mach_array", items=_values)
+def calculate_mach_array(altitude, velocity):
+    """Calculate the mach number for arrays of altitudes and velocities.
+    
+    inputs:
+    altitude (array-like): aircraft altitudes in meters
+    velocity (array-like): aircraft velocities in m/s
+    
+    outputs:
+    mach (np.ndarray): mach number at each condition. Zero above 36000m.
+    """
+    
+    altitude, velocity = np.broadcast_arrays(np.asarray(altitude, dtype=float), np.asarray(velocity, dtype=float))
+    
+    # The table holds the sea level speed of sound for negative altitudes like the scalar version.
+    a = atmosphere.speed_of_sound_array(altitude)
+    return np.where(altitude > YSFLIGHT_SOUND_CEILING, 0.0, velocity / a)
 
 
+@instrument.timed("simulation.calculate_ias_array", items=_values)
+def calculate_ias_array(altitude, airspeed):
+    """Convert arrays of true air speeds into indicated air speeds.
+    
+    inputs:
+    altitude (array-like): the altitudes in meters
+    airspeed (array-like): the airspeeds (any units)
+    
+    outputs:
+    ias (np.ndarray): the indicated air speeds
+    """
+    
+    return np.asarray(airspeed, dtype=float) * np.sqrt(atmosphere.density_ratio_array(altitude))
 
 
+@instrument.timed("simulation.calculate_thrust_array", items=_values)
+def calculate_thrust_array(altitude, airspeed, throttle, afterburner, airplane_dat, realprop):
+    """Calculate the thrust of an aircraft over arrays of altitudes, airspeeds and throttle settings.
+    
+    inputs:
+    altitude (array-like): the altitudes in meters 
+    airspeed (array-like): the airspeeds in m/s
+    throttle (array-like): the throttle settings as decimal percentages (0-1)
+    afterburner (bool, array-like): if the afterburner is used or not
+    airplane_dat (N/A): The DAT Properties of an airplane.
+    realprop (dict): dict of realprop classes.
+    
+    output:
+    thrust (np.ndarray): thrust in newtons of the aircraft at each condition
+    """
+    
+    altitude, airspeed, throttle, afterburner = np.broadcast_arrays(np.asarray(altitude, dtype=float), 
+                                                                    np.asarray(airspeed, dtype=float), 
+                                                                    np.asarray(throttle, dtype=float), 
+                                                                    np.asarray(afterburner, dtype=bool))
+    
+    # Validate Inputs. Same limits as the scalar version, checked once for the whole array.
+    if np.any(altitude < 0):
+        print("Error: [calculate_thrust_array] Invalid altitude input. Expecting greater than zero but got: {}".format(altitude.min()))
+        raise ValueError
+        
+    if np.any(airspeed < 0):
+        print("Error: [calculate_thrust_array] Invalid airspeed input. Expecting greater than zero but got: {}".format(airspeed.min()))
+        raise ValueError
+        
+    if np.any((throttle < 0) | (throttle > 1)):
+        print("Error: [calculate_thrust_array] Invalid throttle input. Must be between 0 and 1.")
+        raise ValueError
+    
+    # Determine which type of analysis to perform based on the type of engine
+    if len(realprop.keys()) > 0:
+        # Real Propeller calculation. Uses the simple engine model like calculate_real_prop_thrust.
+        return calculate_simple_prop_thrust_array(altitude, airspeed, throttle, airplane_dat)
+    elif "PROPELLR" in airplane_dat.keys():
+        # Simple Propeller calculation
+        return calculate_simple_prop_thrust_array(altitude, airspeed, throttle, airplane_dat)
+    else:
+        # Jet Engine
+        return calculate_jet_thrust_array(altitude, throttle, afterburner, airplane_dat)
 
 
+@instrument.timed("simulation.calculate_simple_prop_thrust_array", items=_values)
+def calculate_simple_prop_thrust_array(altitude, airspeed, throttle, airplane_dat):
+    """Calculate the thrust that a simple propeller engine produces over arrays of altitudes, 
+    airspeeds and throttle settings.
+    
+    inputs:
+    altitude (array-like): the altitudes in meters 
+    airspeed (array-like): the airspeeds in m/s
+    throttle (array-like): the throttle settings as decimal percentages (0-1)
+    airplane_dat (N/A): The DAT Properties of an airplane.
+    
+    outputs:
+    thrust (np.ndarray): thrust force in newtons of the aircraft.
+    """
+    
+    propvmin = airplane_dat['PROPVMIN']
+    propefcy = airplane_dat['PROPEFCY']
+    propellr = airplane_dat['PROPELLR']
+    
+    altitude, airspeed, throttle = np.broadcast_arrays(np.asarray(altitude, dtype=float), 
+                                                       np.asarray(airspeed, dtype=float), 
+                                                       np.asarray(throttle, dtype=float))
+    density_ratio = atmosphere.density_ratio_array(altitude)
+    
+    # Evaluate both branches of the scalar model and select per element. The low speed branch
+    # divides by the airspeed and density, so silence the warnings for elements it does not own.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power = propellr * throttle * propefcy / propvmin
+        thrust_low = (1 / density_ratio) * power / airspeed
+        
+    propk = -1 * (propellr * propefcy) / propvmin**2
+    thrust_static = propellr * propefcy / propvmin
+    thrust_high = (thrust_static - propk * propvmin * airspeed) * throttle * density_ratio
+        
+    return np.where(airspeed < propvmin, thrust_low, thrust_high)
+
 
+@instrument.timed("simulation.calculate_jet_thrust_array", items=_values)
+def calculate_jet_thrust_array(altitude, throttle, afterburner, airplane_dat):
+    """Calculate the thrust that a jet engine produces over arrays of altitudes and throttle settings.
+    
+    inputs:
+    altitude (array-like): the altitudes in meters 
+    throttle (array-like): the throttle settings as decimal percentages (0-1)
+    afterburner (bool, array-like): if the afterburner is used or not
+    airplane_dat (N/A): The DAT Properties of an airplane.
+    
+    outputs:
+    thrust (np.ndarray): thrust force in newtons of the aircraft.
+    """
+    
+    altitude, throttle, afterburner = np.broadcast_arrays(np.asarray(altitude, dtype=float), 
+                                                          np.asarray(throttle, dtype=float), 
+                                                          np.asarray(afterburner, dtype=bool))
+    
+    n = calculate_jet_efficiency_array(altitude)
+    military = n * airplane_dat['THRMILIT'] * throttle
+    # Like the scalar version, AFTBURNR and THRAFTBN are only read when the afterburner is used.
+    if afterburner.any() and airplane_dat['AFTBURNR'] == True:
+        augmented = n * (airplane_dat['THRMILIT'] + (airplane_dat['THRAFTBN'] - airplane_dat['THRMILIT']) * throttle)
+        return np.where(afterburner, augmented, military)
+    
+    return military
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Proximity queries over the airplane trajectories of a replay.
+
+SpatialIndex resamples every airplane onto a shared time grid once (see ysflight.resample) and then
+answers:
+
+    pairs_within(radius)    every pair of airplanes closer than radius at each time slice
+    merges(radius)          the same pairs joined into continuous close pass intervals
+    nearest(object_id, t)   the closest airplane to an airplane or ground object at times t
+
+pairs_within hashes every position into a uniform grid of cubes with the query radius as the edge
+length, keyed by (time slice, cell). Two airplanes within the radius are always in the same or
+neighbouring cells, so each position is only compared against the 27 cells around it instead of
+every other airplane. All time slices of a chunk are hashed and searched together with NumPy.
+
+Results are NumPy structured arrays.
+
+"""
+
+# Import standard modules
+import itertools
+
+# Import 3rd Party Modules
+import numpy as np
+
+# Import YSFlight Modules
+from .resample import resample_airplanes, time_grid
+
+# Define constants
+SPATIAL_DEFAULT_DT = 1.0  # seconds between time slices
+SPATIAL_CHUNK_SLICES = 1024  # time slices hashed together
+SPATIAL_PAIR_DTYPE = np.dtype([("time", "f8"), ("a", "i4"), ("b", "i4"), ("distance", "f4")])
+SPATIAL_MERGE_DTYPE = np.dtype([("a", "i4"), ("b", "i4"), ("start", "f8"), ("end", "f8"),
+                                ("min_distance", "f4"), ("min_time", "f8")])
+SPATIAL_OBJECT_KINDS = ["AIRPLANE", "GROUNDOB"]
+
+_NEIGHBOUR_OFFSETS = np.array(list(itertools.product([-1, 0, 1], repeat=3)), dtype=np.int64)
+
+
+class SpatialIndex:
+    """Airplane positions of a replay on a shared time grid, ready for proximity queries."""
+    def __init__(self, yfs, dt=SPATIAL_DEFAULT_DT, times=None):
+        """
+        inputs:
+        yfs (replay): a parsed replay
+        dt (float, int): spacing of the time slices in seconds when times is None
+        times (array-like, None): the time slices. None covers every airplane's records.
+        """
+        self.replay = yfs
+        if times is None:
+            times = time_grid(yfs.airplanes, dt)
+        self.times = np.asarray(times, dtype=np.float64).ravel()
+        self.dt = float(np.median(np.diff(self.times))) if self.times.size > 1 else float(dt)
+
+        # (time, airplane, xyz). NaN where the airplane has no records around the time.
+        self.positions = resample_airplanes(yfs.airplanes, self.times, ["x", "y", "z"])
+
+    def _slice_range(self, t0, t1):
+        """Index range of the time slices between t0 and t1."""
+        start = 0 if t0 is None else int(np.searchsorted(self.times, t0, side="left"))
+        end = self.times.size if t1 is None else int(np.searchsorted(self.times, t1, side="right"))
+        return start, end
+
+    def pairs_within(self, radius, t0=None, t1=None):
+        """Find every pair of airplanes within radius of each other.
+
+        inputs:
+        radius (float, int): distance in meters
+        t0, t1 (float, None): only search the time slices between these times
+
+        outputs:
+        pairs (np.ndarray): SPATIAL_PAIR_DTYPE records (time, a, b, distance) with a < b, sorted by
+                            time then airplane ids.
+        """
+        if radius <= 0:
+            print("Error: [SpatialIndex.pairs_within] expected a positive radius. Got {}".format(radius))
+            raise ValueError
+
+        start, end = self._slice_range(t0, t1)
+        results = list()
+        for chunk_start in range(start, end, SPATIAL_CHUNK_SLICES):
+            chunk_end = min(chunk_start + SPATIAL_CHUNK_SLICES, end)
+            results.append(self._pairs_in_chunk(chunk_start, chunk_end, radius))
+
+        if len(results) == 0:
+            return np.zeros(0, dtype=SPATIAL_PAIR_DTYPE)
+        pairs = np.concatenate(results)
+        return pairs[np.lexsort((pairs["b"], pairs["a"], pairs["time"]))]
+
+    def _pairs_in_chunk(self, start, end, radius):
+        """Grid hash search of the time slices start to end."""
+        positions = self.positions[start:end]
+        slice_idx, airplane_idx = np.nonzero(np.all(np.isfinite(positions), axis=2))
+        points = positions[slice_idx, airplane_idx]
+        if len(points) < 2:
+            return np.zeros(0, dtype=SPATIAL_PAIR_DTYPE)
+
+        # Cell coordinates, padded by one cell on every side so neighbour keys never wrap around.
+        cells = np.floor(points / radius).astype(np.int64)
+        cells = cells - cells.min(axis=0) + 1
+        dims = cells.max(axis=0) + 2
+        strides = np.array([dims[1] * dims[2], dims[2], 1], dtype=np.int64)
+        cells_per_slice = int(dims[0] * dims[1] * dims[2])
+        if cells_per_slice * (end - start) >= 2**62:
+            print("Error: [SpatialIndex.pairs_within] radius {} is too small for the area covered by the replay.".format(radius))
+            raise ValueError
+
+        keys = slice_idx.astype(np.int64) * cells_per_slice + cells @ strides
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        slice_idx = slice_idx[order]
+        airplane_idx = airplane_idx[order]
+        points = points[order]
+
+        first = list()
+        second = list()
+        for offset in _NEIGHBOUR_OFFSETS @ strides:
+            neighbour = keys + offset
+            lo = np.searchsorted(keys, neighbour, side="left")
+            counts = np.searchsorted(keys, neighbour, side="right") - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+
+            # Expand every point into one candidate per point in the neighbouring cell.
+            i = np.repeat(np.arange(len(keys)), counts)
+            j = lo[i] + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+            # Each pair is found from both sides, keep the one with the lower airplane id first.
+            keep = airplane_idx[i] < airplane_idx[j]
+            first.append(i[keep])
+            second.append(j[keep])
+
+        i = np.concatenate(first)
+        j = np.concatenate(second)
+        distance = np.sqrt(np.sum((points[i] - points[j])**2, axis=1))
+        close = distance <= radius
+        i = i[close]
+        j = j[close]
+
+        pairs = np.empty(len(i), dtype=SPATIAL_PAIR_DTYPE)
+        pairs["time"] = self.times[start + slice_idx[i]]
+        pairs["a"] = airplane_idx[i]
+        pairs["b"] = airplane_idx[j]
+        pairs["distance"] = distance[close]
+        return pairs
+
+    def merges(self, radius, t0=None, t1=None, max_gap=None):
+        """Join the pairs within radius into continuous close pass intervals.
+
+        inputs:
+        radius (float, int): distance in meters
+        t0, t1 (float, None): only search the time slices between these times
+        max_gap (float, None): largest time between two close slices of the same pair that still
+                               counts as one merge. Defaults to 1.5 time slices.
+
+        outputs:
+        merges (np.ndarray): SPATIAL_MERGE_DTYPE records (a, b, start, end, min_distance, min_time)
+                             sorted by start time.
+        """
+        if max_gap is None:
+            max_gap = 1.5 * self.dt
+
+        pairs = self.pairs_within(radius, t0, t1)
+        if len(pairs) == 0:
+            return np.zeros(0, dtype=SPATIAL_MERGE_DTYPE)
+        pairs = pairs[np.lexsort((pairs["time"], pairs["b"], pairs["a"]))]
+
+        # A new merge starts whenever the pair changes or the pair was apart for longer than max_gap.
+        new = np.ones(len(pairs), dtype=bool)
+        new[1:] = (pairs["a"][1:] != pairs["a"][:-1]) | (pairs["b"][1:] != pairs["b"][:-1]) | (np.diff(pairs["time"]) > max_gap)
+        starts = np.flatnonzero(new)
+        ends = np.append(starts[1:], len(pairs)) - 1
+
+        # Position of the closest approach within each merge.
+        group = np.cumsum(new) - 1
+        order = np.lexsort((pairs["distance"], group))
+        closest = order[np.searchsorted(group[order], np.arange(len(starts)), side="left")]
+
+        result = np.empty(len(starts), dtype=SPATIAL_MERGE_DTYPE)
+        result["a"] = pairs["a"][starts]
+        result["b"] = pairs["b"][starts]
+        result["start"] = pairs["time"][starts]
+        result["end"] = pairs["time"][ends]
+        result["min_distance"] = pairs["distance"][closest]
+        result["min_time"] = pairs["time"][closest]
+        return result[np.argsort(result["start"], kind="stable")]
+
+    def nearest(self, object_id, t, kind="AIRPLANE"):
+        """Find the airplane closest to an airplane or ground object at one or more times.
+
+        inputs:
+        object_id (int): index of the object in the replay's airplanes or groundob list
+        t (float, array-like): times in seconds. Positions are interpolated between time slices.
+        kind (str): "AIRPLANE" or "GROUNDOB"
+
+        outputs:
+        airplane_ids (np.ndarray): id of the nearest airplane at each time, -1 when there is none.
+        distances (np.ndarray): distance to it in meters, NaN when there is none.
+        """
+        if kind not in SPATIAL_OBJECT_KINDS:
+            print("Error: [SpatialIndex.nearest] expected kind to be one of {}. Got {}".format(SPATIAL_OBJECT_KINDS, kind))
+            raise ValueError
+
+        t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+        others = resample_airplanes(self.replay.airplanes, t, ["x", "y", "z"])
+        if kind == "AIRPLANE":
+            target = others[:, object_id]
+        else:
+            target = _ground_position(self.replay.groundob[object_id], t)
+
+        with np.errstate(invalid='ignore'):
+            distances = np.sqrt(np.sum((others - target[:, None, :])**2, axis=2))
+        if kind == "AIRPLANE":
+            distances[:, object_id] = np.nan
+
+        found = np.any(np.isfinite(distances), axis=1)
+        airplane_ids = np.full(t.size, -1, dtype=np.int64)
+        airplane_ids[found] = np.nanargmin(distances[found], axis=1)
+        nearest_distance = np.full(t.size, np.nan)
+        nearest_distance[found] = distances[found, airplane_ids[found]]
+        return airplane_ids, nearest_distance
+
+
+def _ground_position(ground, t):
+    """Position of a ground object at times t. Ground objects stay where they were last recorded."""
+    records = ground.records
+    if len(records) == 0:
+        return np.full((len(t), 3), np.nan)
+    order = np.argsort(records["time"], kind="stable")
+    idx = np.clip(np.searchsorted(records["time"][order], t, side="right") - 1, 0, len(records) - 1)
+    return records["position"][order][idx].astype(np.float64)
+
+
+def pairs_within(yfs, radius, t0=None, t1=None, dt=SPATIAL_DEFAULT_DT):
+    """Every pair of airplanes within radius meters of each other. See SpatialIndex.pairs_within."""
+    return SpatialIndex(yfs, dt).pairs_within(radius, t0, t1)
+
+
+def nearest_airplane(yfs, object_id, t, kind="AIRPLANE"):
+    """The airplane nearest to an airplane or ground object at times t. See SpatialIndex.nearest."""
+    return SpatialIndex(yfs, times=np.zeros(0)).nearest(object_id, t, kind)
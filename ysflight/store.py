@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+A local SQLite database of many replays for questions that span replay files, such as every kill
+scored by one aircraft or the average sortie length on each field.
+
+ReplayStore.ingest() runs ReplayYFS over a directory, glob or list of replays in a pool of worker
+processes. Workers reduce each replay to plain rows (a replay summary, one summary per airplane,
+the events and the kill credits) and the rows are inserted STORE_BATCH_FILES replays per
+transaction.
+
+Replays are keyed on the hash of their contents. Re-ingesting skips files whose path, size and
+modification time are unchanged without reading them, and files whose contents are already stored
+(moved, touched or copied) without parsing them. A file whose contents changed replaces its old
+rows. Copies of a stored replay at another existing path are counted as duplicates and not stored
+twice.
+
+Tables
+    replays     path, digest, size, mtime (recorded), field, start and end time, counts
+    airplanes   per airplane: identify, pilot, player flag, start and end time, duration, distance, speeds,
+                altitude, shots, kills, deaths
+    events      time, event_type, object_id and the event text
+    kills       time, victim and killer with their identify names, weapon, position and range
+
+The query methods return lists of dicts. ReplayStore.query() runs any SQL against the tables.
+
+"""
+
+# Import standard modules
+import os
+import time
+import sqlite3
+import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Import 3rd Party Modules
+import numpy as np
+
+# Import YSFlight Modules
+from .cache import CACHE_DEFAULT_DIRECTORY, file_digest
+from .file import read_source, source_exists, source_stat
+from .fleet import find_files
+from .combat import engagement_ranges, COMBAT_AIRPLANE_TYPE, COMBAT_GROUND_TYPE
+from .fileparse.ReplayYFS import ReplayYFS
+
+# Define constants
+# Bump STORE_SCHEMA_VERSION whenever the tables or what gets stored in them change. A database
+# written with another version is emptied and has to be ingested again.
+STORE_SCHEMA_VERSION = 1
+STORE_DEFAULT_PATH = os.path.join(CACHE_DEFAULT_DIRECTORY, "replays.sqlite")
+STORE_BATCH_FILES = 32  # replays inserted per transaction
+STORE_CHUNK_SIZE = 4  # replays each worker parses per task
+
+STORE_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS replays (id INTEGER PRIMARY KEY, path TEXT UNIQUE, digest TEXT UNIQUE, "
+    "size INTEGER, mtime_ns INTEGER, recorded REAL, ingested REAL, field TEXT, start_time REAL, end_time REAL, "
+    "airplanes INTEGER, groundob INTEGER, events INTEGER, bullets INTEGER, kills INTEGER)",
+    "CREATE TABLE IF NOT EXISTS airplanes (replay_id INTEGER, object_id INTEGER, identify TEXT, pilot TEXT, "
+    "player INTEGER, start_time REAL, end_time REAL, duration REAL, records INTEGER, distance REAL, max_speed REAL, "
+    "mean_speed REAL, max_altitude REAL, shots INTEGER, kills INTEGER, deaths INTEGER)",
+    "CREATE TABLE IF NOT EXISTS events (replay_id INTEGER, time REAL, event_type TEXT, object_id INTEGER, text TEXT)",
+    "CREATE TABLE IF NOT EXISTS kills (replay_id INTEGER, time REAL, victim_type TEXT, victim_id INTEGER, "
+    "victim_identify TEXT, killer_type TEXT, killer_id INTEGER, killer_identify TEXT, weapon TEXT, "
+    "x REAL, y REAL, z REAL, range REAL)",
+    "CREATE INDEX IF NOT EXISTS replays_field ON replays (field)",
+    "CREATE INDEX IF NOT EXISTS replays_recorded ON replays (recorded)",
+    "CREATE INDEX IF NOT EXISTS airplanes_replay ON airplanes (replay_id)",
+    "CREATE INDEX IF NOT EXISTS airplanes_identify ON airplanes (identify)",
+    "CREATE INDEX IF NOT EXISTS events_replay ON events (replay_id)",
+    "CREATE INDEX IF NOT EXISTS events_type ON events (event_type)",
+    "CREATE INDEX IF NOT EXISTS kills_replay ON kills (replay_id)",
+    "CREATE INDEX IF NOT EXISTS kills_killer ON kills (killer_identify)",
+    "CREATE INDEX IF NOT EXISTS kills_victim ON kills (victim_identify)",
+    "CREATE INDEX IF NOT EXISTS kills_weapon ON kills (weapon)"]
+STORE_TABLES = ["replays", "airplanes", "events", "kills"]
+STORE_CHILD_TABLES = ["airplanes", "events", "kills"]
+
+
+def _float(value):
+    """A float for SQLite, None for NaN."""
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def _quoted(line, default=""):
+    """The last double quoted string of a line."""
+    parts = line.split('"')
+    return parts[-2] if len(parts) >= 3 else default
+
+
+def _airplane_rows(yfs, shots, kills, deaths):
+    """One summary tuple per airplane of a replay."""
+    rows = list()
+    for object_id, plane in enumerate(yfs.airplanes):
+        records = plane.records
+        pilot = ""
+        for line in plane.lines:
+            if line.startswith("IDANDTAG"):
+                pilot = _quoted(line)
+        player = int(plane.lines[0].split()[-1].upper() == "TRUE")
+
+        if len(records) > 0:
+            start = float(records["time"][0])
+            end = float(records["time"][-1])
+            steps = np.diff(records["position"].astype(np.float64), axis=0)
+            distance = float(np.sqrt(np.sum(steps**2, axis=1)).sum())
+            max_speed = float(records["speed"].max())
+            max_altitude = float(records["position"][:, 1].max())
+        else:
+            start = end = distance = max_speed = max_altitude = None
+        duration = None if start is None else end - start
+        mean_speed = distance / duration if duration else None
+
+        rows.append((object_id, plane.identify, pilot, player, start, end, duration, len(records), distance,
+                     max_speed, mean_speed, max_altitude, int(shots.get(object_id, 0)),
+                     int(kills.get(object_id, 0)), int(deaths.get(object_id, 0))))
+    return rows
+
+
+def _airplane_counts(types, ids, air_code):
+    """Number of rows per airplane id among the rows of type AIR."""
+    ids = ids[types == air_code]
+    if len(ids) == 0:
+        return dict()
+    values, counts = np.unique(ids, return_counts=True)
+    return dict(zip(values.tolist(), counts.tolist()))
+
+
+def summarize_replay(filepath):
+    """Parse a replay and reduce it to the rows stored for it.
+
+    inputs:
+    filepath (str): os.path-like to a .yfs file
+
+    outputs:
+    summary (dict): "replay" (a dict of the replay columns) and "airplanes", "events" and "kills"
+                    (lists of row tuples without the replay id)
+    """
+    yfs = ReplayYFS(filepath, use_index=False)
+    bullets = yfs.bulletrecords
+    kills = yfs.killcredits
+    air = yfs.strings.codes.get(COMBAT_AIRPLANE_TYPE, -1)
+
+    shots = _airplane_counts(bullets["shooter_type"], bullets["shooter_id"], air)
+    scored = _airplane_counts(kills["killer_type"], kills["killer_id"], air)
+    deaths = _airplane_counts(kills["victim_type"], kills["victim_id"], air)
+    airplanes = _airplane_rows(yfs, shots, scored, deaths)
+
+    events = list()
+    for item in yfs.events:
+        body = item.to_lines()[1:-1]
+        events.append((item.time, item.event_type, item.object_id, "\n".join(body)))
+
+    # Names of the victims and killers from the objects of the replay.
+    names = {COMBAT_AIRPLANE_TYPE: [i.identify for i in yfs.airplanes],
+             COMBAT_GROUND_TYPE: [i.identify for i in yfs.groundob]}
+
+    def identify(kind, object_id):
+        objects = names.get(kind, list())
+        return objects[object_id] if 0 <= object_id < len(objects) else None
+
+    kill_rows = list()
+    if len(kills) > 0:
+        ranges = engagement_ranges(yfs)
+        columns = zip(kills["time"].tolist(), yfs.names(kills["victim_type"]).tolist(), kills["victim_id"].tolist(),
+                      yfs.names(kills["killer_type"]).tolist(), kills["killer_id"].tolist(),
+                      yfs.names(kills["weapon"]).tolist(), kills["position"].tolist(), ranges.tolist())
+        for t, victim_type, victim_id, killer_type, killer_id, weapon, position, distance in columns:
+            kill_rows.append((t, victim_type, victim_id, identify(victim_type, victim_id), killer_type, killer_id,
+                              identify(killer_type, killer_id), weapon, position[0], position[1], position[2],
+                              _float(distance)))
+
+    times = [float(i.records["time"][0]) for i in yfs.airplanes if len(i.records) > 0]
+    times += [float(i.records["time"][-1]) for i in yfs.airplanes if len(i.records) > 0]
+    replay_row = {"field": yfs.fieldname,
+                  "start_time": min(times) if len(times) > 0 else None,
+                  "end_time": max(times) if len(times) > 0 else None,
+                  "airplanes": len(yfs.airplanes),
+                  "groundob": len(yfs.groundob),
+                  "events": len(yfs.events),
+                  "bullets": len(bullets),
+                  "kills": len(kills)}
+    return {"replay": replay_row, "airplanes": airplanes, "events": events, "kills": kill_rows}
+
+
+def _ingest_replay(filepath, known_digests):
+    """Worker task for a single replay.
+
+    outputs:
+    (status, filepath, source, payload) where status is "known" when the contents are already
+    stored, "parsed" with the summary as payload, or "error" with (error type, message).
+    """
+    try:
+        size, mtime_ns = source_stat(filepath)
+        digest = file_digest(read_source(filepath))
+        source = (digest, size, mtime_ns)
+        if digest in known_digests:
+            return "known", filepath, source, None
+        return "parsed", filepath, source, summarize_replay(filepath)
+    except Exception as error:
+        return "error", filepath, None, (type(error).__name__, str(error))
+
+
+def _ingest_chunk(filepaths, known_digests):
+    """Worker task: a group of replays."""
+    return [_ingest_replay(filepath, known_digests) for filepath in filepaths]
+
+
+def _iter_ingest(filepaths, known_digests, workers, chunksize):
+    """Hash and summarize replays serially or in a process pool, yielding results as they complete."""
+    if workers <= 1 or len(filepaths) <= 1:
+        for filepath in filepaths:
+            yield _ingest_replay(filepath, known_digests)
+        return
+
+    chunks = [filepaths[i:i + chunksize] for i in range(0, len(filepaths), chunksize)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_ingest_chunk, chunk, known_digests): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            try:
+                results = future.result()
+            except Exception as error:
+                # A worker that crashed, or a result that could not be sent back, loses its whole chunk.
+                results = [("error", filepath, None, (type(error).__name__, str(error))) for filepath in futures[future]]
+            for result in results:
+                yield result
+
+
+def _timestamp(value):
+    """Seconds since the epoch from a datetime, date or number."""
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day).timestamp()
+    return float(value)
+
+
+class ReplayStore:
+    """SQLite database of replay summaries, events and kill credits."""
+    def __init__(self, filepath=None):
+        """
+        inputs:
+        filepath (str, None): the database file. Defaults to YSFLIGHT_STORE or
+                              ~/.cache/ysflight/replays.sqlite
+        """
+        if filepath is None:
+            filepath = os.environ.get("YSFLIGHT_STORE", STORE_DEFAULT_PATH)
+        self.filepath = filepath
+        self._connection = None
+
+    @property
+    def connection(self):
+        """Open the database on first use."""
+        if self._connection is None:
+            directory = os.path.dirname(os.path.abspath(self.filepath))
+            os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.filepath)
+            self._connection.row_factory = sqlite3.Row
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+
+            # Start over when the database was written by a different schema version.
+            self._connection.execute(STORE_SCHEMA[0])
+            row = self._connection.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if row is not None and int(row[0]) != STORE_SCHEMA_VERSION:
+                for table in STORE_TABLES:
+                    self._connection.execute("DROP TABLE IF EXISTS {}".format(table))
+            for statement in STORE_SCHEMA[1:]:
+                self._connection.execute(statement)
+            self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (str(STORE_SCHEMA_VERSION),))
+            self._connection.commit()
+
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def ingest(self, paths_or_dir, workers=None, chunksize=STORE_CHUNK_SIZE, batch=STORE_BATCH_FILES):
+        """Add new and changed replays to the database.
+
+        inputs:
+        paths_or_dir (str, list): a directory (searched recursively), glob pattern, .yfs filepath or
+                                  zip archive of replays, or a list of them.
+        workers (int, None): number of worker processes. None uses every CPU and 1 parses in this process.
+        chunksize (int): number of replays sent to a worker at a time.
+        batch (int): number of replays inserted per transaction.
+
+        outputs:
+        result (dict): "added", "replaced" (contents changed), "moved" (contents already stored under
+                       a path that is gone or with another modification time), "duplicates" (contents
+                       already stored under another existing path), "unchanged" counts and "errors",
+                       a list of (filepath, error type, message).
+        """
+        if workers is None:
+            workers = os.cpu_count() or 1
+        result = {"added": 0, "replaced": 0, "moved": 0, "duplicates": 0, "unchanged": 0, "errors": list()}
+
+        # Files whose path, size and modification time match a stored replay are not read at all.
+        stored = dict()
+        for row in self.connection.execute("SELECT path, size, mtime_ns FROM replays"):
+            stored[row["path"]] = (row["size"], row["mtime_ns"])
+        filepaths = list()
+        for filepath in find_files(paths_or_dir, [".yfs"]):
+            key = os.path.abspath(filepath)
+            try:
+                stat = source_stat(key)
+            except OSError as error:
+                result["errors"].append((filepath, type(error).__name__, str(error)))
+                continue
+            if stored.get(key) == stat:
+                result["unchanged"] += 1
+            else:
+                filepaths.append(key)
+
+        known = frozenset(row[0] for row in self.connection.execute("SELECT digest FROM replays"))
+        pending = 0
+        try:
+            for status, filepath, source, payload in _iter_ingest(filepaths, known, workers, chunksize):
+                if status == "error":
+                    result["errors"].append((filepath,) + tuple(payload))
+                    continue
+                result[self._store(status, filepath, source, payload)] += 1
+                pending += 1
+                if pending >= batch:
+                    self.connection.commit()
+                    pending = 0
+        finally:
+            self.connection.commit()
+
+        return result
+
+    def _store(self, status, filepath, source, payload):
+        """Write the result of one worker task without committing. Returns the result count to bump."""
+        connection = self.connection
+        digest, size, mtime_ns = source
+
+        # Whatever was stored for this path before had other contents and is out of date.
+        stale = connection.execute("SELECT id FROM replays WHERE path = ? AND digest != ?", (filepath, digest)).fetchall()
+        for row in stale:
+            self._delete_replay(row["id"])
+
+        existing = connection.execute("SELECT id, path FROM replays WHERE digest = ?", (digest,)).fetchone()
+        if existing is not None:
+            if existing["path"] != filepath and source_exists(existing["path"]):
+                return "duplicates"
+            # Same contents, only the path or modification time changed.
+            connection.execute("UPDATE replays SET path = ?, size = ?, mtime_ns = ?, recorded = ? WHERE id = ?",
+                               (filepath, size, mtime_ns, mtime_ns / 1e9, existing["id"]))
+            return "moved"
+        elif status == "known":
+            # Stored when the task started but replaced by another file of this run since.
+            payload = summarize_replay(filepath)
+
+        summary = payload["replay"]
+        cursor = connection.execute("INSERT INTO replays (path, digest, size, mtime_ns, recorded, ingested, field, start_time, end_time, "
+                                    "airplanes, groundob, events, bullets, kills) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (filepath, digest, size, mtime_ns, mtime_ns / 1e9, time.time(), summary["field"],
+                                     summary["start_time"], summary["end_time"], summary["airplanes"], summary["groundob"],
+                                     summary["events"], summary["bullets"], summary["kills"]))
+        replay_id = cursor.lastrowid
+        connection.executemany("INSERT INTO airplanes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               [(replay_id,) + row for row in payload["airplanes"]])
+        connection.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?)",
+                               [(replay_id,) + row for row in payload["events"]])
+        connection.executemany("INSERT INTO kills VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               [(replay_id,) + row for row in payload["kills"]])
+        return "replaced" if len(stale) > 0 else "added"
+
+    def _delete_replay(self, replay_id):
+        for table in STORE_CHILD_TABLES:
+            self.connection.execute("DELETE FROM {} WHERE replay_id = ?".format(table), (replay_id,))
+        self.connection.execute("DELETE FROM replays WHERE id = ?", (replay_id,))
+
+    def prune(self):
+        """Remove the replays whose files no longer exist. Returns the number removed."""
+        missing = [row["id"] for row in self.connection.execute("SELECT id, path FROM replays") if source_exists(row["path"]) is False]
+        for replay_id in missing:
+            self._delete_replay(replay_id)
+        self.connection.commit()
+        return len(missing)
+
+    def query(self, sql, parameters=()):
+        """Run any SQL against the store and return the rows as dicts."""
+        return [dict(row) for row in self.connection.execute(sql, parameters)]
+
+    def _filtered(self, select, filters, suffix=""):
+        """Run select with the (condition, value) filters whose value is not None."""
+        conditions = [condition for condition, value in filters if value is not None]
+        parameters = [value for condition, value in filters if value is not None]
+        sql = select
+        if len(conditions) > 0:
+            sql += " WHERE " + " AND ".join(conditions)
+        return self.query(sql + suffix, parameters)
+
+    def replays(self, field=None, since=None, until=None):
+        """Stored replays, optionally on one field and recorded (modified) between since and until.
+
+        inputs:
+        field (str, None): field name
+        since, until (datetime, date, float, None): seconds since the epoch or a date
+        """
+        return self._filtered("SELECT * FROM replays",
+                              [("field = ?", field),
+                               ("recorded >= ?", None if since is None else _timestamp(since)),
+                               ("recorded <= ?", None if until is None else _timestamp(until))],
+                              " ORDER BY recorded")
+
+    def kills(self, killer=None, victim=None, weapon=None, field=None, since=None, until=None):
+        """Kill credits across every stored replay.
+
+        inputs:
+        killer, victim (str, None): IDENTIFY name of the killing or killed aircraft
+        weapon (str, None): weapon name, e.g. AIM9
+        field (str, None): field name
+        since, until (datetime, date, float, None): only replays recorded between these times
+
+        outputs:
+        kills (list): dicts of the kill columns plus the replay path, field and recorded time.
+        """
+        return self._filtered("SELECT kills.*, replays.path, replays.field, replays.recorded FROM kills "
+                              "JOIN replays ON replays.id = kills.replay_id",
+                              [("kills.killer_identify = ?", killer),
+                               ("kills.victim_identify = ?", victim),
+                               ("kills.weapon = ?", weapon),
+                               ("replays.field = ?", field),
+                               ("replays.recorded >= ?", None if since is None else _timestamp(since)),
+                               ("replays.recorded <= ?", None if until is None else _timestamp(until))],
+                              " ORDER BY replays.recorded, kills.time")
+
+    def events(self, event_type=None, field=None, since=None, until=None):
+        """Events across every stored replay, filtered like kills()."""
+        return self._filtered("SELECT events.*, replays.path, replays.field FROM events "
+                              "JOIN replays ON replays.id = events.replay_id",
+                              [("events.event_type = ?", event_type),
+                               ("replays.field = ?", field),
+                               ("replays.recorded >= ?", None if since is None else _timestamp(since)),
+                               ("replays.recorded <= ?", None if until is None else _timestamp(until))],
+                              " ORDER BY replays.recorded, events.time")
+
+    def sortie_lengths(self, identify=None, since=None, until=None):
+        """Average sortie length (the time an airplane has records) per field.
+
+        outputs:
+        fields (list): dicts of field, sorties, mean_duration, min_duration and max_duration in seconds.
+        """
+        return self._filtered("SELECT replays.field AS field, COUNT(*) AS sorties, AVG(airplanes.duration) AS mean_duration, "
+                              "MIN(airplanes.duration) AS min_duration, MAX(airplanes.duration) AS max_duration "
+                              "FROM airplanes JOIN replays ON replays.id = airplanes.replay_id",
+                              [("airplanes.identify = ?", identify),
+                               ("replays.recorded >= ?", None if since is None else _timestamp(since)),
+                               ("replays.recorded <= ?", None if until is None else _timestamp(until))],
+                              " GROUP BY replays.field ORDER BY replays.field")
+
+    def fields(self):
+        """Every field with its number of replays."""
+        return self.query("SELECT field, COUNT(*) AS replays FROM replays GROUP BY field ORDER BY field")
+
+    def size(self):
+        """Number of rows of every table."""
+        return {table: self.connection.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0] for table in STORE_TABLES}
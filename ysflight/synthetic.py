@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+Generate synthetic replay (.yfs) and aircraft DAT files for scaling tests.
+
+Replays follow the layout documented in ysflight.fileparse.ReplayYFS: airplane blocks, ground
+object blocks, an event block, bullet records and kill credits. Every airplane flies a circle at
+a random center, radius, altitude and speed, so the records are smooth and physically plausible.
+Output only depends on the arguments and the seed, and is produced in chunks of text so files of
+several gigabytes can be written without holding them in memory.
+
+DAT variants copy a template DAT and scale its speed, force, weight and area properties by a
+random factor, keeping every other line unchanged.
+
+usage: python -m ysflight.synthetic replay.yfs --airplanes 16 --duration 600 --seed 1
+
+"""
+
+# Import standard modules
+import os
+import re
+import math
+import random
+import argparse
+
+# Import 3rd Party Modules
+import numpy as np
+
+# Import YSFlight Modules
+from .fileparse.AircraftDat import (YSFLIGHT_DAT_SPEED_VARS, YSFLIGHT_DAT_FORCE_VARS, YSFLIGHT_DAT_WEIGHT_VARS,
+                                    YSFLIGHT_DAT_AREA_VARS)
+from .fileparse.ReplayYFS import YFS_EVENT_TYPES, YFS_EVENT_BLOCK_START, YFS_EVENT_BLOCK_END, YFS_EVENT_END
+
+# Define constants
+SYNTHETIC_CHUNK_RECORDS = 4096  # Number of records formatted per chunk of text
+SYNTHETIC_EVENT_MIX = {"TXTEVT": 4, "WNDCHG": 1, "VISCHG": 1, "PLRAIR": 1, "AIRCMD": 2, "WPNCFG": 1}
+SYNTHETIC_WEAPONS = ["GUN", "AIM9", "AIM9X", "AIM120", "AGM65", "RKT", "B500", "B250"]
+SYNTHETIC_AIRPLANE = "A-4_SKYHAWK"
+SYNTHETIC_GROUND_OBJECT = "TANK"
+SYNTHETIC_DAT_SCALED_VARS = set(YSFLIGHT_DAT_SPEED_VARS + YSFLIGHT_DAT_FORCE_VARS + YSFLIGHT_DAT_WEIGHT_VARS + YSFLIGHT_DAT_AREA_VARS)
+
+_NUMBER_PATTERN = re.compile(r"([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(.*)")
+
+
+class _flight_path:
+    """A circular flight path used to place an airplane at any time."""
+    def __init__(self, rng):
+        self.center = rng.uniform(-20000, 20000, 2)
+        self.radius = rng.uniform(2000, 8000)
+        self.altitude = rng.uniform(500, 9000)
+        self.speed = rng.uniform(120, 300)
+        self.phase = rng.uniform(0, 2 * math.pi)
+        self.direction = 1 if rng.random() < 0.5 else -1
+
+    def state(self, t):
+        """Return x, y, z, heading, pitch, bank arrays at the times t."""
+        angle = self.phase + self.direction * self.speed * t / self.radius
+        x = self.center[0] + self.radius * np.cos(angle)
+        z = self.center[1] + self.radius * np.sin(angle)
+        y = self.altitude + 50 * np.sin(t / 20.0)
+        heading = np.mod(angle + self.direction * math.pi / 2, 2 * math.pi) - math.pi
+        pitch = 0.02 * np.cos(t / 20.0)
+        bank = np.full(np.shape(t), self.direction * math.atan(self.speed**2 / (9.807 * self.radius)))
+        return x, y, z, heading, pitch, bank
+
+
+def _stratified_times(rng, count, duration):
+    """Yield count sorted random times between 0 and duration, one per equal slice, in chunks."""
+    for start in range(0, count, SYNTHETIC_CHUNK_RECORDS):
+        idx = np.arange(start, min(start + SYNTHETIC_CHUNK_RECORDS, count))
+        yield idx, duration * (idx + rng.random(idx.size)) / count
+
+
+def iter_synthetic_yfs(airplanes=4, duration=60.0, sample_rate=10.0, ground_objects=1, events=20,
+                       event_mix=None, bullets=100, kills=5, seed=0):
+    """Generate the text of a synthetic replay in chunks.
+
+    inputs:
+    airplanes (int): number of airplanes
+    duration (float, int): length of the replay in seconds
+    sample_rate (float, int): flight records per second for every airplane
+    ground_objects (int): number of ground objects, each with a single record
+    events (int): number of events in the event block
+    event_mix (dict, None): relative weight of each event type. Defaults to SYNTHETIC_EVENT_MIX.
+    bullets (int): number of bullet records
+    kills (int): number of kill credits
+    seed (int): random seed. The same arguments and seed always produce the same text.
+
+    outputs:
+    chunks (str): consecutive pieces of the replay file
+    """
+    if event_mix is None:
+        event_mix = SYNTHETIC_EVENT_MIX
+    for event_type in event_mix:
+        if event_type not in YFS_EVENT_TYPES:
+            print("Error: [iter_synthetic_yfs] unknown event type {}. Expected one of {}".format(event_type, YFS_EVENT_TYPES))
+            raise ValueError
+    if airplanes < 1 and (bullets > 0 or kills > 0):
+        print("Error: [iter_synthetic_yfs] bullet records and kill credits need at least one airplane.")
+        raise ValueError
+
+    records = int(round(duration * sample_rate)) + 1
+    paths = [_flight_path(np.random.default_rng([seed, 0, plane])) for plane in range(airplanes)]
+
+    yield 'YFSVERSI 20180930\nFIELDNAM "HEATHROW" FALSE\n'
+
+    # Airplanes, written a chunk of records at a time.
+    for plane, path in enumerate(paths):
+        yield 'AIRPLANE "{}" {}\nIDANDTAG {} "" "pilot{}"\nNUMRECOR {} 3\n'.format(
+            SYNTHETIC_AIRPLANE, "TRUE" if plane == 0 else "FALSE", plane, plane, records)
+        rng = np.random.default_rng([seed, 1, plane])
+        for start in range(0, records, SYNTHETIC_CHUNK_RECORDS):
+            t = np.arange(start, min(start + SYNTHETIC_CHUNK_RECORDS, records)) / sample_rate
+            x, y, z, heading, pitch, bank = path.state(t)
+            g = 1 / np.cos(bank) + rng.normal(0, 0.05, t.size)
+            throttle = rng.integers(60, 100, t.size)
+            elevator = rng.integers(-10, 10, t.size)
+            rows = zip(t.tolist(), x.tolist(), y.tolist(), z.tolist(), heading.tolist(), pitch.tolist(),
+                       bank.tolist(), g.tolist(), throttle.tolist(), elevator.tolist())
+            yield "".join("{:.4f}\n{:.2f} {:.2f} {:.2f} {:.4f} {:.4f} {:.4f} {:.3f}\n0 0 0 0 0 0 0 0\n{} {} 0 0 0 0 0 0\n".format(*row)
+                          for row in rows)
+
+    for ground in range(ground_objects):
+        rng = np.random.default_rng([seed, 2, ground])
+        position = rng.uniform(-20000, 20000, 3) * [1, 0, 1]
+        yield 'GROUNDOB "{}"\nNUMRECOR 1 1\n0.0000\n{:.2f} {:.2f} {:.2f} {:.4f} 0.0000 0.0000\n0\n'.format(
+            SYNTHETIC_GROUND_OBJECT, position[0], position[1], position[2], rng.uniform(-math.pi, math.pi))
+
+    # Events in time order with the type drawn from the mix.
+    if events > 0:
+        rng = np.random.default_rng([seed, 3])
+        event_types = list(event_mix.keys())
+        weights = np.array([event_mix[i] for i in event_types], dtype=float)
+        weights = weights / weights.sum()
+        yield YFS_EVENT_BLOCK_START + "\n"
+        for idx, times in _stratified_times(rng, events, duration):
+            kinds = rng.choice(len(event_types), size=idx.size, p=weights)
+            values = rng.random((idx.size, 3))
+            yield "".join(_format_event(event_types[kind], t, i, value, max(airplanes, 1))
+                          for i, t, kind, value in zip(idx.tolist(), times.tolist(), kinds.tolist(), values.tolist()))
+        yield YFS_EVENT_BLOCK_END + "\n"
+
+    # Bullet records are fired from the shooter's position along its heading.
+    if bullets > 0:
+        rng = np.random.default_rng([seed, 4])
+        yield "BULRECOR\nNUMRECOR {} 3\n".format(bullets)
+        for idx, times in _stratified_times(rng, bullets, duration):
+            shooters = rng.integers(0, airplanes, idx.size)
+            weapons = rng.integers(0, len(SYNTHETIC_WEAPONS), idx.size)
+            lines = list()
+            for t, shooter, weapon in zip(times.tolist(), shooters.tolist(), weapons.tolist()):
+                x, y, z, heading, pitch, bank = paths[shooter].state(t)
+                lines.append("{:.4f} {} {:.2f} {:.2f} {:.2f} {:.4f} {:.4f} {:.4f} 900.0 2.0 12.0 AIR {}\n".format(
+                    t, SYNTHETIC_WEAPONS[weapon], x, y, z, heading, pitch, bank, shooter))
+            yield "".join(lines)
+
+    # Kill credits between two different airplanes when there are at least two.
+    if kills > 0:
+        rng = np.random.default_rng([seed, 5])
+        yield "KILLCRED\nNUMRECOR {} 2\n".format(kills)
+        for idx, times in _stratified_times(rng, kills, duration):
+            killers = rng.integers(0, airplanes, idx.size)
+            offsets = rng.integers(1, max(airplanes, 2), idx.size)
+            weapons = rng.integers(0, len(SYNTHETIC_WEAPONS), idx.size)
+            lines = list()
+            for t, killer, offset, weapon in zip(times.tolist(), killers.tolist(), offsets.tolist(), weapons.tolist()):
+                victim = (killer + offset) % airplanes
+                x, y, z = [float(i) for i in paths[victim].state(t)[:3]]
+                lines.append("{:.4f} AIR {} AIR {} {} {:.2f} {:.2f} {:.2f}\n".format(t, victim, killer, SYNTHETIC_WEAPONS[weapon], x, y, z))
+            yield "".join(lines)
+
+
+def _format_event(event_type, t, number, value, airplanes):
+    """Format a single event of a replay event block."""
+    lines = ["{} {:.4f} 0".format(event_type, t)]
+    if event_type == "TXTEVT":
+        lines.append("TXT Synthetic message {}".format(number))
+    elif event_type == "WNDCHG":
+        lines.append("WND {:.2f}m/s 0.00m/s {:.2f}m/s".format(20 * value[0] - 10, 20 * value[1] - 10))
+    elif event_type == "VISCHG":
+        lines.append("VIS {:.0f}m".format(1000 + 19000 * value[0]))
+        lines.append("CLDLYR {:.0f} {:.0f}".format(1000 + 5000 * value[1], 100 + 900 * value[2]))
+    elif event_type == "PLRAIR":
+        lines.append("OBJ {}".format(int(value[0] * airplanes)))
+    elif event_type == "AIRCMD":
+        lines.append("OBJ {}".format(int(value[0] * airplanes)))
+        lines.append("CMD INITIGUN {}".format(int(500 * value[1])))
+    elif event_type == "WPNCFG":
+        lines.append("OBJ {}".format(int(value[0] * airplanes)))
+        lines.append("CFG AIM9 {}".format(int(4 * value[1])))
+        lines.append("CFG AIM120 {}".format(int(4 * value[2])))
+        lines.append("TXT FUEL {:.0f}".format(100 * value[1]))
+    lines.append(YFS_EVENT_END)
+    return "\n".join(lines) + "\n"
+
+
+def write_synthetic_yfs(filepath, airplanes=4, duration=60.0, sample_rate=10.0, ground_objects=1, events=20,
+                        event_mix=None, bullets=100, kills=5, seed=0):
+    """Write a synthetic replay file. See iter_synthetic_yfs for the inputs.
+
+    outputs:
+    size (int): number of characters written
+    """
+    if filepath.lower().endswith("yfs") is False:
+        print("Error: [write_synthetic_yfs] expected a YFS filepath but was provided {}".format(filepath))
+        raise TypeError
+
+    size = 0
+    with open(filepath, mode='w') as yfs_file:
+        for chunk in iter_synthetic_yfs(airplanes, duration, sample_rate, ground_objects, events, event_mix,
+                                        bullets, kills, seed):
+            yfs_file.write(chunk)
+            size += len(chunk)
+
+    return size
+
+
+def synthetic_dat_lines(template_lines, seed=0, spread=0.1, identify=None):
+    """Derive the lines of a DAT variant from the lines of a template DAT.
+
+    inputs:
+    template_lines (list): lines of the template DAT file
+    seed (int): random seed
+    spread (float): speed, force, weight and area values are scaled by a random factor in 1 +/- spread
+    identify (str, None): IDENTIFY name of the variant. None keeps the template name.
+
+    outputs:
+    lines (list): lines of the variant DAT
+    """
+    rng = random.Random(seed)
+    lines = list()
+    for line in template_lines:
+        parts = line.split()
+        if len(parts) > 1 and parts[0] == "IDENTIFY" and identify is not None:
+            line = 'IDENTIFY "{}"'.format(identify)
+        elif len(parts) > 1 and parts[0] in SYNTHETIC_DAT_SCALED_VARS:
+            match = _NUMBER_PATTERN.fullmatch(parts[1])
+            if match is not None:
+                value = float(match.group(1)) * (1 + rng.uniform(-spread, spread))
+                line = line.replace(parts[1], "{:.4g}{}".format(value, match.group(2)), 1)
+        lines.append(line)
+
+    return lines
+
+
+def write_synthetic_dats(template, directory, count, seed=0, spread=0.1):
+    """Write DAT variants of a template DAT file.
+
+    inputs:
+    template (str): filepath to the template DAT
+    directory (str): folder the variants are written into
+    count (int): number of variants
+    seed (int): random seed. Variant i always gets seed * 1000003 + i, which is unique for every
+                seed and variant as long as count is at most 1000003.
+    spread (float): relative spread of the scaled values
+
+    outputs:
+    filepaths (list): filepaths of the written DAT files
+    """
+    with open(template, mode='r') as dat_file:
+        template_lines = dat_file.read().splitlines()
+
+    name = os.path.splitext(os.path.basename(template))[0].upper()
+    os.makedirs(directory, exist_ok=True)
+    filepaths = list()
+    for i in range(count):
+        filepath = os.path.join(directory, "{}_{:05d}.dat".format(name.lower(), i))
+        lines = synthetic_dat_lines(template_lines, seed * 1000003 + i, spread, "{}_VARIANT_{:05d}".format(name, i))
+        with open(filepath, mode='w') as dat_file:
+            dat_file.write("\n".join(lines) + "\n")
+        filepaths.append(filepath)
+
+    return filepaths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic YSFlight replay.")
+    parser.add_argument("filepath", help="output .yfs filepath")
+    parser.add_argument("--airplanes", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds")
+    parser.add_argument("--sample-rate", type=float, default=10.0, help="records per second")
+    parser.add_argument("--ground-objects", type=int, default=1)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--bullets", type=int, default=100)
+    parser.add_argument("--kills", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    size = write_synthetic_yfs(args.filepath, args.airplanes, args.duration, args.sample_rate, args.ground_objects,
+                               args.events, None, args.bullets, args.kills, args.seed)
+    print("Wrote {:,} bytes to {}".format(size, args.filepath))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,16 @@ Created on Sat May 13 18:18:18 2023
 """
 
 # Import standard modules
+import re
 import math
+import functools
 
 # Import 3rd Party Modules
 
 
 # Import YSFlight module
-from ysflight.simulation import YSFLIGHT_G
+from ysflight.constants import YSFLIGHT_G
+from ysflight import instrument
 
 # Define valid units for YSFLIGHT and organize for different types of units.
 YSFLIGHT_SPEED_UNITS = ["MACH", "M/S", "KT", "KM/H"]
@@ -53,6 +56,14 @@ YSFLIGHT_UNIT_CONVERSION["HP"] = 740
 YSFLIGHT_UNIT_CONVERSION["SEC"] = 1
 
 
+# Tokenizer for raw DAT values: a numeric prefix followed by an optional unit suffix.
+_VALUE_UNIT_PATTERN = re.compile(r"([-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?)(.*)", re.DOTALL)
+
+# Maximum number of distinct raw values remembered by determine_value_units. DAT files repeat the
+# same tokens (0.0m, TRUE, ...) constantly so a small cache covers most lookups.
+UNIT_CACHE_SIZE = 4096
+
+
 def determine_value_units(raw_value):
     """Extract the value and unit from a raw value provided from a YSFlight File. Integrated 
     determine_value and determine_units into a single function to save processing time.
@@ -68,7 +79,35 @@ def determine_value_units(raw_value):
     if isinstance(raw_value, str) is False:
         print("Error: [determine_value_units] was expecting a string input. Got a {}".format(type(raw_value)))
         raise TypeError
+    
+    return _cached_value_units(raw_value)
+
+
+@functools.lru_cache(maxsize=UNIT_CACHE_SIZE)
+def _cached_value_units(raw_value):
+    """Split a raw value into its numeric prefix and unit suffix in a single pass. Anything the 
+    tokenizer does not recognise is handed to the original scanning implementation so the results 
+    are unchanged."""
+    match = _VALUE_UNIT_PATTERN.fullmatch(raw_value)
+    if match is not None:
+        number, unit = match.groups()
+        if len(unit) == 0:
+            return float(number), "NUMBER"
         
+        unit = unit.upper()
+        if unit in YSFLIGHT_UNIT_CONVERSION:
+            return float(number), unit
+    
+    return _scan_value_units(raw_value)
+
+
+instrument.register_cache("units.determine_value_units", _cached_value_units)
+
+
+def _scan_value_units(raw_value):
+    """Original implementation of determine_value_units that tries float(), then the booleans and 
+    then every unit suffix in turn."""
+    
     # If this is just a straight number, end early
     try:
         value = float(raw_value)